@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Microbenchmark comparing the per-job evaluation of a pipetask command
+line template by applying `str.format`, `fix_env_var_syntax`, and
+`insert_file_paths` to the full template with the rendering of the
+precompiled template from `CommandLineCompiler`.
+"""
+import time
+import json
+import argparse
+from desc.gen3_workflow import CommandLineCompiler, fix_env_var_syntax, \
+    insert_file_paths
+
+
+COMMAND = ('<ENV:CTRL_MPEXEC_DIR>/bin/pipetask --long-log --log-level=VERBOSE '
+           'run-qbb {butlerConfig} <FILE:runQgraphFile> '
+           '--qgraph-node-id {qgraphNodeId} --qgraph-id {qgraphId} '
+           '--output-run {outputRun} --extend-run --clobber-outputs '
+           '--no-versions')
+
+FILE_PATHS = {'runQgraphFile': '/submit/u/desc/run/run.qgraph',
+              'butlerConfig': '/repo/butler.yaml'}
+
+
+def cmdvals(i):
+    """Return the cmdvals for the ith job."""
+    return dict(butlerConfig='/repo/butler.yaml',
+                qgraphNodeId=f'{i:08x}-1234-4abc-8def-0123456789ab',
+                qgraphId='1696031234.5678-12345', outputRun='u/desc/run')
+
+
+def render_uncompiled(num_renders):
+    """Render the command line by processing the full template."""
+    for i in range(num_renders):
+        command = COMMAND.format(**cmdvals(i))
+        command = fix_env_var_syntax(command)
+        insert_file_paths(command, FILE_PATHS)
+
+
+def render_compiled(num_renders):
+    """Render the command line using the precompiled template."""
+    compiler = CommandLineCompiler()
+    for i in range(num_renders):
+        compiler.render(COMMAND, cmdvals(i), FILE_PATHS)
+
+
+def render_baseline(num_renders):
+    """Loop overhead of generating the cmdvals."""
+    for i in range(num_renders):
+        cmdvals(i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_renders', type=int, default=1000000,
+                        help='number of command lines to render')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    args = parser.parse_args()
+
+    compiler = CommandLineCompiler()
+    assert (compiler.render(COMMAND, cmdvals(0), FILE_PATHS)
+            == insert_file_paths(fix_env_var_syntax(
+                COMMAND.format(**cmdvals(0))), FILE_PATHS))
+
+    results = dict(num_renders=args.num_renders)
+    for name, func in (('baseline', render_baseline),
+                       ('uncompiled', render_uncompiled),
+                       ('compiled', render_compiled)):
+        t0 = time.time()
+        func(args.num_renders)
+        results[f'{name}_s'] = time.time() - t0
+    overhead = results['baseline_s']
+    results['speedup'] = ((results['uncompiled_s'] - overhead)
+                          /(results['compiled_s'] - overhead))
+
+    print(json.dumps(results, indent=2))
+    if args.outfile is not None:
+        with open(args.outfile, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark comparing the memory used for the graph bookkeeping of a
+ParslGraph using the previous representation, i.e., a dict subclass
+of ParslJob objects each holding sets of neighbor jobs, with the
+current CompactDag-based representation.
+"""
+import os
+import gc
+import time
+import json
+import argparse
+import tempfile
+import tracemalloc
+from desc.gen3_workflow import ParslGraph, get_task_name
+from synthetic_workflow import make_synthetic_workflow, make_synthetic_config
+
+
+class LegacyParslJob:
+    """Per-job state of the previous ParslJob implementation."""
+    def __init__(self, gwf_job, parsl_graph):
+        self.gwf_job = gwf_job
+        self.config = parsl_graph.config
+        self.parent_graph = parsl_graph
+        self.dependencies = set()
+        self.prereqs = set()
+        self._done = False
+        self._status = 'pending'
+        self.future = None
+
+
+class LegacyParslGraph(dict):
+    """Graph ingestion of the previous ParslGraph implementation."""
+    def __init__(self, generic_workflow, config):
+        super().__init__()
+        self.gwf = generic_workflow
+        self.config = config
+        self._task_list = []
+        for job_name in self.gwf:
+            if job_name == 'pipetaskInit':
+                continue
+            task_name = get_task_name(job_name, self.config)
+            if task_name not in self._task_list:
+                self._task_list.append(task_name)
+            _ = self[job_name]
+            for successor_job in self.gwf.successors(job_name):
+                self[job_name].dependencies.add(self[successor_job])
+                self[successor_job].prereqs.add(self[job_name])
+
+    def __getitem__(self, job_name):
+        if not job_name in self:
+            super().__setitem__(job_name, LegacyParslJob(
+                self.gwf.get_job(job_name), self))
+        return super().__getitem__(job_name)
+
+
+def measure(factory):
+    """
+    Return the memory (MB) held by the object returned by `factory`,
+    the peak memory (MB) used while creating it, and the wall time (s).
+    """
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.time()
+    obj = factory()
+    dt = time.time() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    gc.collect()
+    return dict(memory_MB=current/1024**2, peak_MB=peak/1024**2, time_s=dt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_jobs', type=int, default=500000,
+                        help='approximate number of jobs in the workflow')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    args = parser.parse_args()
+
+    gwf = make_synthetic_workflow(args.num_jobs)
+    with tempfile.TemporaryDirectory() as submit_path:
+        os.makedirs(os.path.join(submit_path, 'logging'))
+        config = make_synthetic_config(submit_path)
+        monitoring_db = os.path.join(submit_path, 'monitoring.db')
+        results = dict(num_jobs=len(gwf))
+        results['legacy'] = measure(lambda: LegacyParslGraph(gwf, config))
+        results['compact'] = measure(
+            lambda: ParslGraph(gwf, config, do_init=False,
+                               monitoring_db=monitoring_db))
+    results['memory_ratio'] = (results['legacy']['memory_MB']
+                               /results['compact']['memory_MB'])
+
+    print(json.dumps(results, indent=2))
+    if args.outfile is not None:
+        with open(args.outfile, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark comparing the per-job I/O and wall time for reading the
+quanta of a job from the full QuantumGraph file with reading them
+from the job's QuantumGraph shard.  This uses a bps submit directory
+for which `ParslGraph.write_qgraph_shards` has been run, e.g., via
+the `parsl_config.qgraph_shard_size` option.
+"""
+import os
+import time
+import json
+import random
+import argparse
+from lsst.daf.butler import DimensionUniverse
+from lsst.pipe.base.graph import QuantumGraph
+from desc.gen3_workflow import ParslGraph, job_node_ids
+
+
+def read_bytes():
+    """Bytes read by this process so far, from /proc/self/io."""
+    with open('/proc/self/io') as fd:
+        for line in fd:
+            if line.startswith('rchar:'):
+                return int(line.split()[1])
+    return 0
+
+
+def time_load(qgraph_file, node_ids, universe):
+    """Return the wall time (s) and bytes read to load the nodes."""
+    nbytes = read_bytes()
+    t0 = time.time()
+    QuantumGraph.loadUri(qgraph_file, universe, nodes=node_ids)
+    return time.time() - t0, read_bytes() - nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('parsl_graph_config', type=str,
+                        help='parsl_graph_config.pickle file of the workflow')
+    parser.add_argument('--num_jobs', type=int, default=20,
+                        help='number of jobs to sample')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='random number seed for sampling jobs')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    args = parser.parse_args()
+
+    graph = ParslGraph.restore(args.parsl_graph_config, use_dfk=False)
+    shards = graph.qgraph_shards
+    if shards is None:
+        raise RuntimeError('No QuantumGraph shards found for this workflow.')
+    universe = DimensionUniverse()
+    job_names = random.Random(args.seed).sample(
+        sorted(shards.jobs), min(args.num_jobs, len(shards.jobs)))
+
+    results = dict(full=dict(time_s=[], read_bytes=[]),
+                   shard=dict(time_s=[], read_bytes=[]))
+    for job_name in job_names:
+        node_ids = job_node_ids(graph[job_name].gwf_job)
+        for key, qgraph_file in (('full', graph.qgraph_file),
+                                 ('shard', shards.shard_file(job_name))):
+            dt, nbytes = time_load(qgraph_file, node_ids, universe)
+            results[key]['time_s'].append(dt)
+            results[key]['read_bytes'].append(nbytes)
+
+    summary = dict(num_jobs=len(job_names),
+                   full_qgraph_size=os.path.getsize(graph.qgraph_file))
+    for key, values in results.items():
+        summary[f'{key}_mean_time_s'] \
+            = sum(values['time_s'])/len(job_names)
+        summary[f'{key}_mean_read_bytes'] \
+            = sum(values['read_bytes'])/len(job_names)
+    print(json.dumps(summary, indent=2))
+    if args.outfile is not None:
+        with open(args.outfile, 'w') as fd:
+            json.dump(dict(summary=summary, results=results), fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark comparing the previous row-by-row reduction of the status
+entries in `query_workflow` with the current SQL reduction and
+column-wise job name parsing, using a synthetic monitoring.db file.
+"""
+import os
+import time
+import json
+import sqlite3
+import argparse
+import tempfile
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from desc.gen3_workflow import query_workflow, get_task_name
+from synthetic_monitoring_db import make_monitoring_db
+
+
+def legacy_query_workflow(workflow_name, db_file):
+    """Previous implementation of `query_workflow`."""
+    query = f'''select task.task_stderr, status.task_status_name,
+                status.timestamp
+                from task join status on task.task_id=status.task_id and
+                task.run_id=status.run_id join workflow
+                on task.run_id=workflow.run_id where
+                workflow.workflow_name="{workflow_name}"
+                and task.task_stderr is not null
+                order by task.task_stderr, status.timestamp desc'''
+    with sqlite3.connect(db_file) as conn:
+        df0 = pd.read_sql(query, conn)
+    data = defaultdict(list)
+    task_stderrs = set()
+    for _, row in df0.iterrows():
+        if (row['task_stderr'] in task_stderrs and
+           row['task_status_name'] != "exec_done"):
+            continue
+        task_stderrs.add(row['task_stderr'])
+        job_name = os.path.basename(row['task_stderr']).split('.')[0]
+        data['job_name'].append(job_name)
+        data['task_type'].append(get_task_name(job_name))
+        data['status'].append(row['task_status_name'])
+    idx = np.array(data['status']) != "running_ended"
+    return pd.DataFrame(data=data)[idx]
+
+
+def same_result(df, df_legacy):
+    """
+    Return True if the two status frames have the same rows, ignoring
+    the row order and the index.
+    """
+    if df.empty and df_legacy.empty:
+        return True
+    columns = ['job_name', 'task_type', 'status']
+    try:
+        frames = [_[columns].sort_values(columns).reset_index(drop=True)
+                  for _ in (df, df_legacy)]
+        pd.testing.assert_frame_equal(*frames, check_dtype=False)
+    except (AssertionError, KeyError):
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_rows', type=int, default=5000000,
+                        help='number of rows in the status table')
+    parser.add_argument('--skip_legacy', action='store_true', default=False,
+                        help='skip the previous implementation')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    args = parser.parse_args()
+
+    workflow_name = 'u/synthetic/run'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'monitoring.db')
+        t0 = time.time()
+        num_tasks = make_monitoring_db(db_file, args.num_rows,
+                                       workflow_name=workflow_name)
+        results = dict(num_rows=args.num_rows, num_tasks=num_tasks,
+                       db_creation_s=time.time() - t0)
+        t0 = time.time()
+        df = query_workflow(workflow_name, db_file=db_file)
+        results['vectorized_s'] = time.time() - t0
+        if not args.skip_legacy:
+            t0 = time.time()
+            df_legacy = legacy_query_workflow(workflow_name, db_file)
+            results['legacy_s'] = time.time() - t0
+            results['speedup'] = results['legacy_s']/results['vectorized_s']
+            results['same_result'] = same_result(df, df_legacy)
+
+    print(json.dumps(results, indent=2))
+    if args.outfile is not None:
+        with open(args.outfile, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the scalability of the Parsl plugin, using
+synthetic GenericWorkflows with a DRP-like topology and no-op commands
+over a range of workflow sizes.  For each size, this times the
+ParslGraph construction and DAG ingestion, save_config and restore,
+status updates from the job log files and from a synthetic
+monitoring.db, and, for the smaller sizes, an end-to-end run on a
+ThreadPool config.  The results are written as json so that they can
+be compared across versions of the code.
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import socket
+import argparse
+import datetime
+import tempfile
+import subprocess
+import parsl
+from desc.gen3_workflow import ParslGraph
+from desc.gen3_workflow.config import load_parsl_config
+from synthetic_workflow import make_synthetic_workflow, make_synthetic_config
+from synthetic_monitoring_db import make_monitoring_db
+
+
+def timed(func, *args, **kwargs):
+    """Return the result of func(*args, **kwargs) and the wall time (s)."""
+    t0 = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - t0
+
+
+def code_version():
+    """Return the git commit of the gen3_workflow package, if available."""
+    package_dir = os.path.dirname(os.path.abspath(
+        sys.modules['desc.gen3_workflow'].__file__))
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=package_dir,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_logs(graph):
+    """Write a 'success' stderr log file for each job in the graph."""
+    log_dir = os.path.join(graph.config['submitPath'], 'logging')
+    for job_name in graph.dag.names:
+        with open(os.path.join(log_dir, f'{job_name}.stderr'), 'w') as fd:
+            fd.write('success\n')
+
+
+def run_workflow(gwf, submit_path, max_threads):
+    """
+    Run the synthetic workflow on a ThreadPool config and return
+    the number of jobs that succeeded.
+    """
+    parsl_config = dict(executor='ThreadPool', max_threads=max_threads,
+                        retries=0, monitoring=False)
+    config = make_synthetic_config(submit_path, parsl_config=parsl_config)
+    dfk = load_parsl_config(config)
+    try:
+        graph = ParslGraph(gwf, config, do_init=False, dfk=dfk,
+                           monitoring_db=os.path.join(submit_path, 'none.db'))
+        # Run without blocking, since the final transfer job needs a
+        # QuantumGraph, and wait for the endpoint jobs instead.
+        graph.run()
+        endpoints = [graph.job_from_id(_) for _ in
+                     (graph.dag.out_degrees() == 0).nonzero()[0]]
+        _ = [job.future.exception() for job in endpoints]
+        graph._update_status_from_logs()
+        summary = graph.status_summary(statuses=['succeeded'])
+        return int(summary['succeeded'].sum())
+    finally:
+        dfk.cleanup()
+        parsl.DataFlowKernelLoader.clear()
+
+
+def benchmark_size(num_jobs, run_max_jobs, max_threads):
+    """Run the benchmarks for a synthetic workflow of the given size."""
+    gwf, dt = timed(make_synthetic_workflow, num_jobs)
+    results = dict(num_jobs=len(gwf), generate_s=dt)
+    with tempfile.TemporaryDirectory() as submit_path:
+        os.makedirs(os.path.join(submit_path, 'logging'))
+        config = make_synthetic_config(submit_path)
+        monitoring_db = os.path.join(submit_path, 'monitoring.db')
+
+        graph, results['construct_s'] = timed(
+            ParslGraph, gwf, config, do_init=False,
+            monitoring_db=monitoring_db)
+        _, results['ingest_s'] = timed(graph._ingest)
+
+        # save_config writes the graph snapshot only if the
+        # GenericWorkflow pickle is in the submit directory, as it is
+        # for a bps submission.
+        with open(os.path.join(submit_path, 'bps_generic_workflow.pickle'),
+                  'wb') as fd:
+            pickle.dump(gwf, fd)
+        config_file = os.path.join(submit_path, 'parsl_graph_config.pickle')
+        _, results['save_config_s'] = timed(graph.save_config, config_file)
+        graph, results['restore_s'] = timed(ParslGraph.restore, config_file,
+                                            use_dfk=False)
+
+        write_logs(graph)
+        _, results['status_from_logs_s'] = timed(
+            graph._update_status_from_logs)
+        # The second scan uses the cached log file stats.
+        _, results['status_from_logs_cached_s'] = timed(
+            graph._update_status_from_logs)
+
+        make_monitoring_db(monitoring_db, None, job_names=graph.dag.names)
+        # The restored graph uses the default monitoring db location.
+        graph.monitoring_db = monitoring_db
+        graph._status_query = None
+        _, results['status_from_db_s'] = timed(graph._update_status)
+        _, results['status_summary_s'] = timed(graph.status_summary)
+
+    if len(gwf) <= run_max_jobs:
+        with tempfile.TemporaryDirectory() as submit_path:
+            os.makedirs(os.path.join(submit_path, 'logging'))
+            num_succeeded, results['run_s'] = timed(
+                run_workflow, gwf, submit_path, max_threads)
+        results['run_succeeded'] = num_succeeded
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_jobs', type=str,
+                        default='1000,10000,100000,1000000',
+                        help='comma-separated approximate workflow sizes')
+    parser.add_argument('--run_max_jobs', type=int, default=10000,
+                        help='largest workflow size for the end-to-end runs')
+    parser.add_argument('--max_threads', type=int, default=8,
+                        help='number of threads for the end-to-end runs')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    args = parser.parse_args()
+
+    report = dict(version=code_version(),
+                  python=sys.version.split()[0],
+                  parsl=parsl.__version__,
+                  host=socket.gethostname(),
+                  date=datetime.datetime.now().isoformat(timespec='seconds'),
+                  sizes=[])
+    for num_jobs in [int(_) for _ in args.num_jobs.split(',')]:
+        report['sizes'].append(
+            benchmark_size(num_jobs, args.run_max_jobs, args.max_threads))
+        print(json.dumps(report['sizes'][-1]), flush=True)
+
+    print(json.dumps(report, indent=2))
+    if args.outfile is not None:
+        with open(args.outfile, 'w') as fd:
+            json.dump(report, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Function to generate a synthetic parsl monitoring.db file with the
+tables and columns used by the `query_workflow` module, for
+benchmarking status queries on large workflows.
+"""
+import os
+import random
+import sqlite3
+import datetime
+from synthetic_workflow import SFP_TASKS
+
+
+__all__ = ['make_monitoring_db']
+
+
+_SCHEMA = ('''create table workflow (run_id text primary key,
+              workflow_name text, time_began datetime,
+              time_completed datetime)''',
+           '''create table task (task_id integer, run_id text,
+              task_func_name text, task_stderr text,
+              task_time_invoked datetime, task_time_returned datetime,
+              task_fail_count integer, primary key (task_id, run_id))''',
+           '''create table status (task_id integer, task_status_name text,
+              timestamp datetime, run_id text, try_id integer,
+              primary key (task_id, run_id, task_status_name, timestamp))''')
+
+_SUCCEEDED = ('pending', 'launched', 'running', 'running_ended', 'exec_done')
+
+_FAILED = ('pending', 'launched', 'running', 'running_ended', 'failed')
+
+
+def make_monitoring_db(db_file, num_status_rows,
+                       workflow_name='u/synthetic/run', fail_rate=0.05,
+                       seed=1234, job_names=None):
+    """
+    Write a monitoring.db file for a single run of a workflow with the
+    task status sequences of completed parsl bash_apps.
+
+    Parameters
+    ----------
+    db_file: str
+        Output filename.  An existing file will be overwritten.
+    num_status_rows: int
+        Approximate number of rows in the status table.  Each task
+        has five status entries.
+    workflow_name: str ['u/synthetic/run']
+        Name of the workflow, i.e., the outputRun collection.
+    fail_rate: float [0.05]
+        Fraction of tasks that fail.
+    seed: int [1234]
+        Random number seed.
+    job_names: list [None]
+        Names of the jobs to use for the tasks, e.g., those of a
+        synthetic workflow.  If given, num_status_rows is ignored, and
+        each job has one task.
+
+    Returns
+    -------
+    int: the number of tasks.
+    """
+    rng = random.Random(seed)
+    if os.path.isfile(db_file):
+        os.remove(db_file)
+    if job_names is None:
+        num_tasks = max(1, num_status_rows//len(_SUCCEEDED))
+    else:
+        num_tasks = len(job_names)
+    run_id = 'b3f1c0de-0000-4000-8000-000000000000'
+    t0 = datetime.datetime(2023, 1, 1)
+
+    def timestamp(seconds):
+        return str(t0 + datetime.timedelta(seconds=seconds))
+
+    def tasks():
+        for task_id in range(num_tasks):
+            if job_names is None:
+                label = SFP_TASKS[task_id % len(SFP_TASKS)]
+                job_name = (f'{rng.getrandbits(32):08x}-0000-4000-8000-'
+                            f'{task_id:012d}_{label}_{task_id}')
+            else:
+                job_name = job_names[task_id]
+                label = job_name.split('_')[1]
+            yield (task_id, run_id, label,
+                   f'/submit/logging/{job_name}.stderr',
+                   timestamp(task_id), timestamp(task_id + 60),
+                   0)
+
+    def statuses():
+        for task_id in range(num_tasks):
+            sequence = _FAILED if rng.random() < fail_rate else _SUCCEEDED
+            for i, status in enumerate(sequence):
+                yield (task_id, status, timestamp(task_id + 15*i), run_id, 0)
+
+    with sqlite3.connect(db_file) as conn:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.execute('insert into workflow values (?, ?, ?, ?)',
+                     (run_id, workflow_name, timestamp(0),
+                      timestamp(num_tasks + 120)))
+        conn.executemany('insert into task values (?, ?, ?, ?, ?, ?, ?)',
+                         tasks())
+        conn.executemany('insert into status values (?, ?, ?, ?, ?)',
+                         statuses())
+    return num_tasks
@@ -0,0 +1,135 @@
+"""
+Functions to generate synthetic GenericWorkflows with a DRP-like
+topology for benchmarking the Parsl plugin independently of the
+pipetasks themselves.
+"""
+import random
+import uuid
+from lsst.ctrl.bps import BpsConfig, GenericWorkflow, GenericWorkflowJob, \
+    GenericWorkflowExec
+
+
+__all__ = ['make_synthetic_workflow', 'make_synthetic_config',
+           'workflow_dimensions']
+
+
+SFP_TASKS = ('isr', 'characterizeImage', 'calibrate', 'writeSourceTable',
+             'transformSourceTable')
+BANDS = 'ugrizy'
+
+
+def workflow_dimensions(num_jobs, num_detectors=189, patches_per_visit=4,
+                        num_patches=49):
+    """
+    Return the number of visits needed to produce a workflow with
+    approximately `num_jobs` jobs for the given numbers of detectors
+    and patches.
+    """
+    num_bands = len(BANDS)
+    per_visit = num_detectors*len(SFP_TASKS) + 1 + patches_per_visit
+    per_patch = 4*num_bands + 3
+    num_visits = max(1, (num_jobs - per_patch*num_patches)//per_visit)
+    return num_visits, num_detectors, patches_per_visit, num_patches
+
+
+def make_synthetic_workflow(num_jobs, num_detectors=189, patches_per_visit=4,
+                            num_patches=49, command='true', seed=1234,
+                            name='synthetic'):
+    """
+    Generate a GenericWorkflow with a DRP-like topology:  per-detector
+    single frame processing chains, per-visit summaries, per-patch
+    warps and coadds, and per-patch multiband processing.  All of the
+    jobs run the same no-op command.
+
+    Parameters
+    ----------
+    num_jobs: int
+        Approximate number of jobs in the workflow.
+    num_detectors: int [189]
+        Number of detectors per visit.
+    patches_per_visit: int [4]
+        Number of patches overlapped by each visit.
+    num_patches: int [49]
+        Number of patches in the tract.
+    command: str ['true']
+        Command to run for each job.
+    seed: int [1234]
+        Random number seed used for generating the UUIDs in job names.
+    name: str ['synthetic']
+        Name of the workflow.
+
+    Returns
+    -------
+    lsst.ctrl.bps.GenericWorkflow
+    """
+    rng = random.Random(seed)
+    num_visits, num_detectors, patches_per_visit, num_patches \
+        = workflow_dimensions(num_jobs, num_detectors=num_detectors,
+                              patches_per_visit=patches_per_visit,
+                              num_patches=num_patches)
+    gwf = GenericWorkflow(name)
+    executable = GenericWorkflowExec('noop', src_uri=command,
+                                     transfer_executable=False)
+
+    def add_job(label, data_id, parents=()):
+        job_name = '_'.join([str(uuid.UUID(int=rng.getrandbits(128),
+                                           version=4)), label]
+                            + [str(_) for _ in data_id])
+        gwf_job = GenericWorkflowJob(job_name, label=label)
+        gwf_job.executable = executable
+        gwf_job.arguments = ''
+        gwf_job.request_memory = 2048
+        gwf_job.request_cpus = 1
+        gwf_job.request_disk = 0
+        gwf.add_job(gwf_job, parent_names=list(parents))
+        return job_name
+
+    warps = {}
+    for visit in range(num_visits):
+        band = BANDS[visit % len(BANDS)]
+        calibs = []
+        for detector in range(num_detectors):
+            parent = ()
+            for label in SFP_TASKS:
+                job_name = add_job(label, (visit, detector), parent)
+                if label == 'calibrate':
+                    calibs.append(job_name)
+                parent = (job_name,)
+        summary = add_job('consolidateVisitSummary', (visit,), calibs)
+        for i in range(patches_per_visit):
+            patch = (visit + i) % num_patches
+            warps.setdefault((patch, band), []).append(
+                add_job('makeWarp', (visit, patch), (summary,)))
+
+    for patch in range(num_patches):
+        detections = []
+        for band in BANDS:
+            coadd = add_job('assembleCoadd', (patch, band),
+                            warps.get((patch, band), ()))
+            detections.append(add_job('detection', (patch, band), (coadd,)))
+        merged = add_job('mergeCoaddDetections', (patch,), detections)
+        deblend = add_job('deblend', (patch,), (merged,))
+        measures = [add_job('measure', (patch, band), (deblend,))
+                    for band in BANDS]
+        merged = add_job('mergeMeasurements', (patch,), measures)
+        for band in BANDS:
+            add_job('forcedPhotCoadd', (patch, band), (merged,))
+    return gwf
+
+
+def make_synthetic_config(submit_path, output_run='u/synthetic/run',
+                          parsl_config=None):
+    """
+    Return a minimal BpsConfig for constructing a ParslGraph from a
+    synthetic workflow.
+    """
+    if parsl_config is None:
+        parsl_config = dict(executor='ThreadPool', max_threads=4,
+                            retries=0, monitoring=False)
+    return BpsConfig(dict(submitPath=submit_path,
+                          outputRun=output_run,
+                          butlerConfig=submit_path,
+                          templateDataId='{visit}_{detector}',
+                          cluster={},
+                          parslConfig='',
+                          parsl_config=parsl_config))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Benchmark comparing the per-quantum overhead of running a job as a
+new bash process, which starts a Python interpreter and imports the
+LSST stack, with running it in a child process forked from a warm
+worker that has already done those imports.  The quanta themselves
+are no-ops, so the timings measure only the process startup costs.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import subprocess
+from desc.gen3_workflow.warm_workers import WARM_MODULES, warm_up, run_forked
+
+
+def bash_quantum(modules, log_file):
+    """Run a no-op quantum in bash as the bash_apps do."""
+    imports = '; '.join(f'import {_}' for _ in modules)
+    command = (f'{sys.executable} -c "{imports}" '
+               '&& >&2 echo success || (>&2 echo failure; false)')
+    with open(log_file, 'a') as output:
+        return subprocess.run(command, shell=True, executable='/bin/bash',
+                              stdout=output, stderr=output).returncode
+
+
+def no_op():
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_quanta', type=int, default=20,
+                        help='number of no-op quanta to run for each mode')
+    parser.add_argument('--modules', type=str, default=','.join(WARM_MODULES),
+                        help='comma-separated modules to import')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    args = parser.parse_args()
+    modules = args.modules.split(',')
+
+    results = dict(num_quanta=args.num_quanta, modules=modules)
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_file = os.path.join(log_dir, 'quantum.stderr')
+
+        t0 = time.time()
+        for _ in range(args.num_quanta):
+            assert bash_quantum(modules, log_file) == 0
+        results['bash_s_per_quantum'] = (time.time() - t0)/args.num_quanta
+
+        t0 = time.time()
+        warm_up(modules)
+        results['warm_up_s'] = time.time() - t0
+        t0 = time.time()
+        for _ in range(args.num_quanta):
+            assert run_forked(no_op, (), log_file) == 0
+        results['warm_s_per_quantum'] = (time.time() - t0)/args.num_quanta
+    results['speedup'] = (results['bash_s_per_quantum']
+                          /results['warm_s_per_quantum'])
+
+    print(json.dumps(results, indent=2))
+    if args.outfile is not None:
+        with open(args.outfile, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
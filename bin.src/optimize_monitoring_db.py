@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+Script to create the indexes used by the workflow status queries in a
+Parsl monitoring db file and to report the query timings before and
+after.
+"""
+import argparse
+from desc.gen3_workflow import optimize_monitoring_db
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('workflow_name', type=str,
+                    help='Name of workflow instance in the workflow table')
+parser.add_argument('--db_file', type=str, default='./runinfo/monitoring.db',
+                    help='Name of monitoring db file')
+parser.add_argument('--timeout', type=float, default=60,
+                    help='Time in seconds to wait for a lock on the db')
+args = parser.parse_args()
+
+optimize_monitoring_db(args.workflow_name, db_file=args.db_file,
+                       timeout=args.timeout)
@@ -37,10 +37,10 @@ if args.workflow_name is None:
     sys.exit(0)
 
 
-query = f'''select run_id, time_began from workflow where
-            workflow_name="{args.workflow_name}"'''
+query = '''select run_id, time_began from workflow where
+           workflow_name=?'''
 with sqlite3.connect(args.db_file) as conn:
-    df = pd.read_sql(query, conn)
+    df = pd.read_sql(query, conn, params=(args.workflow_name,))
     run_ids = df['run_id'].to_list()
     start_times = [_[:len('2021-05-20 11:33')].replace(' ', '_')
                    for _ in df['time_began']]
@@ -48,17 +48,16 @@ with sqlite3.connect(args.db_file) as conn:
 for run_id, start_time in zip(run_ids, start_times):
     if args.run_id is not None and run_id != args.run_id:
         continue
-    query = f'''select task.task_stderr, status.task_status_name,
-                status.timestamp
-                from task join status on task.task_id=status.task_id and
-                task.run_id=status.run_id join workflow
-                on task.run_id=workflow.run_id where
-                workflow.run_id="{run_id}"
-                and task.task_stderr is not null
-                order by task.task_stderr, status.timestamp desc'''
+    query = '''select task.task_stderr, status.task_status_name,
+               status.timestamp
+               from task join status on task.task_id=status.task_id and
+               task.run_id=status.run_id where
+               task.run_id=?
+               and task.task_stderr is not null
+               order by task.task_stderr, status.timestamp desc'''
 
     with sqlite3.connect(args.db_file) as conn:
-        df0 = pd.read_sql(query, conn)
+        df0 = pd.read_sql(query, conn, params=(run_id,))
 
     if len(df0) == 0:
         continue
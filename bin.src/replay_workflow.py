@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Script to predict the time history of the number of concurrent jobs
+for a workflow run under a different parsl_config, using the job
+runtimes recorded in a Parsl monitoring db file.
+"""
+import os
+import argparse
+import numpy as np
+import yaml
+import matplotlib.pyplot as plt
+from desc.gen3_workflow import ParslGraph, monitoring_task_history, \
+    replay_workflow
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('workflow_name', type=str,
+                    help='Name of workflow instance in the workflow table')
+parser.add_argument('parsl_config', type=str,
+                    help=('yaml file with the parsl_config to simulate, '
+                          'either a bps config or just the parsl_config '
+                          'entries'))
+parser.add_argument('--db_file', type=str, default='./runinfo/monitoring.db',
+                    help='Name of monitoring db file')
+parser.add_argument('--graph_file', type=str, default=None,
+                    help=('ParslGraph config pickle file. If None, then use '
+                          'submit/<workflow_name>/parsl_graph_config.pickle'))
+parser.add_argument('--cores_per_node', type=int, default=None,
+                    help='Cores per node if not set by the worker options')
+parser.add_argument('--memory_per_node', type=float, default=None,
+                    help=('Memory per node in GB if not set by the worker '
+                          'options. If None, memory is not constrained.'))
+parser.add_argument('--block_queue_time', type=float, default=0,
+                    help='Hours between the end of a block and the next one')
+parser.add_argument('--tiers', type=str, default=None,
+                    help=('yaml file with the executor tiers to simulate, '
+                          'keyed by executor label, each with nodes, '
+                          'mem_per_worker (GB), and, optionally, '
+                          'cores_per_worker entries'))
+parser.add_argument('--memory_source', type=str, default='requested',
+                    choices=('requested', 'observed'),
+                    help=('Use the memory requested by the resource specs '
+                          'or the observed peak memory to place the jobs'))
+parser.add_argument('--memory_margin', type=float, default=1,
+                    help='Factor to apply to the observed peak memory')
+parser.add_argument('--policy', type=str, default=None,
+                    help=('Submission policy. If None, then use the '
+                          'submission_priority in the parsl_config'))
+args = parser.parse_args()
+
+with open(args.parsl_config) as fd:
+    parsl_config = yaml.safe_load(fd)
+parsl_config = parsl_config.get('parsl_config', parsl_config)
+
+tiers = None
+if args.tiers is not None:
+    with open(args.tiers) as fd:
+        tiers = yaml.safe_load(fd)
+
+graph_file = args.graph_file
+if graph_file is None:
+    graph_file = os.path.join('submit', args.workflow_name,
+                              'parsl_graph_config.pickle')
+graph = ParslGraph.restore(graph_file, use_dfk=False)
+
+history = monitoring_task_history(args.workflow_name, db_file=args.db_file)
+result = replay_workflow(graph, parsl_config, history=history,
+                         policy=args.policy,
+                         memory_source=args.memory_source,
+                         memory_margin=args.memory_margin,
+                         tiers=tiers,
+                         cores_per_node=args.cores_per_node,
+                         memory_per_node=args.memory_per_node,
+                         block_queue_time=args.block_queue_time)
+
+if not history.empty:
+    observed = 24.*(history['end'].max() - history['start'].min())
+    print(f'observed makespan: {observed:.2f} h')
+print(result.cluster)
+for key, value in result.summary().items():
+    print(f'{key}: {value:.4g}')
+
+dt = 10/3600.   # Sample every 10 seconds
+df = result.concurrent_jobs(dt=dt)
+outfile = f'{args.workflow_name.replace("/", "_")}_replay'
+plt.figure()
+edges = np.append(df['time'] - 30*dt, df['time'].iloc[-1] + 30*dt)
+tasks = [_ for _ in df.columns if _ != 'time']
+for task in tasks:
+    plt.stairs(df[task], edges, label=task)
+plt.stairs(df[tasks].sum(axis=1), edges, label='all tasks', color='grey',
+           linestyle=':')
+plt.legend(fontsize='x-small')
+plt.xlabel('minutes')
+plt.ylabel('# concurrent jobs')
+plt.title(f'{args.workflow_name} replay')
+plt.savefig(f'{outfile}.png')
+df.to_pickle(f'{outfile}.pickle')
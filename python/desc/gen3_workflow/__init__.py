@@ -5,3 +5,18 @@ from .query_workflow import *
 from .count_task_inputs import *
 from .create_process_dag import *
 from .lazy_cl_handling import *
+from .log_status import *
+from .output_verifier import *
+from .submission import *
+from .compact_dag import *
+from .graph_snapshot import *
+from .qgraph_shards import *
+from .priorities import *
+from .chain_clusters import *
+from .warm_workers import *
+from .finalization import *
+from .memory_escalation import *
+from .executor_routing import *
+from .simulator import *
+from .replay import *
+from .phase_timing import *
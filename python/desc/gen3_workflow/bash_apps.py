@@ -1,19 +1,47 @@
 import parsl
 
-__all__ = ['small_bash_app', 'medium_bash_app', 'large_bash_app',
-           'local_bash_app']
+__all__ = ['get_bash_app']
 
 ignore_for_cache = ['stdout', 'stderr']
 #, 'wrap', 'parsl_resource_specification']
 
-small_bash_app = parsl.bash_app(executors=['batch-small'], cache=True,
-                                ignore_for_cache=ignore_for_cache)
 
-medium_bash_app = parsl.bash_app(executors=['batch-medium'], cache=True,
-                                ignore_for_cache=ignore_for_cache)
+# Cache of bash_apps, keyed by (task label, executor label, resource_spec).
+_BASH_APPS = {}
 
-large_bash_app = parsl.bash_app(executors=['batch-large'], cache=True,
-                                ignore_for_cache=ignore_for_cache)
 
-local_bash_app = parsl.bash_app(executors=['submit-node'], cache=True,
-                                ignore_for_cache=ignore_for_cache)
+def get_bash_app(task_label, executor, resource_spec=False):
+    """
+    Return a parsl.bash_app that runs a command line on the specified
+    executor.  The apps are created once per task label and executor
+    and reused for all of the jobs with those values.  The task label
+    is used as the app name so that the monitoring db can distinguish
+    the different task types.
+
+    Parameters
+    ----------
+    task_label: str
+        Label of the pipetask.
+    executor: str
+        Label of the parsl executor.
+    resource_spec: bool [False]
+        Flag to have the app accept a `parsl_resource_specification`
+        keyword argument, as used by the WorkQueueExecutor.  This is
+        passed with each call so that the same app can be used for
+        jobs with different resource needs.
+    """
+    key = (task_label, executor, resource_spec)
+    if key not in _BASH_APPS:
+        if resource_spec:
+            def run_command(command_line, inputs=(), stdout=None,
+                            stderr=None, parsl_resource_specification=None):
+                return command_line
+        else:
+            def run_command(command_line, inputs=(), stdout=None,
+                            stderr=None):
+                return command_line
+        run_command.__name__ = task_label
+        _BASH_APPS[key] = parsl.bash_app(run_command, executors=[executor],
+                                         cache=True,
+                                         ignore_for_cache=ignore_for_cache)
+    return _BASH_APPS[key]
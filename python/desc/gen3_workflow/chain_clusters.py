@@ -0,0 +1,101 @@
+"""
+Module to group linear chains of jobs that share a dataId, e.g., the
+single frame processing tasks for each detector-visit, so that each
+chain can be run as a single pipetask invocation.
+"""
+import numpy as np
+
+
+__all__ = ['ChainClusters']
+
+
+def _data_id(job_name, label):
+    """Return the dataId part of a job name, i.e., the part after the
+    task label."""
+    return job_name.partition(f'_{label}_')[2]
+
+
+class ChainClusters:
+    """
+    Linear chains of jobs, as specified by lists of task labels in the
+    `chain_clusters` entry of the parsl_config section of the bps
+    config, e.g.,
+
+    chain_clusters:
+      sfp: [isr, characterizeImage, calibrate]
+
+    A chain starts at a job with the first label in the list and is
+    extended by a downstream job with the next label if that job has
+    the same dataId and has no other prerequisites.  The jobs in each
+    chain must use the same command line template apart from the
+    qgraphNodeId values.
+    """
+    def __init__(self, graph, rules):
+        """
+        Parameters
+        ----------
+        graph: ParslGraph
+            The graph containing the jobs.
+        rules: dict
+            Lists of task labels keyed by cluster name.
+        """
+        self.rules = {name: list(labels) for name, labels in rules.items()}
+        self.chain_index = np.full(len(graph.dag), -1, dtype=np.int32)
+        self.chains = []
+        self._find_chains(graph)
+
+    def _find_chains(self, graph):
+        dag = graph.dag
+        in_degrees = dag.in_degrees()
+        for labels in self.rules.values():
+            for job_id in range(len(dag)):
+                if (self.chain_index[job_id] >= 0
+                        or graph.job_label(job_id) != labels[0]):
+                    continue
+                chain = [job_id]
+                data_id = _data_id(dag.names[job_id], labels[0])
+                for label in labels[1:]:
+                    candidates = [
+                        _ for _ in dag.successors(chain[-1]).tolist()
+                        if (in_degrees[_] == 1 and self.chain_index[_] < 0
+                            and graph.job_label(_) == label
+                            and _data_id(dag.names[_], label) == data_id)]
+                    if len(candidates) != 1:
+                        break
+                    chain.append(candidates[0])
+                if len(chain) > 1:
+                    self.chain_index[chain] = len(self.chains)
+                    self.chains.append(tuple(chain))
+
+    def __len__(self):
+        return len(self.chains)
+
+    def chain(self, job_id):
+        """Return the tuple of job IDs in the chain containing the
+        specified job, or None if the job isn't in a chain."""
+        index = self.chain_index[job_id]
+        if index < 0:
+            return None
+        return self.chains[index]
+
+    def propagate_status(self, status_index, has_entry):
+        """
+        Set the status codes of chain members without their own status
+        entries, e.g., in the monitoring db, to the code of the
+        preceding member that has one, since that member's invocation
+        also ran the later members.
+
+        Parameters
+        ----------
+        status_index: numpy.ndarray
+            Status codes indexed by job ID.  This is modified in place.
+        has_entry: set
+            IDs of the jobs with status entries.
+        """
+        for chain in self.chains:
+            code = None
+            for job_id in chain:
+                if job_id in has_entry:
+                    code = status_index[job_id]
+                elif code is not None:
+                    status_index[job_id] = code
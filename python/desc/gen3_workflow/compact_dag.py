@@ -0,0 +1,171 @@
+"""
+Compact representation of a workflow DAG using integer job IDs and
+CSR-style (compressed sparse row) adjacency arrays.
+"""
+import sys
+from array import array
+import numpy as np
+
+
+__all__ = ['CompactDag']
+
+
+def _csr_arrays(src, dst, num_nodes):
+    """
+    Build CSR arrays for the adjacency lists of the nodes given the
+    source and destination IDs of each edge.  The neighbors of node i
+    are `indices[indptr[i]:indptr[i+1]]`.
+    """
+    counts = np.bincount(src, minlength=num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    order = np.argsort(src, kind='stable')
+    indices = np.ascontiguousarray(dst[order], dtype=np.int32)
+    return indptr, indices
+
+
+class CompactDag:
+    """
+    Integer-indexed DAG.  Job names are interned and stored once in
+    the `names` list, and the predecessors and successors of each job
+    are stored in CSR arrays.
+    """
+    def __init__(self, names, src, dst):
+        """
+        Parameters
+        ----------
+        names: list
+            Job names.  The position in this list is the job ID.
+        src: numpy.ndarray
+            Job IDs of the upstream ends of each edge.
+        dst: numpy.ndarray
+            Job IDs of the downstream ends of each edge.
+        """
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+        self.succ_ptr, self.succ_idx = _csr_arrays(src, dst, len(names))
+        self.pred_ptr, self.pred_idx = _csr_arrays(dst, src, len(names))
+
+    @staticmethod
+    def from_csr_arrays(names, succ_ptr, succ_idx, pred_ptr, pred_idx):
+        """
+        Build a CompactDag from previously computed CSR arrays, e.g.,
+        as read from a GraphSnapshot.
+
+        Returns
+        -------
+        CompactDag
+        """
+        dag = CompactDag.__new__(CompactDag)
+        dag.names = names
+        dag.index = {name: i for i, name in enumerate(names)}
+        dag.succ_ptr, dag.succ_idx = succ_ptr, succ_idx
+        dag.pred_ptr, dag.pred_idx = pred_ptr, pred_idx
+        return dag
+
+    @staticmethod
+    def from_generic_workflow(generic_workflow, exclude=('pipetaskInit',)):
+        """
+        Build a CompactDag from the networkx adjacency data of a
+        GenericWorkflow.
+
+        Parameters
+        ----------
+        generic_workflow: `lsst.ctrl.bps.generic_workflow.GenericWorkflow`
+            Generic representation of a single workflow.
+        exclude: tuple [('pipetaskInit',)]
+            Names of jobs to omit, along with their edges.
+
+        Returns
+        -------
+        CompactDag
+        """
+        names = [sys.intern(_) for _ in generic_workflow if _ not in exclude]
+        index = {name: i for i, name in enumerate(names)}
+        src, dst = array('i'), array('i')
+        for job_name, successors in generic_workflow.adjacency():
+            job_id = index.get(job_name)
+            if job_id is None:
+                continue
+            for successor in successors:
+                successor_id = index.get(successor)
+                if successor_id is not None:
+                    src.append(job_id)
+                    dst.append(successor_id)
+        return CompactDag(names, np.array(src, dtype=np.int32),
+                          np.array(dst, dtype=np.int32))
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def num_edges(self):
+        """Number of edges in the DAG."""
+        return len(self.succ_idx)
+
+    def successors(self, job_id):
+        """Array of the IDs of the downstream jobs of the specified job."""
+        return self.succ_idx[self.succ_ptr[job_id]:self.succ_ptr[job_id + 1]]
+
+    def predecessors(self, job_id):
+        """Array of the IDs of the upstream jobs of the specified job."""
+        return self.pred_idx[self.pred_ptr[job_id]:self.pred_ptr[job_id + 1]]
+
+    def in_degrees(self):
+        """Array of the number of predecessors of each job."""
+        return np.diff(self.pred_ptr)
+
+    def out_degrees(self):
+        """Array of the number of successors of each job."""
+        return np.diff(self.succ_ptr)
+
+    def edges(self):
+        """Return the (src, dst) arrays of job IDs for all of the edges."""
+        src = np.repeat(np.arange(len(self), dtype=np.int32),
+                        self.out_degrees())
+        return src, self.succ_idx
+
+    def bottom_levels(self, weights):
+        """
+        Compute the bottom level of each job, i.e., the largest sum of
+        the weights of the jobs along any path from the job to the end
+        of the DAG, including the job itself.  The DAG is swept from
+        the endpoints upwards one frontier at a time, so the number of
+        numpy operations scales with the depth of the DAG rather than
+        with the number of jobs.
+
+        Parameters
+        ----------
+        weights: numpy.ndarray
+            Weight, e.g., the estimated runtime, of each job.
+
+        Returns
+        -------
+        numpy.ndarray of floats
+        """
+        weights = np.asarray(weights, dtype=float)
+        remaining = self.out_degrees().astype(np.int64)
+        downstream = np.zeros(len(self))
+        levels = np.zeros(len(self))
+        frontier = np.flatnonzero(remaining == 0)
+        num_done = 0
+        while frontier.size > 0:
+            levels[frontier] = weights[frontier] + downstream[frontier]
+            num_done += frontier.size
+            # Propagate the levels of the frontier jobs to their
+            # predecessors.
+            starts = self.pred_ptr[frontier]
+            counts = self.pred_ptr[frontier + 1] - starts
+            offsets = (np.repeat(starts - np.cumsum(counts) + counts, counts)
+                       + np.arange(counts.sum()))
+            preds = self.pred_idx[offsets]
+            np.maximum.at(downstream, preds, np.repeat(levels[frontier],
+                                                       counts))
+            np.subtract.at(remaining, preds, 1)
+            preds = np.unique(preds)
+            frontier = preds[remaining[preds] == 0]
+        if num_done != len(self):
+            raise RuntimeError('Cycle found in workflow DAG.')
+        return levels
@@ -40,13 +40,21 @@ class HtxFactory:
         else:
             self.scheduler_options_template = scheduler_options_template
 
-    def create(self, label, arch, qos, mem_per_worker, walltime):
-        """Create a HighThroughputExecutor object"""
+    def create(self, label, arch, qos, mem_per_worker, walltime,
+               cores_per_worker=None):
+        """
+        Create a HighThroughputExecutor object.  If cores_per_worker
+        is given, jobs needing more cores are not routed to the
+        executor.
+        """
         scheduler_options = self.scheduler_options_template.format(arch, qos)
         provider = SlurmProvider("None", walltime=walltime,
                                  scheduler_options=scheduler_options,
                                  **self.provider_options)
+        htx_options = dict(self.htx_options)
+        if cores_per_worker is not None:
+            htx_options['cores_per_worker'] = cores_per_worker
         return HighThroughputExecutor(label=label,
                                       mem_per_worker=mem_per_worker,
                                       address=address_by_hostname(),
-                                      provider=provider, **self.htx_options)
+                                      provider=provider, **htx_options)
@@ -1,6 +1,7 @@
 """
 Module to perform runtime-specified loading of the parsl config.
 """
+import os
 import logging
 import parsl
 from parsl.executors import WorkQueueExecutor, ThreadPoolExecutor
@@ -11,6 +12,7 @@ from parsl.addresses import address_by_hostname
 from parsl.utils import get_all_checkpoints
 from lsst.ctrl.bps import BpsConfig
 import lsst.utils
+from ..memory_escalation import MemoryEscalation, MEMORY_RECORDS_FILE
 
 
 __all__ = ['load_parsl_config', 'set_parsl_logging']
@@ -116,12 +118,14 @@ def pbspro_provider(nodes_per_block=1, qos='expert', parallelism=0,
 
 def set_config_options(retries, monitoring, workflow_name, checkpoint,
                        monitoring_debug, monitoring_hub_port,
-                       monitoring_interval):
+                       monitoring_interval, retry_handler=None):
     """
     Package retries, monitoring, and checkpoint options for
     parsl.config.Config as a dict.
     """
     config_options = {'retries': retries}
+    if retry_handler is not None:
+        config_options['retry_handler'] = retry_handler
     if monitoring:
         config_options['monitoring'] \
             = MonitoringHub(hub_address=address_by_hostname(),
@@ -140,7 +144,7 @@ def workqueue_config(provider=None, monitoring=False, workflow_name=None,
                      checkpoint=False,  retries=1, worker_options="",
                      wq_max_retries=1, port=0, monitoring_debug=False,
                      monitoring_hub_port=None, monitoring_interval=60,
-                     coprocess=False,
+                     coprocess=False, retry_handler=None,
                      **unused_options):
     """
     Load a parsl config for a WorkQueueExecutor and the supplied provider.
@@ -155,7 +159,7 @@ def workqueue_config(provider=None, monitoring=False, workflow_name=None,
     config_options = set_config_options(retries, monitoring, workflow_name,
                                         checkpoint, monitoring_debug,
                                         monitoring_hub_port,
-                                        monitoring_interval)
+                                        monitoring_interval, retry_handler)
 
     config = parsl.config.Config(strategy='simple',
                                  garbage_collect=False,
@@ -170,18 +174,33 @@ def thread_pool_config(max_threads=1, monitoring=False, workflow_name=None,
                        labels=('submit-node', 'batch-small',
                                'batch-medium', 'batch-large'),
                        monitoring_debug=False, monitoring_hub_port=None,
-                       monitoring_interval=60, **unused_options):
+                       monitoring_interval=60, retry_handler=None,
+                       **unused_options):
     """Load a parsl config using ThreadPoolExecutor."""
     executors = [ThreadPoolExecutor(max_threads=max_threads, label=label)
                  for label in labels]
     config_options = set_config_options(retries, monitoring, workflow_name,
                                         checkpoint, monitoring_debug,
                                         monitoring_hub_port,
-                                        monitoring_interval)
+                                        monitoring_interval, retry_handler)
     config = parsl.config.Config(executors=executors, **config_options)
     return parsl.load(config)
 
 
+def memory_escalation_handler(bps_config):
+    """
+    Return the MemoryEscalation retry handler for the oom_memory_factor
+    in the parsl_config, or None if oom_memory_factor is not set.
+    """
+    oom_memory_factor = dict(bps_config['parsl_config']).get(
+        'oom_memory_factor')
+    if not oom_memory_factor:
+        return None
+    return MemoryEscalation(
+        os.path.join(bps_config['submitPath'], MEMORY_RECORDS_FILE),
+        factor=oom_memory_factor)
+
+
 def load_parsl_config(bps_config):
     """Load the parsl config using the options in bps_config."""
     log_level = set_parsl_logging(bps_config)
@@ -189,7 +208,13 @@ def load_parsl_config(bps_config):
     # Handle the case where parslConfig is set to a config module.
     module_name = bps_config['parslConfig']
     if module_name != "" and not isinstance(module_name, BpsConfig):
-        return lsst.utils.doImport(module_name).DFK
+        dfk = lsst.utils.doImport(module_name).DFK
+        # Config modules enable retries without a retry_handler, so
+        # install the memory escalation handler here, if it's enabled
+        # by oom_memory_factor.
+        if dfk.config.retries > 0 and dfk.config.retry_handler is None:
+            dfk.config.retry_handler = memory_escalation_handler(bps_config)
+        return dfk
 
     # Load using a runtime-configurable parsl config.
     #
@@ -202,6 +227,11 @@ def load_parsl_config(bps_config):
     config['workflow_name'] \
         = config.get('workflow_name', bps_config['outputRun'])
 
+    # Retry jobs that run out of memory with escalated memory requests
+    # if oom_memory_factor is set.
+    if config['retries'] > 0:
+        config['retry_handler'] = memory_escalation_handler(bps_config)
+
     if config['executor'] == 'ThreadPool':
         return thread_pool_config(**config)
 
@@ -0,0 +1,118 @@
+"""
+Module to route jobs to the parsl executor tier that best fits their
+resource requests, using a table built from the executors of the
+DataFlowKernel.
+"""
+import os
+import inspect
+from .memory_escalation import executor_memory
+
+
+__all__ = ['RoutingTable']
+
+
+def worker_cores(executor):
+    """
+    Return the cores_per_worker of an executor if it was set to
+    something other than the default of the executor's class, e.g.,
+    the 1.0 of HighThroughputExecutor, or None otherwise, since the
+    default doesn't reflect the cores available to the jobs.
+    """
+    cores = getattr(executor, 'cores_per_worker', None)
+    try:
+        parameter = inspect.signature(type(executor).__init__)\
+                           .parameters.get('cores_per_worker')
+    except (TypeError, ValueError):
+        parameter = None
+    if parameter is not None and cores == parameter.default:
+        return None
+    return cores
+
+
+class RoutingTable:
+    """
+    Table of the executor tiers, i.e., the executors with a known
+    memory per worker, ordered by memory per worker.  Jobs are routed
+    to the tier with the least memory, and then the fewest cores, that
+    satisfies their resource requests.  The cores are only compared
+    for tiers whose cores_per_worker was set explicitly.  If a WorkQueueExecutor is
+    present, all jobs are routed to it, since it packs jobs onto
+    workers according to their resource specifications.
+    """
+    def __init__(self, executors, log_file=None):
+        """
+        Parameters
+        ----------
+        executors: dict
+            parsl executors keyed by label, e.g., `dfk.executors`.
+        log_file: str [None]
+            File to which the routing decision for each job is written.
+        """
+        self.work_queue = 'work_queue' in executors
+        memory = executor_memory(executors)
+        self.tiers = sorted(
+            ((label, mem, worker_cores(executors[label]))
+             for label, mem in memory.items()
+             if label not in ('submit-node', 'work_queue')),
+            key=lambda tier: (tier[1], tier[2] or 0, tier[0]))
+        # Executors without memory limits, used if no tiers are
+        # defined, or as the default for jobs that don't fit any tier.
+        if 'batch-large' in executors:
+            self.default = 'batch-large'
+        elif self.tiers:
+            self.default = self.tiers[-1][0]
+        else:
+            self.default = next((_ for _ in executors if _ != 'submit-node'),
+                                'submit-node')
+        self.log_file = log_file
+        self._log = None
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def __repr__(self):
+        lines = [f'{"executor":20s}{"memory (MB)":>14s}{"cores":>8s}']
+        for label, memory, cores in self.tiers:
+            cores = '' if cores is None else f'{cores:g}'
+            lines.append(f'{label:20s}{memory:14d}{cores:>8s}')
+        if self.work_queue:
+            lines.append('all jobs are routed to work_queue')
+        else:
+            lines.append(f'default: {self.default}')
+        return '\n'.join(lines)
+
+    @property
+    def labels(self):
+        """Labels of the executors to which jobs can be routed."""
+        if self.work_queue:
+            return ['work_queue']
+        labels = [_[0] for _ in self.tiers]
+        if self.default not in labels:
+            labels.append(self.default)
+        return labels
+
+    def route(self, resource_spec):
+        """
+        Return the label of the executor for a job with the given
+        resource specification.
+        """
+        if self.work_queue:
+            return 'work_queue'
+        memory = resource_spec.get('memory') or 0
+        cores = resource_spec.get('cores') or 0
+        for label, tier_memory, tier_cores in self.tiers:
+            if memory <= tier_memory and (tier_cores is None
+                                          or cores <= tier_cores):
+                return label
+        return self.default
+
+    def log(self, job_name, resource_spec, label):
+        """Write the routing decision for a job to the log file."""
+        if self.log_file is None:
+            return
+        if self._log is None:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            self._log = open(self.log_file, 'a', buffering=1)
+        self._log.write(f"{job_name} memory={resource_spec.get('memory')} "
+                        f"cores={resource_spec.get('cores')} "
+                        f"executor={label}\n")
@@ -0,0 +1,163 @@
+"""
+Module to transfer the outputs of a workflow from the quantum-backed
+butler to the destination repo in parallel, per-QuantumGraph-shard
+transfers, which can also be run incrementally as the jobs in each
+shard finish.
+"""
+import os
+import json
+import time
+import threading
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+__all__ = ['ShardedFinalizer']
+
+
+_RECORD_FILE = 'finalized_shards.json'
+
+
+def _job_succeeded(job):
+    """Return True if a job has finished successfully, either in
+    this session or in a previous one."""
+    future = job.future
+    if future is not None and future.done():
+        return future.exception() is None
+    return job.done
+
+
+class ShardedFinalizer:
+    """
+    Class to run the final job, i.e., the `final_job.bash` script
+    written by bps, separately for each QuantumGraph shard of a
+    workflow, using a pool of threads to run the transfers in
+    parallel.  The graph IDs of the transferred shards are recorded in
+    the submit directory so that restarts do not redo them.
+    """
+    def __init__(self, graph, num_workers=1):
+        """
+        Parameters
+        ----------
+        graph: ParslGraph
+            The graph with the jobs to finalize.  QuantumGraph shards
+            must have been written for it.
+        num_workers: int [1]
+            Number of shard transfers to run in parallel.
+        """
+        self.graph = graph
+        self.shards = graph.qgraph_shards
+        if self.shards is None:
+            raise RuntimeError('QuantumGraph shards are needed for '
+                               'sharded finalization.')
+        self.num_workers = num_workers
+        self.shard_jobs = defaultdict(list)
+        for job_name, shard_name in self.shards.jobs.items():
+            self.shard_jobs[shard_name].append(job_name)
+        submit_path = graph.config['submitPath']
+        self.final_job = os.path.join(submit_path, 'final_job.bash')
+        self.log_dir = os.path.join(submit_path, 'logging')
+        self.record_file = os.path.join(submit_path, _RECORD_FILE)
+        self.transferred = self._read_record()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+
+    def _read_record(self):
+        if not os.path.isfile(self.record_file):
+            return set()
+        with open(self.record_file) as fd:
+            return set(json.load(fd)['graph_ids'])
+
+    def _write_record(self):
+        tmp_file = self.record_file + '.tmp'
+        with open(tmp_file, 'w') as fd:
+            json.dump(dict(graph_ids=sorted(self.transferred)), fd)
+        os.replace(tmp_file, self.record_file)
+
+    def pending_shards(self):
+        """Return the names of the shards that haven't been transferred."""
+        return [shard_name for shard_name, shard in self.shards.shards.items()
+                if shard['graph_id'] not in self.transferred]
+
+    def ready_shards(self):
+        """Return the names of the untransferred shards for which all
+        of the jobs have succeeded."""
+        return [shard_name for shard_name in self.pending_shards()
+                if all(_job_succeeded(self.graph[_])
+                       for _ in self.shard_jobs[shard_name])]
+
+    def _transfer_shard(self, shard_name):
+        shard = self.shards.shards[shard_name]
+        log_file = os.path.join(self.log_dir,
+                                f'final_merge_job_{shard_name}.log')
+        command = (f"(bash {self.final_job} {shard['file']} "
+                   f"{self.graph.config['butlerConfig']}) >& {log_file}")
+        returncode = subprocess.run(command, shell=True,
+                                    executable='/bin/bash').returncode
+        if returncode == 0:
+            with self.lock:
+                self.transferred.add(shard['graph_id'])
+                self._write_record()
+        return returncode
+
+    def transfer(self, shard_names):
+        """
+        Transfer the outputs of the specified shards.
+
+        Returns
+        -------
+        list of the names of the shards whose transfers failed.
+        """
+        if not shard_names:
+            return []
+        t0 = time.time()
+        with ThreadPoolExecutor(self.num_workers) as executor:
+            returncodes = list(executor.map(self._transfer_shard, shard_names))
+        failed = [shard_name for shard_name, returncode
+                  in zip(shard_names, returncodes) if returncode != 0]
+        print(f'Transferred {len(shard_names) - len(failed)} of '
+              f'{len(shard_names)} QuantumGraph shards in '
+              f'{time.time() - t0:.1f} s', flush=True)
+        return failed
+
+    def transfer_ready(self):
+        """Transfer the outputs of the shards whose jobs have all
+        succeeded."""
+        return self.transfer(self.ready_shards())
+
+    def finalize(self):
+        """
+        Stop any incremental transfers and transfer the outputs of all
+        of the remaining shards.
+        """
+        self.stop()
+        failed = self.transfer(self.pending_shards())
+        if failed:
+            raise RuntimeError(f'Final job failed for QuantumGraph shards '
+                               f'{failed}.  See the final_merge_job logs '
+                               f'in {self.log_dir}.')
+
+    def _run_incremental(self, interval):
+        while not self._stop.wait(interval):
+            self.transfer_ready()
+
+    def start(self, interval=600):
+        """
+        Transfer the outputs of completed shards in a background thread,
+        checking for newly completed shards every `interval` seconds.
+        """
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run_incremental,
+                                       args=(interval,), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        """Stop the incremental transfers, waiting for any transfers in
+        progress to finish."""
+        if self.thread is not None:
+            self._stop.set()
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,255 @@
+"""
+Module to write and read a compact, versioned snapshot of an ingested
+ParslGraph so that `ParslGraph.restore` does not need to unpickle the
+full GenericWorkflow and rebuild the DAG.  The snapshot is a directory
+of numpy arrays, which are memory-mapped on reading, plus a json
+header with the task tables and the per-label command templates.
+"""
+import os
+import sys
+import json
+import numpy as np
+from .compact_dag import CompactDag
+
+
+__all__ = ['GraphSnapshot', 'SnapshotJob', 'SNAPSHOT_VERSION']
+
+
+SNAPSHOT_VERSION = 1
+
+_HEADER = 'header.json'
+
+_DAG_ARRAYS = ('succ_ptr', 'succ_idx', 'pred_ptr', 'pred_idx')
+
+_RESOURCES = ('request_memory', 'request_cpus', 'request_disk')
+
+
+def file_stamp(path):
+    """Return the [size, mtime_ns] of a file for staleness checks."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class SnapshotExec:
+    """Stand-in for GenericWorkflowExec with the executable path."""
+    __slots__ = ('src_uri',)
+
+    def __init__(self, src_uri):
+        self.src_uri = src_uri
+
+
+class SnapshotFile:
+    """Stand-in for GenericWorkflowFile with the input name and path."""
+    __slots__ = ('name', 'src_uri')
+
+    def __init__(self, name, src_uri):
+        self.name = name
+        self.src_uri = src_uri
+
+
+class SnapshotJob:
+    """
+    Stand-in for GenericWorkflowJob with the attributes used by the
+    Parsl plugin, reconstructed from the snapshot.
+    """
+    __slots__ = ('name', 'label', 'cmdvals', 'executable', 'arguments',
+                 'request_memory', 'request_cpus', 'request_disk')
+
+    def __init__(self, name, label, cmdvals, executable, arguments,
+                 resources):
+        self.name = name
+        self.label = label
+        self.cmdvals = cmdvals
+        self.executable = executable
+        self.arguments = arguments
+        self.request_memory, self.request_cpus, self.request_disk = resources
+
+
+def _resource_value(value):
+    """Convert a stored resource value back to None or a number."""
+    if np.isnan(value):
+        return None
+    return int(value) if float(value).is_integer() else float(value)
+
+
+class GraphSnapshot:
+    """
+    Compact snapshot of the DAG, task tables, command templates, and
+    resource requests of a ParslGraph.  This class also provides the
+    `get_job` and `get_job_inputs` methods of GenericWorkflow for
+    labels with templates that are the same for all of their jobs.
+    """
+    def __init__(self, snapshot_dir, header, arrays):
+        self.snapshot_dir = snapshot_dir
+        self.header = header
+        self.arrays = arrays
+        names = [sys.intern(_.decode()) for _ in arrays['names']]
+        self.dag = CompactDag.from_csr_arrays(
+            names, *[arrays[_] for _ in _DAG_ARRAYS])
+        self.task_list = header['task_list']
+        self.task_ids = arrays['task_ids']
+        self.labels = header['labels']
+        self.label_ids = arrays['label_ids']
+        self.templates = header['templates']
+        self._executables = {label: SnapshotExec(template['executable'])
+                             for label, template in self.templates.items()
+                             if template is not None}
+
+    def has_template(self, job_name):
+        """
+        Return True if the job can be reconstructed from the snapshot
+        without the GenericWorkflow.
+        """
+        label = self.labels[self.label_ids[self.dag.index[job_name]]]
+        return self.templates[label] is not None
+
+    def get_job(self, job_name):
+        """Return a SnapshotJob for the named job."""
+        job_id = self.dag.index[job_name]
+        label = self.labels[self.label_ids[job_id]]
+        template = self.templates[label]
+        cmdvals = dict(template['cmdvals'])
+        for key in template['varying']:
+            cmdvals[key] = self.arrays[f'cmdval_{key}'][job_id].decode()
+        resources = [_resource_value(self.arrays[_][job_id])
+                     for _ in _RESOURCES]
+        return SnapshotJob(job_name, label, cmdvals,
+                           self._executables[label], template['arguments'],
+                           resources)
+
+    def get_job_inputs(self, job_name):
+        """Return the list of SnapshotFile inputs for the named job."""
+        label = self.labels[self.label_ids[self.dag.index[job_name]]]
+        return [SnapshotFile(*_) for _ in self.templates[label]['inputs']]
+
+    @staticmethod
+    def write(graph, snapshot_dir, sources):
+        """
+        Write a snapshot of a ParslGraph.
+
+        Parameters
+        ----------
+        graph: ParslGraph
+            The graph to snapshot.
+        snapshot_dir: str
+            Output directory for the snapshot files.
+        sources: list
+            Filenames of the files, i.e., the GenericWorkflow and bps
+            config pickle files, on which the graph is based.  If any
+            of these files change, the snapshot is considered stale.
+        """
+        dag = graph.dag
+        num_jobs = len(dag)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        arrays = dict(names=np.array([_.encode() for _ in dag.names]),
+                      task_ids=graph._task_ids,
+                      succ_ptr=dag.succ_ptr, succ_idx=dag.succ_idx,
+                      pred_ptr=dag.pred_ptr, pred_idx=dag.pred_idx)
+        for resource in _RESOURCES:
+            arrays[resource] = np.full(num_jobs, np.nan)
+
+        # Collect the per-job info, keeping the first job of each
+        # label as the template for the label.
+        labels, label_ids = {}, np.zeros(num_jobs, dtype=np.int16)
+        references, varying, uniform = {}, {}, {}
+        cmdvals = []
+        for job_id, job_name in enumerate(dag.names):
+            gwf_job = graph.gwf.get_job(job_name)
+            label = gwf_job.label
+            inputs = [[_.name, _.src_uri] for _ in
+                      graph.gwf.get_job_inputs(job_name)]
+            if label not in references:
+                references[label] = (gwf_job.executable.src_uri,
+                                     gwf_job.arguments,
+                                     dict(gwf_job.cmdvals), inputs)
+                varying[label] = set()
+                uniform[label] = True
+                labels[label] = len(labels)
+            label_ids[job_id] = labels[label]
+            executable, arguments, ref_cmdvals, ref_inputs = references[label]
+            if (gwf_job.executable.src_uri != executable
+                    or gwf_job.arguments != arguments
+                    or inputs != ref_inputs):
+                uniform[label] = False
+            for key in set(ref_cmdvals).union(gwf_job.cmdvals):
+                if gwf_job.cmdvals.get(key) != ref_cmdvals.get(key):
+                    varying[label].add(key)
+            cmdvals.append(gwf_job.cmdvals)
+            for resource in _RESOURCES:
+                value = getattr(gwf_job, resource)
+                if value is not None:
+                    arrays[resource][job_id] = value
+        arrays['label_ids'] = label_ids
+
+        templates = {}
+        varying_keys = set()
+        for label in labels:
+            executable, arguments, ref_cmdvals, inputs = references[label]
+            if not uniform[label]:
+                # The jobs for this label will be read from the
+                # GenericWorkflow.
+                templates[label] = None
+                continue
+            templates[label] = dict(
+                executable=executable, arguments=arguments,
+                cmdvals={key: value for key, value in ref_cmdvals.items()
+                         if key not in varying[label]},
+                varying=sorted(varying[label]), inputs=inputs)
+            varying_keys.update(varying[label])
+        for key in varying_keys:
+            arrays[f'cmdval_{key}'] = np.array(
+                [str(_.get(key, '')).encode() for _ in cmdvals])
+
+        for key, array in arrays.items():
+            np.save(os.path.join(snapshot_dir, f'{key}.npy'), array)
+        # Write the header last so that an incomplete snapshot will
+        # not be used.
+        header = dict(version=SNAPSHOT_VERSION,
+                      num_jobs=num_jobs,
+                      sources={os.path.realpath(_): file_stamp(_)
+                               for _ in sources},
+                      arrays=sorted(arrays),
+                      task_list=graph._task_list,
+                      labels=list(labels),
+                      templates=templates)
+        tmp_file = os.path.join(snapshot_dir, f'{_HEADER}.tmp')
+        with open(tmp_file, 'w') as fd:
+            json.dump(header, fd)
+        os.replace(tmp_file, os.path.join(snapshot_dir, _HEADER))
+
+    @staticmethod
+    def read(snapshot_dir, sources):
+        """
+        Read a snapshot, memory-mapping the arrays.
+
+        Parameters
+        ----------
+        snapshot_dir: str
+            Directory containing the snapshot files.
+        sources: list
+            Filenames of the files on which the graph is based.  These
+            must match the files that were recorded when the snapshot
+            was written.
+
+        Returns
+        -------
+        GraphSnapshot or None if the snapshot is missing, stale, or was
+        written with a different version.
+        """
+        header_file = os.path.join(snapshot_dir, _HEADER)
+        try:
+            with open(header_file) as fd:
+                header = json.load(fd)
+            if header.get('version') != SNAPSHOT_VERSION:
+                return None
+            stamps = {os.path.realpath(_): file_stamp(_) for _ in sources}
+            if stamps != header['sources']:
+                return None
+            arrays = {key: np.load(os.path.join(snapshot_dir, f'{key}.npy'),
+                                   mmap_mode='r')
+                      for key in header['arrays']}
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(arrays['names']) != header['num_jobs']:
+            return None
+        return GraphSnapshot(snapshot_dir, header, arrays)
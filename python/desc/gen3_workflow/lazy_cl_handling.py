@@ -9,10 +9,11 @@ import os
 import glob
 import shutil
 import re
+import string
 
 
 __all__ = ['fix_env_var_syntax', 'get_input_file_paths', 'insert_file_paths',
-           'resolve_env_vars']
+           'resolve_env_vars', 'CommandTemplate', 'CommandLineCompiler']
 
 
 def resolve_env_vars(oldstr):
@@ -58,3 +59,159 @@ def insert_file_paths(command, file_paths, start_delim='<FILE:', end_delim='>'):
         else:
             final_tokens.append(token)
     return ' '.join(final_tokens)
+
+
+class CommandTemplate:
+    """
+    Command line template that has been parsed into literal text and
+    the slots for the bps variables and file paths.  Rendering the
+    template for a job produces the same result as applying
+    `str.format`, `fix_env_var_syntax`, and `insert_file_paths` in
+    sequence, but the parsing is done only once per distinct template.
+    """
+    # Substituted values matching this pattern, or that are empty,
+    # may change how the command line is tokenized, so those command
+    # lines are processed without using the compiled template.
+    _UNSAFE = re.compile(r'[\s<]')
+
+    def __init__(self, command, start_delim='<FILE:', end_delim='>'):
+        """
+        Parameters
+        ----------
+        command: str
+            Command line template with bps variables in {}'s,
+            environment variables as <ENV:...>, and file placeholders
+            as <FILE:...>.
+        """
+        self.command = command
+        self.start_delim = start_delim
+        self.end_delim = end_delim
+        # The literal text segments and the (is_file, key) slots
+        # between them, so that len(literals) == len(slots) + 1.
+        # These are None if the template can't be compiled.
+        self.literals = []
+        self.slots = []
+        try:
+            self._compile()
+        except ValueError:
+            self.literals, self.slots = None, None
+
+    def _compile(self):
+        """Parse the template, raising ValueError if it can't be compiled."""
+        text = []
+        for token in self.command.split():
+            if text or self.slots:
+                text.append(' ')
+            if '{' not in token and '}' not in token:
+                token = fix_env_var_syntax(token)
+                if token.startswith(self.start_delim) and \
+                   token.endswith(self.end_delim):
+                    key = token[len(self.start_delim):-len(self.end_delim)]
+                    self._add_slot(text, True, key)
+                else:
+                    text.append(token)
+                continue
+            for literal, field_name, format_spec, conversion \
+                    in string.Formatter().parse(token):
+                literal = fix_env_var_syntax(literal)
+                if '<' in literal:
+                    # Env vars or file placeholders that depend on
+                    # the bps variables.
+                    raise ValueError(token)
+                text.append(literal)
+                if field_name is None:
+                    continue
+                if format_spec or conversion or \
+                   not field_name.isidentifier():
+                    raise ValueError(token)
+                self._add_slot(text, False, field_name)
+        self.literals.append(''.join(text))
+
+    def _add_slot(self, text, is_file, key):
+        self.literals.append(''.join(text))
+        text.clear()
+        self.slots.append((is_file, key))
+
+    def _render_uncompiled(self, cmdvals, file_paths):
+        command = fix_env_var_syntax(self.command.format(**cmdvals))
+        return insert_file_paths(command, file_paths,
+                                 start_delim=self.start_delim,
+                                 end_delim=self.end_delim)
+
+    def render(self, cmdvals, file_paths):
+        """
+        Render the command line for a job.
+
+        Parameters
+        ----------
+        cmdvals: dict
+            Values of the bps variables for the job.
+        file_paths: dict
+            File paths keyed by input name.
+
+        Returns
+        -------
+        str
+        """
+        if self.slots is None:
+            return self._render_uncompiled(cmdvals, file_paths)
+        literals = self.literals
+        pieces = []
+        for literal, (is_file, key) in zip(literals, self.slots):
+            if is_file:
+                value = file_paths[key]
+            else:
+                value = str(cmdvals[key])
+                if not value or self._UNSAFE.search(value):
+                    return self._render_uncompiled(cmdvals, file_paths)
+            pieces.append(literal)
+            pieces.append(value)
+        pieces.append(literals[-1])
+        return ''.join(pieces)
+
+
+class CommandLineCompiler:
+    """
+    Class to render job command lines using cached CommandTemplates
+    and cached values of the input file paths with the environment
+    variables resolved.
+    """
+    def __init__(self):
+        self.templates = {}
+        self._resolved_paths = {}
+
+    def template(self, command):
+        """Return the CommandTemplate for a command line template."""
+        if command not in self.templates:
+            self.templates[command] = CommandTemplate(command)
+        return self.templates[command]
+
+    def resolve_env_vars(self, path):
+        """Cached version of `resolve_env_vars` for input file paths."""
+        if path not in self._resolved_paths:
+            self._resolved_paths[path] = resolve_env_vars(path)
+        return self._resolved_paths[path]
+
+    def input_file_paths(self, generic_workflow, job_name):
+        """Return a dictionary of file paths, keyed by input name."""
+        return {item.name: self.resolve_env_vars(item.src_uri)
+                for item in generic_workflow.get_job_inputs(job_name)}
+
+    def render(self, command, cmdvals, file_paths):
+        """
+        Render a command line template for a job.
+
+        Parameters
+        ----------
+        command: str
+            Command line template.
+        cmdvals: dict
+            Values of the bps variables for the job.
+        file_paths: dict
+            File paths keyed by input name.
+
+        Returns
+        -------
+        str
+        """
+        return self.template(command).render(cmdvals, file_paths)
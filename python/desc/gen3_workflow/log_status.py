@@ -0,0 +1,136 @@
+"""
+Module to determine job outcomes from the pipetask log files in the
+`{submitPath}/logging` directory.  Each job's command line writes
+'success' or 'failure' as the last line of its stderr log, so only
+the tail of each file needs to be read.
+"""
+import os
+import json
+
+
+__all__ = ['read_log_outcome', 'LogStatusScanner', 'LOG_SUCCESS',
+           'LOG_FAILURE', 'LOG_RUNNING']
+
+
+LOG_SUCCESS = 'success'
+LOG_FAILURE = 'failure'
+LOG_RUNNING = 'running'
+
+_TAIL_BYTES = 512
+
+
+def read_log_outcome(log_file, tail_bytes=_TAIL_BYTES):
+    """
+    Return the job outcome, LOG_SUCCESS, LOG_FAILURE, or LOG_RUNNING,
+    from the last line of the log file, reading only the final
+    `tail_bytes` of the file.
+    """
+    with open(log_file, 'rb') as fd:
+        size = fd.seek(0, os.SEEK_END)
+        offset = max(0, size - tail_bytes)
+        fd.seek(offset)
+        tail = fd.read()
+    lines = tail.splitlines(keepends=True)
+    if not lines or (len(lines) == 1 and offset > 0):
+        # Either the file is empty or the last line is longer than
+        # the tail that was read, so it can't be one of the outcome
+        # strings.
+        return LOG_RUNNING
+    last_line = lines[-1]
+    if last_line.startswith(b'success'):
+        return LOG_SUCCESS
+    if last_line.startswith(b'failure'):
+        return LOG_FAILURE
+    return LOG_RUNNING
+
+
+class LogStatusScanner:
+    """
+    Class to scan a directory of job log files for job outcomes.  The
+    size and modification time of each log file are recorded so that
+    subsequent scans only read files that have changed.  These data
+    are also persisted in a json cache file so that the results can be
+    reused across python sessions.
+    """
+    def __init__(self, log_dir, cache_file=None, suffix='.stderr',
+                 tail_bytes=_TAIL_BYTES):
+        """
+        Parameters
+        ----------
+        log_dir: str
+            Directory containing the job log files.
+        cache_file: str [None]
+            json file to use for persisting the scan results.  If None,
+            then results are only cached in memory.
+        suffix: str ['.stderr']
+            Filename suffix of the log files to scan.  The job name is
+            the filename with this suffix removed.
+        tail_bytes: int [512]
+            Number of bytes to read from the end of each log file.
+        """
+        self.log_dir = log_dir
+        self.cache_file = cache_file
+        self.suffix = suffix
+        self.tail_bytes = tail_bytes
+        self._cache = None
+
+    def _load_cache(self):
+        """Read the cache file, if available."""
+        self._cache = {}
+        if self.cache_file is None or not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file) as fd:
+                self._cache = json.load(fd)
+        except (OSError, ValueError):
+            # Unreadable or truncated cache file, so start over.
+            self._cache = {}
+
+    def _save_cache(self):
+        """Write the cache file atomically."""
+        if self.cache_file is None:
+            return
+        tmp_file = f'{self.cache_file}.tmp{os.getpid()}'
+        with open(tmp_file, 'w') as fd:
+            json.dump(self._cache, fd)
+        os.replace(tmp_file, self.cache_file)
+
+    def scan(self):
+        """
+        Scan the log directory.
+
+        Returns
+        -------
+        dict of job outcomes, keyed by job name, for each job with a log
+        file.
+        """
+        if self._cache is None:
+            self._load_cache()
+        cache = {}
+        changed = False
+        if os.path.isdir(self.log_dir):
+            with os.scandir(self.log_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    job_name = entry.name[:-len(self.suffix)]
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    stamp = [stat.st_size, stat.st_mtime_ns]
+                    previous = self._cache.get(job_name)
+                    if previous is not None and previous[:2] == stamp:
+                        cache[job_name] = previous
+                        continue
+                    try:
+                        outcome = read_log_outcome(entry.path,
+                                                   self.tail_bytes)
+                    except FileNotFoundError:
+                        continue
+                    cache[job_name] = stamp + [outcome]
+                    changed = True
+        if changed or len(cache) != len(self._cache):
+            self._cache = cache
+            self._save_cache()
+        return {job_name: value[2] for job_name, value in cache.items()}
@@ -0,0 +1,289 @@
+"""
+Module to retry jobs that fail because they run out of memory with
+escalated memory requests, using a parsl retry_handler.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import parsl
+
+
+__all__ = ['MemoryEscalation', 'MemoryRecords', 'executor_memory',
+           'is_memory_failure']
+
+
+# Exit codes of processes killed by SIGKILL, e.g., by the OOM killer,
+# as reported by bash and by Python, respectively.
+_OOM_EXIT_CODES = (137, -9)
+
+_OOM_EXIT_PATTERN = re.compile(r'exit code (137|-9)\b')
+
+_OOM_LOG_PATTERN = re.compile(r'MemoryError|[Oo]ut of memory|oom[-_]kill|'
+                              r'\bOOM\b|\bKilled\b|std::bad_alloc')
+
+# Number of bytes at the end of the stderr log file to search for
+# signs of memory exhaustion.
+_LOG_TAIL_SIZE = 4096
+
+# Name of the file in the submit directory with the memory records
+# written by the retry handler.
+MEMORY_RECORDS_FILE = 'memory_records.json'
+
+_PEAK_RSS_QUERY = '''select max(psutil_process_memory_resident) from
+    resource where run_id=? and task_id=? and try_id=?'''
+
+
+class MemoryRecords:
+    """
+    Memory needs recorded by the MemoryEscalation retry handler in a
+    json file: the escalated memory requests (MB) keyed by job name,
+    and, keyed by task label, the largest observed peak RSS (MB) and,
+    for failures without a recorded peak RSS, the largest request (MB)
+    that a job exceeded.  Each instance keeps its own copy of the
+    records, which `refresh` rereads if the file has been replaced,
+    e.g., by the retry handler of the running workflow.
+    """
+    def __init__(self, record_file, refresh_interval=60):
+        """
+        Parameters
+        ----------
+        record_file: str
+            json file with the memory records.
+        refresh_interval: float [60]
+            Minimum time in seconds between checks of the file for
+            changes.
+        """
+        self.record_file = record_file
+        self.refresh_interval = refresh_interval
+        self.job_requests = {}
+        self.peak_rss = {}
+        self.exceeded_requests = {}
+        self._stamp = None
+        self._last_check = None
+        self.refresh(force=True)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.record_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def refresh(self, force=False):
+        """
+        Reread the records if the file has changed.  Unless force is
+        True, the file is checked at most once per refresh_interval.
+        """
+        now = time.monotonic()
+        if (not force and self._last_check is not None
+                and now - self._last_check < self.refresh_interval):
+            return
+        self._last_check = now
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return
+        with open(self.record_file) as fd:
+            records = json.load(fd)
+        self.job_requests = records.get('job_requests', {})
+        self.peak_rss = records.get('peak_rss', {})
+        self.exceeded_requests = records.get('exceeded_requests', {})
+        self._stamp = stamp
+
+    def task_memory(self, task_label):
+        """
+        Return the observed peak RSS (MB) for a task label or, if there
+        is none, the largest request that a job exceeded, or None if
+        neither was recorded.
+        """
+        return self.peak_rss.get(task_label,
+                                 self.exceeded_requests.get(task_label))
+
+    def record(self, job_name, task_label, request, peak_rss,
+               exceeded_request):
+        """
+        Record the escalated memory request for a job, and its observed
+        peak RSS, or, if that is None, the request that it exceeded,
+        keeping the largest values, and rewrite the file.
+        """
+        if job_name is not None:
+            self.job_requests[job_name] = max(
+                request, self.job_requests.get(job_name, 0))
+        if peak_rss is not None:
+            self.peak_rss[task_label] = max(
+                peak_rss, self.peak_rss.get(task_label, 0))
+        else:
+            self.exceeded_requests[task_label] = max(
+                exceeded_request, self.exceeded_requests.get(task_label, 0))
+        tmp_file = self.record_file + '.tmp'
+        with open(tmp_file, 'w') as fd:
+            json.dump(dict(job_requests=self.job_requests,
+                           peak_rss=self.peak_rss,
+                           exceeded_requests=self.exceeded_requests), fd)
+        os.replace(tmp_file, self.record_file)
+        self._stamp = self._file_stamp()
+
+
+def executor_memory(executors):
+    """
+    Return the memory per worker (MB) of each executor with a known
+    memory limit, i.e., the mem_per_worker values of the batch
+    executors or the --memory option of a WorkQueueExecutor's workers.
+
+    Parameters
+    ----------
+    executors: dict
+        parsl executors keyed by label.
+
+    Returns
+    -------
+    dict of memory limits in MB, keyed by executor label.
+    """
+    memory = {}
+    for label, executor in executors.items():
+        mem_per_worker = getattr(executor, 'mem_per_worker', None)
+        if mem_per_worker is not None:
+            memory[label] = int(1024*mem_per_worker)
+            continue
+        match = re.search(r'--memory[= ](\d+)',
+                          getattr(executor, 'worker_options', None) or '')
+        if match is not None:
+            memory[label] = int(match.group(1))
+    return memory
+
+
+def _log_tail(log_file):
+    """Return the end of a log file, or an empty string if the file
+    can't be read."""
+    try:
+        with open(log_file, 'rb') as fd:
+            fd.seek(0, os.SEEK_END)
+            fd.seek(max(fd.tell() - _LOG_TAIL_SIZE, 0))
+            return fd.read().decode(errors='replace')
+    except (OSError, TypeError):
+        return ''
+
+
+def is_memory_failure(exception, task_record):
+    """
+    Return True if a task failure looks like it was caused by running
+    out of memory, based on the Work Queue result, the exit code, or
+    the end of the task's stderr log file.
+    """
+    if 'more resources than requested' in str(exception):
+        # Work Queue resource exhaustion.
+        return True
+    if getattr(exception, 'exitcode', None) in _OOM_EXIT_CODES:
+        return True
+    if _OOM_EXIT_PATTERN.search(str(exception)):
+        return True
+    stderr = task_record['kwargs'].get('stderr')
+    return _OOM_LOG_PATTERN.search(_log_tail(stderr)) is not None
+
+
+class MemoryEscalation:
+    """
+    parsl retry_handler that resubmits tasks that ran out of memory
+    with their memory requests multiplied by a fixed factor, capped by
+    the memory of the largest executor.  For tasks without a
+    parsl_resource_specification, the task is moved to the executor
+    with the smallest memory limit that satisfies the escalated request.
+    The escalated request of each job is recorded, so that the job
+    keeps it if the workflow is restarted, along with the task's peak
+    RSS from the resource table of the monitoring db, or, if that is
+    not available, the request that the task exceeded.
+    """
+    def __init__(self, record_file, factor=2,
+                 monitoring_db='./runinfo/monitoring.db'):
+        """
+        Parameters
+        ----------
+        record_file: str
+            json file to record the memory requests and peak RSS values.
+        factor: float [2]
+            Factor by which to multiply the memory request.
+        monitoring_db: str ['./runinfo/monitoring.db']
+            Parsl's monitoring database file.
+        """
+        self.record_file = record_file
+        self.factor = factor
+        self.monitoring_db = monitoring_db
+        self.records = MemoryRecords(record_file)
+        self.lock = threading.Lock()
+        self._executor_memory = None
+
+    @property
+    def executor_memory(self):
+        if self._executor_memory is None:
+            self._executor_memory = executor_memory(parsl.dfk().executors)
+        return self._executor_memory
+
+    def observed_peak_rss(self, task_record):
+        """
+        Return the peak RSS (MB) of the failed try of a task from the
+        monitoring db, or None if it wasn't recorded.
+        """
+        if not os.path.isfile(self.monitoring_db):
+            return None
+        try:
+            with sqlite3.connect(self.monitoring_db) as conn:
+                peak_rss = conn.execute(
+                    _PEAK_RSS_QUERY, (parsl.dfk().run_id, task_record['id'],
+                                      task_record['try_id'])).fetchone()[0]
+        except (sqlite3.Error, KeyError):
+            return None
+        return None if peak_rss is None else int(peak_rss/1024**2)
+
+    def escalate(self, task_record):
+        """
+        Escalate the memory request for a task.
+
+        Returns
+        -------
+        (the escalated memory request (MB), the request that the task
+        exceeded (MB)), or (None, None) if the request can't be
+        escalated.
+        """
+        executor_memory = self.executor_memory
+        if not executor_memory:
+            return None, None
+        cap = max(executor_memory.values())
+        spec = task_record['resource_specification']
+        if spec:
+            current = spec.get('memory') or 0
+        else:
+            current = executor_memory.get(task_record['executor'], 0)
+        if current <= 0 or current >= cap:
+            return None, None
+        memory = min(int(self.factor*current), cap)
+        if spec:
+            # The resource spec dict is passed to the executor when the
+            # task is relaunched.
+            spec['memory'] = memory
+        else:
+            task_record['executor'] = min(
+                (_ for _ in executor_memory.items() if _[1] >= memory),
+                key=lambda _: _[1])[0]
+        return memory, current
+
+    def __call__(self, exception, task_record):
+        """
+        Return the retry cost of a task failure, escalating the memory
+        request if the task ran out of memory.
+        """
+        if is_memory_failure(exception, task_record):
+            memory, previous = self.escalate(task_record)
+            if memory is not None:
+                print(f"Retrying task {task_record['id']} "
+                      f"({task_record['func_name']}) with {memory} MB "
+                      "after running out of memory", flush=True)
+                peak_rss = self.observed_peak_rss(task_record)
+                stderr = task_record['kwargs'].get('stderr')
+                job_name = (None if stderr is None else
+                            os.path.basename(stderr).split('.', 1)[0])
+                with self.lock:
+                    self.records.record(job_name, task_record['func_name'],
+                                        memory, peak_rss, previous)
+        return 1
@@ -0,0 +1,99 @@
+"""
+Module to check for the outputs of workflow jobs in the destination
+data repository using bulk registry queries.
+"""
+from collections import defaultdict
+from lsst.daf.butler import Butler
+
+
+__all__ = ['OutputVerifier']
+
+
+class OutputVerifier:
+    """
+    Class to determine which of the expected outputs of a set of jobs
+    are present in the output run collection.  A single Butler is used
+    for all queries, and the registry is queried once per dataset type
+    rather than once per dataset.
+    """
+    def __init__(self, butler_config, run):
+        """
+        Parameters
+        ----------
+        butler_config: str
+            Butler repo config.
+        run: str
+            Output run collection.
+        """
+        self.butler_config = butler_config
+        self.run = run
+        self._butler = None
+
+    @property
+    def butler(self):
+        """Butler shared by all of the queries."""
+        if self._butler is None:
+            self._butler = Butler(self.butler_config, run=self.run)
+        return self._butler
+
+    def _existing_data_ids(self, dataset_type_name):
+        """
+        Return the set of dataIds of the datasets of the specified type
+        in the output run collection.
+        """
+        registry = self.butler.registry
+        try:
+            refs = registry.queryDatasets(dataset_type_name,
+                                          collections=self.run,
+                                          findFirst=True)
+            return {ref.dataId for ref in refs}
+        except LookupError:
+            # The dataset type has not been registered, so none of
+            # the datasets exist.
+            return set()
+
+    def missing_outputs(self, jobs):
+        """
+        Find the missing outputs for each of the jobs.
+
+        Parameters
+        ----------
+        jobs: list-like
+            ParslJob objects to consider.
+
+        Returns
+        -------
+        dict of lists of missing `DatasetRef`s, keyed by job name.
+        """
+        expected = defaultdict(list)
+        missing = {}
+        for job in jobs:
+            job_name = job.name
+            missing[job_name] = []
+            for node in job.qgraph_nodes:
+                for dataset_refs in node.quantum.outputs.values():
+                    for dataset_ref in dataset_refs:
+                        expected[dataset_ref.datasetType.name].append(
+                            (job_name, dataset_ref))
+        for dataset_type_name, items in expected.items():
+            data_ids = self._existing_data_ids(dataset_type_name)
+            for job_name, dataset_ref in items:
+                if dataset_ref.dataId not in data_ids:
+                    missing[job_name].append(dataset_ref)
+        return missing
+
+    def have_outputs(self, jobs):
+        """
+        Determine whether all of the outputs are present for each job.
+
+        Parameters
+        ----------
+        jobs: list-like
+            ParslJob objects to consider.
+
+        Returns
+        -------
+        dict of bools, keyed by job name.
+        """
+        return {job_name: not refs for job_name, refs
+                in self.missing_outputs(jobs).items()}
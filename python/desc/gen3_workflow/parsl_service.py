@@ -4,11 +4,13 @@ Parsl-based workflow management service plug-in for ctrl_bps.
 import os
 import sys
 import glob
+import shlex
 import shutil
 from collections import defaultdict
 import pickle
 import subprocess
-import uuid
+from collections.abc import Mapping
+import numpy as np
 import parsl
 import lsst.utils
 import lsst.daf.butler
@@ -18,18 +20,34 @@ from lsst.ctrl.bps.drivers import transform_driver
 from lsst.ctrl.bps.prepare import prepare
 from lsst.ctrl.bps.wms_service import BaseWmsWorkflow, BaseWmsService
 from lsst.pipe.base.graph import QuantumGraph, NodeId
-from desc.gen3_workflow.bash_apps import \
-    small_bash_app, medium_bash_app, large_bash_app, local_bash_app
+from desc.gen3_workflow.bash_apps import get_bash_app
 from desc.gen3_workflow.config import load_parsl_config, set_parsl_logging
-from .query_workflow import query_workflow, print_status, get_task_name
-from .lazy_cl_handling import fix_env_var_syntax, get_input_file_paths,\
-    insert_file_paths
+from .query_workflow import WorkflowStatusQuery, print_status, get_task_name
+from .lazy_cl_handling import CommandLineCompiler
+from .log_status import LogStatusScanner, read_log_outcome, LOG_SUCCESS,\
+    LOG_FAILURE
+from .output_verifier import OutputVerifier
+from .submission import JobSubmitter, StreamingSubmission
+from .priorities import job_priorities, SUBMISSION_POLICIES
+from .compact_dag import CompactDag
+from .chain_clusters import ChainClusters
+from .warm_workers import get_warm_app, check_warm_executors, \
+    EXECUTION_MODES
+from .finalization import ShardedFinalizer
+from .memory_escalation import MemoryRecords, MEMORY_RECORDS_FILE
+from .executor_routing import RoutingTable
+from .phase_timing import phase_timer
+from .graph_snapshot import GraphSnapshot
+from .qgraph_shards import QgraphShards, job_node_ids
 
 
 __all__ = ['start_pipeline', 'ParslGraph', 'ParslJob', 'ParslService']
 
 
 _PARSL_GRAPH_CONFIG = 'parsl_graph_config.pickle'
+_GENERIC_WORKFLOW = 'bps_generic_workflow.pickle'
+_GRAPH_SNAPSHOT = 'parsl_graph_snapshot'
+_QGRAPH_SHARDS = 'qgraph_shards'
 
 
 def start_pipeline(config_file, outfile=None, mode='symlink'):
@@ -58,12 +76,18 @@ def start_pipeline(config_file, outfile=None, mode='symlink'):
     """
     if outfile is not None and os.path.isfile(outfile):
         raise FileExistsError(f"File exists: '{outfile}'")
-    config, generic_workflow = transform_driver(config_file)
-    submit_path = config['submitPath']
-    workflow = prepare(config, generic_workflow, submit_path)
-    as_run_config = os.path.join(submit_path, _PARSL_GRAPH_CONFIG)
-    workflow.parsl_graph.dfk = load_parsl_config(config)
-    workflow.parsl_graph.save_config(as_run_config)
+    with phase_timer.phase('start_pipeline'):
+        with phase_timer.phase('transform_driver'):
+            config, generic_workflow = transform_driver(config_file)
+        phase_timer.configure(config)
+        submit_path = config['submitPath']
+        with phase_timer.phase('prepare'):
+            workflow = prepare(config, generic_workflow, submit_path)
+        as_run_config = os.path.join(submit_path, _PARSL_GRAPH_CONFIG)
+        with phase_timer.phase('load_parsl_config'):
+            workflow.parsl_graph.dfk = load_parsl_config(config)
+        with phase_timer.phase('save_config'):
+            workflow.parsl_graph.save_config(as_run_config)
     if outfile is not None:
         if mode == 'symlink':
             os.symlink(as_run_config, outfile)
@@ -80,19 +104,33 @@ _SUCCEEDED = 'succeeded'
 _FAILED = 'failed'
 _EXEC_DONE = 'exec_done'
 
-
-RUN_DECORATORS = dict(small=small_bash_app,
-                      medium=medium_bash_app,
-                      large=large_bash_app,
-                      local=local_bash_app)
+# Log-based job status values in the order of their int8 codes.
+_JOB_STATUSES = (_PENDING, _SCHEDULED, _RUNNING, _SUCCEEDED, _FAILED)
+_JOB_STATUS_CODES = {status: code for code, status in enumerate(_JOB_STATUSES)}
 
 
 class ResourceSpecs:
     """
     Class to provide Parsl resource specifications, i.e., required
-    memory, cores, and disk space.
+    memory, cores, and disk space.  If a `resource_model` json file of
+    resource model parameters is given in the parsl_config section of
+    the bps config, then the memory requests for the tasks in that file
+    are computed from the model for each job, using the numbers of
+    input datasets of the types given by `resource_model_inputs` in
+    the job's quanta as the numbers of visits.  Memory requests are
+    raised to at least the escalated request recorded for the same job
+    by the MemoryEscalation retry handler and, for jobs that the model
+    doesn't cover, to the recorded peak RSS, or exceeded request, of
+    their task type, including the safety margin.  The records file is
+    checked for updates at most once a minute.
     """
     resources = ('memory', 'cpus', 'disk')
+
+    # Dataset types counted as the number of visits for the resource
+    # models of tasks whose resource needs scale with their inputs.
+    default_input_types = dict(assembleCoadd='deepCoadd_directWarp',
+                               templateGen='deepCoadd_directWarp')
+
     def __init__(self, config):
         """
         Parameters
@@ -100,9 +138,63 @@ class ResourceSpecs:
         config: `lsst.ctrl.bps.BpsConfig`
             Configuration of the worklow.
         """
-        # Place holder set of functions for later implementation
-        # that returns resource needs based on numbers of visits, etc..
-        self.resource_funcs = {_: lambda *args: None for _ in self.resources}
+        parsl_config = dict(config['parsl_config'])
+        self.resource_funcs = {_: None for _ in self.resources}
+        self.pipetask_funcs = {}
+        self.input_types = dict(self.default_input_types)
+        self.input_types.update(parsl_config.get('resource_model_inputs', {}))
+        self.margin = parsl_config.get('resource_model_margin', 1.2)
+        self._num_inputs = {}
+        self.memory_records = MemoryRecords(
+            os.path.join(config['submitPath'], MEMORY_RECORDS_FILE))
+        model_file = parsl_config.get('resource_model')
+        if model_file is not None:
+            from .resource_estimator import get_pipetask_resource_funcs
+            self.pipetask_funcs = get_pipetask_resource_funcs(
+                os.path.expandvars(model_file))
+            self.resource_funcs['memory'] = self.model_memory
+
+    def model_memory(self, task_type, num_visits=1):
+        """
+        Return the memory request (MB) for a task from the maxRSS
+        model, including the safety margin.
+        """
+        maxRSS = float(self.pipetask_funcs[task_type].maxRSS(num_visits))
+        return int(np.ceil(1024*self.margin*maxRSS))
+
+    def num_inputs(self, job):
+        """
+        Return the largest number of input datasets of the type
+        configured for the job's task in any of the job's quanta,
+        or 1 if no type is configured.
+        """
+        input_type = self.input_types.get(job.gwf_job.label)
+        if input_type is None:
+            return 1
+        if job.name not in self._num_inputs:
+            counts = [len(refs) for node in job.qgraph_nodes
+                      for dstype, refs in node.quantum.inputs.items()
+                      if dstype.name == input_type]
+            self._num_inputs[job.name] = max(counts, default=1)
+        return self._num_inputs[job.name]
+
+    def is_modeled(self, resource, job):
+        """Return True if the resource model covers the job."""
+        return (self.resource_funcs[resource] is not None
+                and job.gwf_job.label in self.pipetask_funcs)
+
+    def memory_floor(self, job):
+        """
+        Return the minimum memory request (MB) for a job from the
+        memory records of the MemoryEscalation retry handler, or zero
+        if there is none.
+        """
+        self.memory_records.refresh()
+        floor = self.memory_records.job_requests.get(job.name, 0)
+        task_memory = self.memory_records.task_memory(job.gwf_job.label)
+        if task_memory is not None and not self.is_modeled('memory', job):
+            floor = max(floor, int(np.ceil(self.margin*task_memory)))
+        return floor
 
     def resource_value(self, resource, job, *args):
         """
@@ -110,14 +202,19 @@ class ResourceSpecs:
         measures memory in units of MBs.
         """
         func = self.resource_funcs[resource]
-        if func() is None:
+        task_type = job.gwf_job.label
+        if not self.is_modeled(resource, job):
             # Return the resource values harvested by ctrl_bps from
             # the bps config file.
-            return eval(f'job.gwf_job.request_{resource}')
+            return getattr(job.gwf_job, f'request_{resource}')
 
         # Compute the resource need for the specific job.
-        task_type = job.gwf_job.label
-        return func(task_type, *args)
+        if not args:
+            args = (self.num_inputs(job),)
+        value = func(task_type, *args)
+        if value <= 0:
+            return getattr(job.gwf_job, f'request_{resource}')
+        return value
 
     def __call__(self, job, *args):
         """
@@ -131,57 +228,77 @@ class ResourceSpecs:
                 # resource constraint being applied.
                 value = 0
             response[_] = value
+        response['memory'] = max(response['memory'], self.memory_floor(job))
         # Parsl expects 'cores' instead of 'cpus'
         response['cores'] = response.pop('cpus')
         return response
 
 
-def get_run_command(job):
+def get_executor_label(job, resource_spec=None):
+    """
+    Get the label of the parsl executor appropriate for the required
+    resources for the specified job, using the graph's RoutingTable.
+
+    Parameters
+    ----------
+    job: ParslJob
+        The job to run.
+    resource_spec: dict [None]
+        Resource specification of the job.  If None, then it will be
+        computed using the graph's ResourceSpecs.
+
+    Returns
+    -------
+    str
+    """
+    routing_table = job.parent_graph.routing_table
+    if routing_table.work_queue:
+        return 'work_queue'
+
+    if resource_spec is None:
+        resource_spec = job.parent_graph.resource_specs(job)
+
+    return routing_table.route(resource_spec)
+
+
+def get_run_command(job, resource_spec=None):
     """
     Get the run command appropriate for the required resources for the
     specified job.
+
+    Parameters
+    ----------
+    job: ParslJob
+        The job to run.
+    resource_spec: dict [None]
+        Resource specification of the job.  If None, then it will be
+        computed using the graph's ResourceSpecs.
+
+    Returns
+    -------
+    (parsl.bash_app, dict of additional keyword arguments to pass to
+    the bash_app for this job)
     """
     task_label = job.gwf_job.label
 
     # Get the dictionary of resource specficiations from the job.
-    resource_spec = job.parent_graph.resource_specs(job)
-
-    if 'work_queue' in job.parent_graph.dfk.executors:
-        # For the workQueue, use a bash_app that passes the resource
+    if resource_spec is None:
+        resource_spec = job.parent_graph.resource_specs(job)
+
+    # Use python_apps that run the pipetask commands in warm workers
+    # for the 'warm' execution mode.
+    get_app = (get_warm_app if job.parent_graph.execution_mode == 'warm'
+               else get_bash_app)
+
+    executor = get_executor_label(job, resource_spec)
+    job.parent_graph.routing_table.log(job.name, resource_spec, executor)
+    if executor == 'work_queue':
+        # For the workQueue, use an app that passes the resource
         # specifications to parsl.
-        def wq_run_command(command_line, inputs=(), stdout=None, stderr=None,
-                           parsl_resource_specification=resource_spec):
-            return command_line
-
-        wq_run_command.__name__ = task_label
-        wq_bash_app = parsl.bash_app(executors=['work_queue'], cache=True,
-                                     ignore_for_cache=['stdout', 'stderr'])
-        return wq_bash_app(wq_run_command)
-
-    # Handle parsl configs with executors for different job_size values.
-    memory_request = resource_spec['memory']/1024.   # convert to GB
-    job_size = 'large'   # Default value
-    try:
-        for key in ('batch-small', 'batch-medium'):
-            mem_per_worker = job.parent_graph.dfk.executors[key].mem_per_worker
-            if mem_per_worker is None:
-                # mem_per_worker is not set for this executor (and
-                # presumably also not for all of the others), so just
-                # use the default job_size.
-                break
-            if memory_request <= mem_per_worker:
-                job_size = key.split('-')[1]
-                break
-    except AttributeError:
-        # Using executors that don't have a mem_per_worker attribute.
-        pass
-
-    def job_run_command(command_line, inputs=(), stdout=None, stderr=None):
-        return command_line
-
-    job_run_command.__name__ = task_label
-
-    return RUN_DECORATORS[job_size](job_run_command)
+        wq_app = get_app(task_label, 'work_queue', resource_spec=True)
+        return wq_app, dict(parsl_resource_specification=resource_spec)
+
+    return get_app(task_label, executor), {}
 
 
 @parsl.python_app(executors=['submit-node'])
@@ -200,61 +317,140 @@ def _cmdline(gwf_job):
 
 class ParslJob:
     """
-    Wrapper class for a GenericWorkflowJob.  This class keeps track of
-    prerequisite and dependent jobs, and passes the required input
-    jobs as futures to the parsl.bash_app that executes the underlying
-    quantum graph.
+    Wrapper class for a GenericWorkflowJob.  ParslJob objects are
+    lightweight views of the jobs in a ParslGraph, which stores the
+    DAG structure, job states, and futures in arrays indexed by
+    integer job ID.  This class provides access to the prerequisite
+    and dependent jobs, and passes the required input jobs as futures
+    to the parsl.bash_app that executes the underlying quantum graph.
     """
-    def __init__(self, gwf_job, parsl_graph):
+    __slots__ = ('parent_graph', 'job_id')
+
+    def __init__(self, parsl_graph, job_id):
         """
         Parameters
         ----------
-        gwf_job: `lsst.ctrl.bps.wms.GenericWorkflowJob`
-            Workflow job containing execution information for the
-            quantum or task to be run.
         parsl_graph: ParslGraph
             ParslGraph object that contains this ParslJob.
+        job_id: int
+            Integer ID of the job in the ParslGraph.
         """
-        self.gwf_job = gwf_job
-        self.config = parsl_graph.config
         self.parent_graph = parsl_graph
-        self.dependencies = set()
-        self.prereqs = set()
-        self._done = False
-        self._status = _PENDING
-        self.future = None
-
-    def command_line(self):
-        """Return the command line to run in bash."""
-        pipetask_cmd = _cmdline(self.gwf_job)
-        prefix = self.config.get('commandPrepend')
-        if prefix:
-            pipetask_cmd = ' '.join([prefix, pipetask_cmd])
-        pipetask_cmd \
-            = self.parent_graph.evaluate_command_line(pipetask_cmd, self.gwf_job)
+        self.job_id = job_id
+
+    def __eq__(self, other):
+        return (isinstance(other, ParslJob)
+                and other.parent_graph is self.parent_graph
+                and other.job_id == self.job_id)
 
-        return (pipetask_cmd +
-                ' && >&2 echo success || (>&2 echo failure; false)')
+    def __hash__(self):
+        return hash((id(self.parent_graph), self.job_id))
+
+    def __repr__(self):
+        return f'ParslJob({self.name!r})'
+
+    @property
+    def name(self):
+        """The job name."""
+        return self.parent_graph.dag.names[self.job_id]
 
-    def add_dependency(self, dependency):
+    @property
+    def gwf_job(self):
+        """The GenericWorkflowJob for this job."""
+        return self.parent_graph.get_gwf_job(self.name)
+
+    @property
+    def config(self):
+        """Configuration of the workflow."""
+        return self.parent_graph.config
+
+    @property
+    def dependencies(self):
+        """List of downstream jobs based on the workflow DAG."""
+        return [ParslJob(self.parent_graph, int(_)) for _ in
+                self.parent_graph.dag.successors(self.job_id)]
+
+    @property
+    def prereqs(self):
+        """List of upstream jobs based on the workflow DAG."""
+        return [ParslJob(self.parent_graph, int(_)) for _ in
+                self.parent_graph.dag.predecessors(self.job_id)]
+
+    @property
+    def future(self):
+        """The parsl app future for this job, or None if not submitted."""
+        return self.parent_graph._futures[self.job_id]
+
+    @future.setter
+    def future(self, value):
+        self.parent_graph._futures[self.job_id] = value
+
+    @property
+    def _done(self):
+        return bool(self.parent_graph._job_done[self.job_id])
+
+    @_done.setter
+    def _done(self, value):
+        self.parent_graph._job_done[self.job_id] = value
+
+    @property
+    def _status(self):
+        return _JOB_STATUSES[self.parent_graph._job_state[self.job_id]]
+
+    @_status.setter
+    def _status(self, value):
+        self.parent_graph._job_state[self.job_id] = _JOB_STATUS_CODES[value]
+
+    @property
+    def executor(self):
+        """Label of the parsl executor that will run this job."""
+        return get_executor_label(self)
+
+    def pipetask_command(self, chain=None):
         """
-        Add a job dependency based on the workflow DAG.
+        Return the evaluated pipetask command line.
 
         Parameters
         ----------
-        dependency: `ParslJob`
+        chain: list [None]
+            ParslJobs, starting with this one, to run in a single
+            pipetask invocation.
         """
-        self.dependencies.add(dependency)
-
-    def add_prereq(self, prereq):
+        gwf_job = self.gwf_job
+        pipetask_cmd = _cmdline(gwf_job)
+        prefix = self.config.get('commandPrepend')
+        if prefix:
+            pipetask_cmd = ' '.join([prefix, pipetask_cmd])
+        if chain is None or len(chain) == 1:
+            return self.parent_graph.evaluate_command_line(pipetask_cmd,
+                                                           gwf_job)
+        node_ids = ','.join(_.gwf_job.cmdvals['qgraphNodeId'] for _ in chain)
+        return self.parent_graph.evaluate_command_line(
+            pipetask_cmd, gwf_job,
+            cmdvals=dict(gwf_job.cmdvals, qgraphNodeId=node_ids))
+
+    def command_line(self, chain=None):
         """
-        Add a job prerequisite based on the workflow DAG.
+        Return the command line to run in bash.
 
         Parameters
         ----------
-        prereq: `ParslJob`
+        chain: list [None]
+            ParslJobs, starting with this one, to run in a single
+            pipetask invocation.  The outcome is written to the log
+            file of each job in the chain.
         """
-        self.prereqs.add(prereq)
+        pipetask_cmd = self.pipetask_command(chain)
+        if chain is None or len(chain) == 1:
+            return (pipetask_cmd +
+                    ' && >&2 echo success || (>&2 echo failure; false)')
+
+        log_files = ' '.join(shlex.quote(_.log_files()['stderr'])
+                             for _ in chain[1:])
+        return (f'{pipetask_cmd} && outcome=success || outcome=failure; '
+                f'for log_file in {log_files}; '
+                'do echo $outcome >> $log_file; done; '
+                '>&2 echo $outcome; [ $outcome = success ]')
 
     @property
     def done(self):
@@ -264,13 +460,9 @@ class ParslJob:
         of its log file.
         """
         if not self._done:
-            if self.gwf_job is None and self.future is None:
-                self._done = False
-            elif self.parent_graph.have_monitoring_info:
-                my_df = self.parent_graph.df.query(
-                    f'job_name == "{self.gwf_job.name}"')
-                self._done = (not my_df.empty and
-                              my_df.iloc[0].status == _EXEC_DONE)
+            if self.parent_graph.have_monitoring_info:
+                self._done = (self.parent_graph.job_status(self.name)
+                              == _EXEC_DONE)
             elif self.status == _SUCCEEDED:
                 self._done = True
         return self._done
@@ -284,20 +476,45 @@ class ParslJob:
 
         # Check log file.
         log_file = self.log_files()['stderr']
-        if os.path.isfile(log_file):
+        outcome = (read_log_outcome(log_file) if os.path.isfile(log_file)
+                   else None)
+        return self.update_status(outcome)
+
+    def update_status(self, outcome, have_outputs=None):
+        """
+        Update the job status given the outcome read from the job's
+        log file.
+
+        Parameters
+        ----------
+        outcome: str
+            One of LOG_SUCCESS, LOG_FAILURE, or LOG_RUNNING, or None
+            if the log file does not exist.
+        have_outputs: bool [None]
+            Whether the job outputs are in the output run collection.
+            If None, then this will be checked if needed.
+
+        Returns
+        -------
+        str: The updated job status.
+        """
+        if self._status in (_SUCCEEDED, _FAILED):
+            return self._status
+
+        if outcome is not None:
             self._status = _RUNNING
-            with open(log_file) as fd:
-                outcome = fd.readlines()[-1]
-            if outcome.startswith('success'):
+            if outcome == LOG_SUCCESS:
                 self._status = _SUCCEEDED
-            elif outcome.startswith('failure'):
+            elif outcome == LOG_FAILURE:
                 # Guard against failures caused by dataID/datasetType
                 # insertion conflicts in the registry db that arise
                 # from quanta that succeed but fail to write the
                 # "success" string to the log file before the batch
                 # allocation times out.  Do this by checking for the
                 # job outputs.
-                if self.have_outputs():
+                if have_outputs is None:
+                    have_outputs = self.have_outputs()
+                if have_outputs:
                     self._status = _SUCCEEDED
                 else:
                     self._status = _FAILED
@@ -314,26 +531,54 @@ class ParslJob:
         Return a dict of filenames for directing stderr and stdout.
         """
         log_dir = os.path.join(self.config['submitPath'], 'logging')
-        return dict(stderr=os.path.join(log_dir, f'{self.gwf_job.name}.stderr'))
+        return dict(stderr=os.path.join(log_dir, f'{self.name}.stderr'))
 
     def get_future(self):
         """
-        Get the parsl app future for the job to be run.
+        Get the parsl app future for the job to be run, submitting
+        any prerequisite jobs that have not yet been submitted.
+        """
+        if not self.done and self.future is None:
+            return self.parent_graph.submitter.submit([self.name])[0]
+        return self.submit()
+
+    def submit(self):
+        """
+        Submit the job to parsl and return the future.  The futures of
+        the prerequisite jobs must already exist, so jobs should be
+        submitted in topological order, e.g., using a JobSubmitter.
         """
         if self.done:
             # Return a future from a no-op job, setting the function
             # name so that the monitoring db can distinguish the
             # different tasks types.
-            no_op_job.__name__ = self.gwf_job.label + '_no_op'
+            no_op_job.__name__ = self.parent_graph.job_label(self.job_id) \
+                + '_no_op'
             self.future = no_op_job()
         elif self.future is None:
             # Schedule the job by running the command line in the
-            # appropriate parsl.bash_app.
-            inputs = [_.get_future() for _ in self.prereqs]
-            my_run_command = get_run_command(self)
-            command_line = self.command_line()
-            self.future = my_run_command(command_line, inputs=inputs,
-                                         **self.log_files())
+            # appropriate parsl.bash_app.  If the job starts a chain
+            # cluster, the remaining jobs in the chain are run in the
+            # same invocation and share its future.
+            chain = self.parent_graph.chain_jobs(self.job_id)
+            inputs = list({id(_.future): _.future for job in chain
+                           for _ in job.prereqs if _ not in chain}.values())
+            resource_specs = [self.parent_graph.resource_specs(_)
+                              for _ in chain]
+            resource_spec = {key: max(_[key] for _ in resource_specs)
+                             for key in resource_specs[0]}
+            my_run_command, app_kwargs = get_run_command(self, resource_spec)
+            if self.parent_graph.execution_mode == 'warm':
+                # The warm app writes the outcome to the log files.
+                command_line = self.pipetask_command(chain)
+                app_kwargs['log_files'] = [_.log_files()['stderr']
+                                           for _ in chain[1:]]
+            else:
+                command_line = self.command_line(chain)
+            future = my_run_command(command_line, inputs=inputs,
+                                    **app_kwargs, **self.log_files())
+            for job in chain:
+                job.future = future
         return self.future
 
     def have_outputs(self):
@@ -341,34 +586,31 @@ class ParslJob:
         Use the repo butler to determine if a job's outputs are present.
         If any outputs are missing, return False.
         """
-        butler = Butler(self.config['butlerConfig'],
-                        run=self.config['outputRun'])
-        registry = butler.registry
-        for node in self.qgraph_nodes:
-            for dataset_refs in node.quantum.outputs.values():
-                for dataset_ref in dataset_refs:
-                    ref = registry.findDataset(dataset_ref.datasetType,
-                                               dataset_ref.dataId,
-                                               collections=butler.run)
-                    if ref is None:
-                        return False
-        return True
+        return self.parent_graph.have_outputs([self])[self.name]
 
     @property
     def qgraph_nodes(self):
         """Return the list of nodes from the underlying QuantumGraph."""
+        node_ids = job_node_ids(self.gwf_job)
+        shards = self.parent_graph.qgraph_shards
+        if (self.parent_graph._qgraph is None and shards is not None
+                and self.name in shards):
+            # Read only this job's nodes from its shard rather than
+            # loading the full QuantumGraph.
+            return shards.load_nodes(self.name, node_ids)
         qgraph = self.parent_graph.qgraph
-        return [qgraph.getQuantumNodeByNodeId(
-            uuid.UUID(self.gwf_job.cmdvals['qgraphNodeId']))]
+        return [qgraph.getQuantumNodeByNodeId(_) for _ in node_ids]
 
-class ParslGraph(dict):
+class ParslGraph(Mapping):
     """
     Class to generate ParslJob objects with dependencies specified in
-    the generic_worklow DAG.  This class also serves as a container
-    for all of the jobs in the DAG.
+    the generic_worklow DAG.  This class also serves as a read-only
+    mapping of job name to ParslJob for all of the jobs in the DAG.
+    The DAG structure is stored in a CompactDag, and the job states
+    and futures are stored in arrays indexed by integer job ID.
     """
     def __init__(self, generic_workflow, config, do_init=True, dfk=None,
-                 monitoring_db='./runinfo/monitoring.db'):
+                 monitoring_db='./runinfo/monitoring.db', snapshot=None):
         """
         Parameters
         ----------
@@ -383,74 +625,306 @@ class ParslGraph(dict):
              `config['parsl_config']`.
         monitoring_db: str ['./runinfo/monitoring.db']
             Parsl's monitoring database file.
+        snapshot: GraphSnapshot [None]
+            Snapshot of the ingested workflow.  If provided, the DAG,
+            task tables, and job info are taken from the snapshot, and
+            generic_workflow may be None, in which case it will be read
+            from the submit directory only if it is needed.
         """
-        super().__init__()
-        self.gwf = generic_workflow
+        self._gwf = generic_workflow
+        self.snapshot = snapshot
         self.config = config
         self.resource_specs = ResourceSpecs(self.config)
+        self.execution_mode = dict(self.config['parsl_config']).get(
+            'execution_mode', 'bash')
+        if self.execution_mode not in EXECUTION_MODES:
+            raise ValueError(f'Invalid execution_mode: {self.execution_mode}. '
+                             f'Valid values: {EXECUTION_MODES}')
+        self._command_compiler = CommandLineCompiler()
+        # The QuantumGraph and its shards are loaded lazily, including
+        # when rendering the pipetaskInit command line.
+        self._qgraph_file = None
+        self._qgraph = None
+        self._qgraph_shards = False
         if do_init:
-            self._pipetaskInit()
+            with phase_timer.phase('_pipetaskInit'):
+                self._pipetaskInit()
         self.dfk = dfk
         self.tmp_dirname = 'tmp_repos'
-        self._ingest()
-        self._qgraph_file = None
-        self._qgraph = None
+        with phase_timer.phase('_ingest'):
+            self._ingest()
+        chain_rules = dict(self.config['parsl_config']).get('chain_clusters')
+        self.chain_clusters = (ChainClusters(self, dict(chain_rules))
+                               if chain_rules else None)
         self.monitoring_db = monitoring_db
 
+        # Codes of the status values indexed by job ID.  This is the
+        # primary store of job status info; the `df` attribute is
+        # derived from it.
+        self._status_names = [_PENDING]
+        self._status_codes = {_PENDING: 0}
+        self._status_index = np.zeros(len(self.dag), dtype=np.int8)
+        self._status_source = None
+        self._df = None
+        self._summary = None
+        self._output_verifier = None
+        self._submitter = None
+        self._finalizer = None
+        self._routing_table = None
+        self._routing_dfk = None
+        self.streaming_submission = None
+        self._status_query = None
         self.have_monitoring_info = False
+        self.log_scanner = LogStatusScanner(
+            os.path.join(self.config['submitPath'], 'logging'),
+            cache_file=os.path.join(self.config['submitPath'],
+                                    'log_status_cache.json'))
         try:
-            self._update_status()
+            with phase_timer.phase('_update_status'):
+                self._update_status()
         except FileNotFoundError:
-            self._update_status_from_logs()
+            with phase_timer.phase('_update_status_from_logs'):
+                self._update_status_from_logs()
 
     def _ingest(self):
-        """Ingest the workflow as ParslJobs."""
-        self._task_list = []
-        for job_name in self.gwf:
-            if job_name == 'pipetaskInit':
-                continue
-
-            task_name = get_task_name(job_name, self.config)
-            if task_name not in self._task_list:
-                self._task_list.append(task_name)
-            # Make sure pipelines without downstream dependencies are
-            # ingested into the ParslGraph.
-            _ = self[job_name]
-
-            # Collect downstream dependencies and prerequisites for
-            # each job.
-            for successor_job in self.gwf.successors(job_name):
-                self[job_name].add_dependency(self[successor_job])
-                self[successor_job].add_prereq(self[job_name])
+        """Ingest the workflow DAG and set up the per-job arrays."""
+        if self.snapshot is not None:
+            self.dag = self.snapshot.dag
+            self._task_list = list(self.snapshot.task_list)
+            self._task_ids = self.snapshot.task_ids
+        else:
+            self.dag = CompactDag.from_generic_workflow(self.gwf)
+            self._task_list = []
+            task_ids = {}
+            self._task_ids = np.zeros(len(self.dag), dtype=np.int16)
+            for job_id, job_name in enumerate(self.dag.names):
+                task_name = get_task_name(job_name, self.config)
+                if task_name not in task_ids:
+                    task_ids[task_name] = len(self._task_list)
+                    self._task_list.append(task_name)
+                self._task_ids[job_id] = task_ids[task_name]
+        num_jobs = len(self.dag)
+        self._futures = [None]*num_jobs
+        self._job_done = np.zeros(num_jobs, dtype=bool)
+        self._job_state = np.zeros(num_jobs, dtype=np.int8)
+        self._job_labels = {}
+
+    def _status_code(self, status):
+        """Return the int8 code for a status value."""
+        try:
+            return self._status_codes[status]
+        except KeyError:
+            code = len(self._status_names)
+            self._status_names.append(status)
+            self._status_codes[status] = code
+            return code
 
     def _update_status(self):
         """
-        Update the pandas dataframe containing the workflow status using
-        the monitoring db.
+        Update the job status index using the monitoring db.  Only
+        the status entries added since the previous update are read.
         """
-        import pandas as pd
-        # Get job status values from monitoring db.
-        df = query_workflow(self.config['outputRun'],
-                            db_file=self.monitoring_db)
-        # Make entries for jobs that are not yet in the monitoring db.
-        current_jobs = set() if df.empty else set(df['job_name'])
-        data = defaultdict(list)
-        for job_name in self:
-            if job_name in current_jobs:
-                continue
-            data['job_name'].append(job_name)
-            task_type = get_task_name(job_name, self.config)
-            data['task_type'].append(task_type)
-            data['status'].append(_PENDING)
-        self.df = pd.concat((df, pd.DataFrame(data=data)))
+        if self._status_query is None:
+            self._status_query = WorkflowStatusQuery(
+                self.config['outputRun'], db_file=self.monitoring_db)
+        changed = self._status_query.update()
+        if not changed and self._status_source == 'monitoring':
+            return
+        df = self._status_query.frame()
+        # Jobs that are not yet in the monitoring db are pending.
+        status_index = np.zeros(len(self.dag), dtype=np.int8)
+        if not df.empty:
+            # Keep the first entry for each job, following the
+            # ordering of the rows returned by the status query.
+            seen = set()
+            job_ids = self.dag.index
+            for job_name, status in zip(df['job_name'], df['status']):
+                job_id = job_ids.get(job_name)
+                if job_id is None or job_id in seen:
+                    continue
+                seen.add(job_id)
+                status_index[job_id] = self._status_code(status)
+            if self.chain_clusters is not None:
+                # Jobs run as part of a chain cluster don't have their
+                # own entries in the monitoring db.
+                self.chain_clusters.propagate_status(status_index, seen)
+        self._set_status_index(status_index, 'monitoring')
         self.have_monitoring_info = True
 
     def _update_status_from_logs(self):
         """
-        Update the pandas dataframe containing the workflow status and
-        job metadata using the task log files.
+        Update the job status index using the task log files.
         """
+        outcomes = self.log_scanner.scan()
+        # Check the outputs of jobs with failure outcomes all at once.
+        candidates = [job for job_name, job in self.items()
+                      if outcomes.get(job_name) == LOG_FAILURE
+                      and job._status not in (_SUCCEEDED, _FAILED)]
+        have_outputs = self.have_outputs(candidates) if candidates else {}
+        status_index = np.zeros(len(self.dag), dtype=np.int8)
+        for job_name, job in self.items():
+            status = job.update_status(outcomes.get(job_name),
+                                       have_outputs.get(job_name))
+            status_index[job.job_id] = self._status_code(status)
+        self._set_status_index(status_index, 'logs')
+
+    def _set_status_index(self, status_index, source):
+        """Replace the job status index and invalidate the derived views."""
+        self._status_index = status_index
+        self._status_source = source
+        self._df = None
+        self._summary = None
+
+    @property
+    def submitter(self):
+        """
+        JobSubmitter for submitting jobs in topological order.  If
+        `submission_priority: critical_path` is set in the parsl_config
+        section of the bps config, then ready jobs are submitted in
+        order of their bottom levels in the DAG, weighted by the
+        runtime estimates given by `priority_runtimes`.  The ordering
+        only controls which jobs run next as workers become free if
+        the jobs are streamed with `max_in_flight`; otherwise, all of
+        the jobs are handed to parsl at once.
+        """
+        if self._submitter is None:
+            parsl_config = dict(self.config['parsl_config'])
+            policy = parsl_config.get('submission_priority', 'none')
+            if policy not in SUBMISSION_POLICIES:
+                raise ValueError(f'Invalid submission_priority: {policy}. '
+                                 f'Valid values: {SUBMISSION_POLICIES}')
+            priorities = None
+            if policy == 'critical_path':
+                if parsl_config.get('max_in_flight') is None:
+                    print('Warning: submission_priority is set without '
+                          'max_in_flight, so all of the jobs are passed '
+                          'to parsl at once and the priorities only '
+                          'order the initial submissions.', flush=True)
+                priorities = job_priorities(
+                    self, parsl_config.get('priority_runtimes', 'uniform'))
+            self._submitter = JobSubmitter(self, priorities=priorities)
+        return self._submitter
+
+    @property
+    def output_verifier(self):
+        """OutputVerifier for the output run collection."""
+        if self._output_verifier is None:
+            self._output_verifier = OutputVerifier(self.config['butlerConfig'],
+                                                   self.config['outputRun'])
+        return self._output_verifier
+
+    def have_outputs(self, jobs):
+        """
+        Determine whether all of the outputs are present for each of
+        the jobs using bulk queries of the output run collection.
+
+        Parameters
+        ----------
+        jobs: list-like
+            ParslJob objects to consider.
+
+        Returns
+        -------
+        dict of bools, keyed by job name.
+        """
+        return self.output_verifier.have_outputs(jobs)
+
+    def _check_failed_outputs(self):
+        """
+        Mark jobs with failed status in the monitoring db as done if
+        their outputs are all present.  These are jobs that succeeded
+        but had failures arising from registry insertion conflicts,
+        e.g., when the batch allocation timed out.
+        """
+        if _FAILED not in self._status_codes:
+            return
+        failed = self._status_index == self._status_codes[_FAILED]
+        candidates = [ParslJob(self, int(_)) for _ in np.flatnonzero(failed)]
+        if not candidates:
+            return
+        for job_name, have_outputs in self.have_outputs(candidates).items():
+            if have_outputs:
+                self[job_name]._done = True
+
+    def job_status(self, job_name):
+        """
+        Return the status of the named job from the most recent status
+        update, or None if the job has no entry.
+        """
+        job_id = self.dag.index.get(job_name)
+        if job_id is None:
+            return None
+        return self._status_names[self._status_index[job_id]]
+
+    def task_name(self, job_name):
+        """Return the task name for the named job."""
+        job_id = self.dag.index.get(job_name)
+        if job_id is None:
+            return get_task_name(job_name, self.config)
+        return self._task_list[self._task_ids[job_id]]
+
+    @property
+    def gwf(self):
+        """
+        The GenericWorkflow.  If the graph was restored from a snapshot,
+        this is read from the submit directory on first access.
+        """
+        if self._gwf is None:
+            gwf_pickle_file = os.path.join(self.config['submitPath'],
+                                           _GENERIC_WORKFLOW)
+            with open(gwf_pickle_file, 'rb') as fd:
+                self._gwf = pickle.load(fd)
+        return self._gwf
+
+    def _job_info_source(self, job_name):
+        """
+        Return the object providing the `get_job` and `get_job_inputs`
+        methods for the named job, using the snapshot if possible to
+        avoid reading the GenericWorkflow.
+        """
+        if (self._gwf is None and self.snapshot is not None
+                and self.snapshot.has_template(job_name)):
+            return self.snapshot
+        return self.gwf
+
+    def get_gwf_job(self, job_name):
+        """Return the GenericWorkflowJob for the named job."""
+        return self._job_info_source(job_name).get_job(job_name)
+
+    def job_label(self, job_id):
+        """Return the pipetask label of the job with the given ID."""
+        if self.snapshot is not None:
+            return self.snapshot.labels[self.snapshot.label_ids[job_id]]
+        task_name = self._task_list[self._task_ids[job_id]]
+        if task_name not in self._job_labels:
+            self._job_labels[task_name] \
+                = self.gwf.get_job(self.dag.names[job_id]).label
+        return self._job_labels[task_name]
+
+    @property
+    def df(self):
+        """
+        pandas.DataFrame view of the job status index.  This is
+        regenerated only after the status index has been updated.
+        """
+        if self._df is None:
+            self._df = self._status_frame()
+        return self._df
+
+    def _status_frame(self):
+        """Build the pandas dataframe from the job status index."""
         import pandas as pd
+        statuses = np.array(self._status_names, dtype=object)[
+            self._status_index]
+        if self._status_source != 'logs':
+            task_types = np.array(self._task_list, dtype=object)[
+                self._task_ids]
+            return pd.DataFrame(data=dict(job_name=self.dag.names,
+                                          task_type=task_types,
+                                          status=statuses))
+
+        # For the log-based status, include the job metadata parsed
+        # from the job names.
         data = defaultdict(list)
         _, template_id = self.config.search('templateDataId',
                                             opt=dict(replaceVars=False))
@@ -461,15 +935,15 @@ class ParslGraph(dict):
                 return int(value)
             except ValueError:
                 return value
-        for job_name, job in self.items():
+        for job_name, status in zip(self.dag.names, statuses):
             md = {_: '' for _ in md_columns}
             for key, value in zip(md_columns, job_name.split('_')[1:]):
                 md[key] = int_cast(value)
             for key, value in md.items():
                 data[key].append(value)
             data['job_name'].append(job_name)
-            data['status'].append(job.status)
-        self.df = pd.DataFrame(data=data)
+            data['status'].append(status)
+        return pd.DataFrame(data=data)
 
     @property
     def qgraph_file(self):
@@ -486,6 +960,80 @@ class ParslGraph(dict):
                                                 DimensionUniverse())
         return self._qgraph
 
+    @property
+    def qgraph_shards(self):
+        """
+        QgraphShards for the jobs in this workflow, or None if shards
+        have not been written.
+        """
+        if self._qgraph_shards is False:
+            self._qgraph_shards = QgraphShards.read(
+                os.path.join(self.config['submitPath'], _QGRAPH_SHARDS))
+        return self._qgraph_shards
+
+    def write_qgraph_shards(self, shard_size=1000):
+        """
+        Write per-task QuantumGraph shards to the submit directory so
+        that each job's command line refers to a shard containing its
+        quanta instead of the full QuantumGraph file.
+
+        Parameters
+        ----------
+        shard_size: int [1000]
+            Maximum number of jobs per shard.
+        """
+        shard_dir = os.path.join(self.config['submitPath'], _QGRAPH_SHARDS)
+        self._qgraph_shards = QgraphShards.write(self, shard_dir,
+                                                 shard_size=shard_size)
+
+    @property
+    def routing_table(self):
+        """
+        RoutingTable for the executors of the DataFlowKernel.  The
+        routing decision for each submitted job is written to
+        `executor_routing.log` in the logging directory.  For the
+        'warm' execution mode, the executors are checked to be
+        process-based.
+        """
+        if self._routing_dfk is not self.dfk:
+            log_file = os.path.join(self.config['submitPath'], 'logging',
+                                    'executor_routing.log')
+            routing_table = RoutingTable(self.dfk.executors,
+                                         log_file=log_file)
+            if self.execution_mode == 'warm':
+                check_warm_executors(self.dfk.executors, routing_table.labels)
+            self._routing_table = routing_table
+            self._routing_dfk = self.dfk
+        return self._routing_table
+
+    @property
+    def finalizer(self):
+        """
+        ShardedFinalizer for transferring the outputs per QuantumGraph
+        shard, or None if neither `finalize_workers` nor
+        `finalize_interval` is set in the parsl_config section of the
+        bps config.  Shards are written if needed.
+        """
+        parsl_config = dict(self.config['parsl_config'])
+        num_workers = parsl_config.get('finalize_workers')
+        interval = parsl_config.get('finalize_interval')
+        if num_workers is None and interval is None:
+            return None
+        if self._finalizer is None:
+            if self.qgraph_shards is None:
+                self.write_qgraph_shards(
+                    parsl_config.get('qgraph_shard_size', 1000))
+            self._finalizer = ShardedFinalizer(self,
+                                               num_workers=num_workers or 1)
+        return self._finalizer
+
+    def _start_incremental_finalize(self):
+        """Start transferring the outputs of completed shards in the
+        background if `finalize_interval` is set."""
+        interval = dict(self.config['parsl_config']).get('finalize_interval')
+        if interval is not None:
+            self.finalizer.start(interval)
+
     def get_jobs(self, task_type, status='pending', query=None):
         """
         Return a list of job names for the specified task applying an
@@ -498,26 +1046,57 @@ class ParslGraph(dict):
             my_query = ' and '.join((my_query, query))
         return sorted(self.df.query(my_query)['job_name'])
 
+    def status_summary(self, statuses=None):
+        """
+        Return the number of jobs of each task type for each status
+        value.  The counts are computed in a single pass over the job
+        status index and are cached until the index is updated.
+
+        Parameters
+        ----------
+        statuses: list [None]
+            Status values to include as columns.  If None, then all of
+            the status values in the index are used.
+
+        Returns
+        -------
+        pandas.DataFrame with the task types as the index, the status
+        values as columns, and a 'total' column with the number of jobs
+        of each task type.
+        """
+        import pandas as pd
+        if self._summary is None:
+            num_statuses = len(self._status_names)
+            counts = np.bincount(
+                self._task_ids.astype(np.int64)*num_statuses
+                + self._status_index,
+                minlength=len(self._task_list)*num_statuses)
+            counts = counts.reshape(len(self._task_list), num_statuses)
+            summary = pd.DataFrame(counts, index=self._task_list,
+                                   columns=self._status_names)
+            summary['total'] = counts.sum(axis=1)
+            self._summary = summary
+        if statuses is None:
+            return self._summary
+        return self._summary.reindex(columns=list(statuses) + ['total'],
+                                     fill_value=0)
+
     def status(self, use_logs=False):
         """Print a summary of the workflow status."""
         if not use_logs:
             try:
                 self._update_status()
-                print_status(self.df, self._task_list)
+                print_status(self.df, summary=self.status_summary())
                 return
             except FileNotFoundError:
                 pass
         self._update_status_from_logs()
         summary = ['task type                '
                    'pending  scheduled  running  succeeded  failed  total\n']
-        for task_type in self._task_list:
-            my_df = self.df.query(f'task_type == "{task_type}"')
-            num_tasks = len(my_df)
-            num_pending = len(my_df.query(f'status == "{_PENDING}"'))
-            num_scheduled = len(my_df.query(f'status == "{_SCHEDULED}"'))
-            num_running = len(my_df.query(f'status == "{_RUNNING}"'))
-            num_succeeded = len(my_df.query(f'status == "{_SUCCEEDED}"'))
-            num_failed = len(my_df.query(f'status == "{_FAILED}"'))
+        counts = self.status_summary(_JOB_STATUSES)
+        for task_type, row in zip(counts.index, counts.to_numpy()):
+            num_pending, num_scheduled, num_running, num_succeeded, \
+                num_failed, num_tasks = row
             summary.append(f'{task_type:25s}  {num_pending:5d}      '
                            f'{num_scheduled:5d}    '
                            f'{num_running:5d}      {num_succeeded:5d}   '
@@ -525,28 +1104,63 @@ class ParslGraph(dict):
         print('\n'.join(summary))
 
     def __getitem__(self, job_name):
+        """Return a ParslJob view of the named job."""
+        return ParslJob(self, self.dag.index[job_name])
+
+    def __contains__(self, job_name):
+        return job_name in self.dag.index
+
+    def __iter__(self):
+        return iter(self.dag.names)
+
+    def __len__(self):
+        return len(self.dag)
+
+    def job_from_id(self, job_id):
+        """Return a ParslJob view of the job with the given ID."""
+        return ParslJob(self, job_id)
+
+    def chain_jobs(self, job_id):
         """
-        Re-implementation of dict.__getitem__ to create ParslJobs
-        from each of the named jobs in the generic_workflow.
+        Return the list of ParslJobs to run in the same invocation as
+        the specified job, i.e., the job itself followed by the jobs
+        later in its chain cluster that are not done.
         """
-        if not job_name in self:
-            try:
-                gwf_job = self.gwf.get_job(job_name)
-            except KeyError:
-                gwf_job = None
-            super().__setitem__(job_name, ParslJob(gwf_job, self))
-        return super().__getitem__(job_name)
-
-    def evaluate_command_line(self, command, gwf_job):
+        job = self.job_from_id(job_id)
+        chain = (None if self.chain_clusters is None
+                 else self.chain_clusters.chain(job_id))
+        if chain is None:
+            return [job]
+        members = chain[chain.index(job_id) + 1:]
+        return [job] + [_ for _ in map(self.job_from_id, members)
+                        if not _.done and _.future is None]
+
+    def evaluate_command_line(self, command, gwf_job, cmdvals=None):
         """
         Evaluate command line, replacing bps variables, fixing env vars,
         and inserting job-specific file paths, all assuming that
-        everything is running on a shared file system.
+        everything is running on a shared file system.  The command
+        line templates are parsed once and cached, so that rendering
+        the command line for each job only requires the substitutions.
+        If cmdvals is given, those values are used instead of
+        gwf_job.cmdvals, and the full QuantumGraph is used instead of
+        the job's shard.
         """
-        command = command.format(**gwf_job.cmdvals)
-        command = fix_env_var_syntax(command)
-        file_paths = get_input_file_paths(self.gwf, gwf_job.name)
-        return insert_file_paths(command, file_paths)
+        shards = self.qgraph_shards
+        sharded = (cmdvals is None and shards is not None
+                   and gwf_job.name in shards)
+        if cmdvals is None:
+            cmdvals = gwf_job.cmdvals
+        if sharded and 'qgraphId' in cmdvals:
+            cmdvals = dict(cmdvals, qgraphId=shards.graph_id(gwf_job.name))
+        file_paths = self._command_compiler.input_file_paths(
+            self._job_info_source(gwf_job.name), gwf_job.name)
+        if sharded:
+            # Point the job at its QuantumGraph shard.
+            shard_file = shards.shard_file(gwf_job.name)
+            file_paths = {key: shard_file if shards.is_full_qgraph(value)
+                          else value for key, value in file_paths.items()}
+        return self._command_compiler.render(command, cmdvals, file_paths)
 
     def _pipetaskInit(self):
         """If the output collection isn't in the repo, run pipetaskInit."""
@@ -564,9 +1178,37 @@ class ParslGraph(dict):
         return lsst.utils.doImport(parsl_config)
 
     def save_config(self, config_file):
-        """Save the bps config as a pickle file."""
+        """
+        Save the bps config as a pickle file, and write a snapshot of
+        the ingested workflow to the submit directory for fast restores.
+        """
         with open(config_file, 'wb') as fd:
             pickle.dump(self.config, fd)
+        self.save_snapshot()
+
+    def _snapshot_sources(self):
+        """Files in the submit directory on which the snapshot is based."""
+        submit_path = self.config['submitPath']
+        return [os.path.join(submit_path, _GENERIC_WORKFLOW),
+                os.path.join(submit_path, _PARSL_GRAPH_CONFIG)]
+
+    def save_snapshot(self):
+        """
+        Write a snapshot of the ingested workflow to the submit
+        directory.  This is skipped if the GenericWorkflow and as-run
+        config pickle files are not both in the submit directory.
+        """
+        sources = self._snapshot_sources()
+        if not all(os.path.isfile(_) for _ in sources):
+            return
+        snapshot_dir = os.path.join(self.config['submitPath'],
+                                    _GRAPH_SNAPSHOT)
+        try:
+            GraphSnapshot.write(self, snapshot_dir, sources)
+        except (TypeError, ValueError) as eobj:
+            # Job info that can't be serialized, so ParslGraph.restore
+            # will use the pickle files.
+            print(f'Unable to write graph snapshot: {eobj}')
 
     @staticmethod
     def restore(config_file, parsl_config=None, use_dfk=True):
@@ -593,42 +1235,104 @@ class ParslGraph(dict):
         -------
         ParslGraph object
         """
-        from lsst.ctrl.bps import BpsConfig, BPS_SEARCH_ORDER
-        # Need to have created a DimensionUniverse object to load a
-        # pickled QuantumGraph.
-        lsst.daf.butler.DimensionUniverse()
-        with open(config_file, 'rb') as fd:
-            config = pickle.load(fd)
-        gwf_pickle_file = os.path.join(config['submitPath'],
-                                       'bps_generic_workflow.pickle')
-        with open(gwf_pickle_file, 'rb') as fd:
-            generic_workflow = pickle.load(fd)
-
-        if parsl_config is not None:
-            if isinstance(parsl_config, dict):
-                config['parsl_config'] = parsl_config
-            elif os.path.isfile(parsl_config):
-                my_config = BpsConfig(parsl_config, BPS_SEARCH_ORDER)
-                config['parsl_config'] = my_config['parsl_config']
-            else:
-                config['parslConfig'] = parsl_config
+        with phase_timer.phase('ParslGraph.restore'):
+            from lsst.ctrl.bps import BpsConfig, BPS_SEARCH_ORDER
+            # Need to have created a DimensionUniverse object to load a
+            # pickled QuantumGraph.
+            lsst.daf.butler.DimensionUniverse()
+            with open(config_file, 'rb') as fd:
+                config = pickle.load(fd)
+            submit_path = config['submitPath']
+
+            # Use the snapshot of the ingested workflow, if it's available
+            # and up-to-date, and otherwise read the GenericWorkflow.
+            generic_workflow = None
+            with phase_timer.phase('read_snapshot'):
+                snapshot = GraphSnapshot.read(
+                    os.path.join(submit_path, _GRAPH_SNAPSHOT),
+                    [os.path.join(submit_path, _GENERIC_WORKFLOW),
+                     os.path.join(submit_path, _PARSL_GRAPH_CONFIG)])
+            if snapshot is None:
+                gwf_pickle_file = os.path.join(submit_path, _GENERIC_WORKFLOW)
+                with phase_timer.phase('read_generic_workflow'):
+                    with open(gwf_pickle_file, 'rb') as fd:
+                        generic_workflow = pickle.load(fd)
+
+            if parsl_config is not None:
+                if isinstance(parsl_config, dict):
+                    config['parsl_config'] = parsl_config
+                elif os.path.isfile(parsl_config):
+                    my_config = BpsConfig(parsl_config, BPS_SEARCH_ORDER)
+                    config['parsl_config'] = my_config['parsl_config']
+                else:
+                    config['parslConfig'] = parsl_config
 
-        dfk = load_parsl_config(config) if use_dfk else None
+            phase_timer.configure(config)
+            dfk = None
+            if use_dfk:
+                with phase_timer.phase('load_parsl_config'):
+                    dfk = load_parsl_config(config)
 
-        return ParslGraph(generic_workflow, config, do_init=False, dfk=dfk)
+            with phase_timer.phase('ParslGraph'):
+                return ParslGraph(generic_workflow, config, do_init=False,
+                                  dfk=dfk, snapshot=snapshot)
 
     def run(self, jobs=None, block=False, shutdown=True):
         """
         Run the encapsulated workflow by requesting the futures of
         the requested jobs or of those at the endpoints of the DAG.
+        If `max_in_flight` is set in the parsl_config section of the
+        bps config, then the jobs are streamed to parsl, keeping at
+        most that number of jobs in flight, either in total or, if it
+        is a dict, per executor label.
+        """
+        futures = self._start_jobs(jobs)
+        self._wait_for_jobs(futures, block, shutdown)
+
+    def _start_jobs(self, jobs=None):
+        """
+        Hand the requested jobs to parsl, or, if `max_in_flight` is
+        set, prepare their streaming submission.  Return the futures
+        of the submitted jobs, or None for streaming submission.
         """
         set_parsl_logging(self.config)
-        if jobs is not None:
-            futures = [self[job_name].get_future() for job_name in jobs]
-        else:
-            # Run all of the jobs at the endpoints of the DAG
-            futures = [job.get_future() for job in self.values()
-                       if not job.dependencies]
+        futures = None
+        with phase_timer.phase('ParslGraph.run'):
+            if self.have_monitoring_info:
+                with phase_timer.phase('_check_failed_outputs'):
+                    self._check_failed_outputs()
+
+            max_in_flight \
+                = dict(self.config['parsl_config']).get('max_in_flight')
+            if max_in_flight is not None:
+                if not isinstance(max_in_flight, int):
+                    max_in_flight = dict(max_in_flight)
+                self.streaming_submission = StreamingSubmission(
+                    self.submitter, max_in_flight, job_names=jobs)
+            else:
+                # Submit the requested jobs, or if jobs is None, all of
+                # the jobs at the endpoints of the DAG, along with their
+                # prerequisites.
+                with phase_timer.phase('submit_jobs'):
+                    futures = self.submitter.submit(jobs)
+            self._start_incremental_finalize()
+        return futures
+
+    def _wait_for_jobs(self, futures, block=False, shutdown=True):
+        """
+        Start the streaming submission or, if `block` is True, wait for
+        the jobs started by `_start_jobs` to finish and finalize the
+        workflow.
+        """
+        if futures is None:
+            if not block:
+                self.streaming_submission.start()
+                return
+            self.streaming_submission.run()
+            self.finalize()
+            if shutdown:
+                self.shutdown()
+            return
 
         if block:
             # Calling .exception() for each future blocks returning
@@ -655,7 +1359,12 @@ class ParslGraph(dict):
 
     def finalize(self):
         """Run final job to transfer datasets from the quantum-backed
-        butler to the destination repo butler."""
+        butler to the destination repo butler.  If sharded finalization
+        is enabled, the transfers are run per QuantumGraph shard,
+        skipping any shards that have already been transferred."""
+        if self.finalizer is not None:
+            self.finalizer.finalize()
+            return
         log_file = os.path.join(self.config['submitPath'], 'logging',
                                 'final_merge_job.log')
         command = (f"(bash {self.config['submitPath']}/final_job.bash "
@@ -684,9 +1393,11 @@ class ParslService(BaseWmsService):
         ParslWorkflow
         """
         service_class = 'desc.gen3_workflow.ParslService'
-        workflow = ParslWorkflow.\
-            from_generic_workflow(config, generic_workflow, out_prefix,
-                                  service_class)
+        phase_timer.configure(config)
+        with phase_timer.phase('ParslService.prepare'):
+            workflow = ParslWorkflow.\
+                from_generic_workflow(config, generic_workflow, out_prefix,
+                                      service_class)
         print(f'Run Name: {workflow.name}')
         return workflow
 
@@ -700,10 +1411,15 @@ class ParslService(BaseWmsService):
             Workflow object to execute.
         """
         # Import the parsl config and set the DataFlowKernel attribute.
-        workflow.parsl_graph.dfk \
-            = load_parsl_config(workflow.parsl_graph.config)
-
-        workflow.parsl_graph.run(block=True)
+        graph = workflow.parsl_graph
+        phase_timer.configure(graph.config)
+        # The phase ends once the jobs are handed to parsl, so that the
+        # report is written before waiting for them to finish.
+        with phase_timer.phase('ParslService.submit'):
+            with phase_timer.phase('load_parsl_config'):
+                graph.dfk = load_parsl_config(graph.config)
+            futures = graph._start_jobs()
+        graph._wait_for_jobs(futures, block=True)
 
     def restart(self, workflow_name):
         """Restart a workflow.
@@ -732,8 +1448,10 @@ class ParslService(BaseWmsService):
         """
         parsl_graph = os.path.join('submit', workflow_name,
                                    'parsl_graph_config.pickle')
-        graph = ParslGraph.restore(parsl_graph)
-        graph.run(block=True)
+        with phase_timer.phase('ParslService.restart'):
+            graph = ParslGraph.restore(parsl_graph)
+            futures = graph._start_jobs()
+        graph._wait_for_jobs(futures, block=True)
 
         return workflow_name, workflow_name, ''
 
@@ -789,10 +1507,19 @@ class ParslWorkflow(BaseWmsWorkflow):
         ParslWorkflow
         """
         parsl_workflow = cls(generic_workflow.name, config)
-        parsl_workflow.parsl_graph = ParslGraph(generic_workflow, config)
+        with phase_timer.phase('ParslGraph'):
+            parsl_workflow.parsl_graph = ParslGraph(generic_workflow, config)
+        shard_size = dict(config['parsl_config']).get('qgraph_shard_size')
+        if shard_size:
+            # Write QuantumGraph shards so that the individual jobs
+            # don't need to read the full QuantumGraph file.
+            with phase_timer.phase('write_qgraph_shards'):
+                parsl_workflow.parsl_graph.write_qgraph_shards(
+                    int(shard_size))
         parsl_workflow.submit_path = out_prefix
         parsl_graph_config = os.path.join(out_prefix, _PARSL_GRAPH_CONFIG)
-        parsl_workflow.parsl_graph.save_config(parsl_graph_config)
+        with phase_timer.phase('save_config'):
+            parsl_workflow.parsl_graph.save_config(parsl_graph_config)
         return parsl_workflow
 
     def write(self, out_prefix):
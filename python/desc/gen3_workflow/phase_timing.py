@@ -0,0 +1,172 @@
+"""
+Module to record the wall time, CPU time, and memory usage of the
+phases of preparing, submitting, and restarting workflows.
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import resource
+import tracemalloc
+from contextlib import contextmanager
+
+
+__all__ = ['PhaseTimer', 'phase_timer', 'PHASE_TIMING_FILE']
+
+
+# Name of the file in the submit directory with the phase timing reports.
+PHASE_TIMING_FILE = 'phase_timings.json'
+
+_ENV_VAR = 'GEN3_WORKFLOW_PHASE_TIMING'
+
+
+def _timing_mode(value):
+    """
+    Return 'memory', 'time', or None for the phase_timing setting from
+    the environment variable or the parsl_config.
+    """
+    if value is None or value is False:
+        return None
+    value = str(value).strip().lower()
+    if value in ('', '0', 'false', 'no', 'off'):
+        return None
+    return 'memory' if value == 'memory' else 'time'
+
+
+def _max_rss_mb():
+    """Peak resident memory of the current process in MB."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB on Linux.
+    return max_rss/1024**2 if sys.platform == 'darwin' else max_rss/1024
+
+
+class PhaseTimer:
+    """
+    Class to record the wall time, CPU time, and peak memory of nested
+    phases.  When an outermost phase ends, its timings and those of the
+    phases nested in it are appended to a json report in the submit
+    directory and summarized in one line, if phase timing is enabled
+    by the GEN3_WORKFLOW_PHASE_TIMING environment variable or by the
+    `phase_timing` entry in parsl_config.  A value of 'memory' also
+    traces the Python memory allocations with tracemalloc during the
+    outermost phases, which slows down the traced code.  If phase
+    timing is not enabled, only a few clock reads are done per phase.
+    """
+    def __init__(self):
+        self.mode = _timing_mode(os.environ.get(_ENV_VAR))
+        self.submit_path = None
+        self._stack = []
+        self._phases = []
+        self._tracing = False
+
+    def configure(self, config):
+        """
+        Set the submit directory and the timing mode from the bps
+        config.  The environment variable takes precedence over the
+        parsl_config entry.
+        """
+        self.submit_path = config['submitPath']
+        self.mode = (_timing_mode(os.environ.get(_ENV_VAR))
+                     or _timing_mode(dict(config['parsl_config'])
+                                     .get('phase_timing')))
+        if self._stack:
+            self._start_tracing()
+
+    def _start_tracing(self):
+        """Start tracing the memory allocations if the mode is 'memory'."""
+        if self.mode == 'memory' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def _stop_tracing(self):
+        """Stop the tracing started by this timer."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager to record the execution of a phase."""
+        if not self._stack:
+            self._phases = []
+            self._started = datetime.datetime.now()
+            self._start_tracing()
+        if tracemalloc.is_tracing():
+            # Carry the peak so far over to the enclosing phase before
+            # resetting it for this one.
+            if self._stack:
+                self._stack[-1]['traced_peak'] = max(
+                    self._stack[-1]['traced_peak'],
+                    tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        entry = dict(name=name, depth=len(self._stack))
+        self._phases.append(entry)
+        frame = dict(traced_peak=0, wall=time.perf_counter(),
+                     cpu=time.process_time())
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            entry['wall_s'] = time.perf_counter() - frame['wall']
+            entry['cpu_s'] = time.process_time() - frame['cpu']
+            entry['max_rss_MB'] = _max_rss_mb()
+            if tracemalloc.is_tracing():
+                peak = max(frame['traced_peak'],
+                           tracemalloc.get_traced_memory()[1])
+                entry['traced_peak_MB'] = peak/1024**2
+                if self._stack:
+                    self._stack[-1]['traced_peak'] = max(
+                        self._stack[-1]['traced_peak'], peak)
+            if not self._stack:
+                self._finish()
+
+    def _finish(self):
+        """Write the report and print the summary for an outermost
+        phase."""
+        self._stop_tracing()
+        if self.mode is None:
+            return
+        report = dict(started=self._started.isoformat(timespec='seconds'),
+                      phases=self._phases)
+        self.write(report)
+        print(self.summary(self._phases), flush=True)
+
+    @staticmethod
+    def summary(phases):
+        """
+        Return a one-line summary of the outermost phase and the
+        innermost phases nested in it.
+        """
+        top = phases[0]
+        leaves = [f"{phase['name']} {phase['wall_s']:.1f}"
+                  for i, phase in enumerate(phases[1:], 1)
+                  if i == len(phases) - 1
+                  or phases[i + 1]['depth'] <= phase['depth']]
+        line = (f"{top['name']} phase timing: {top['wall_s']:.1f} s wall, "
+                f"{top['cpu_s']:.1f} s cpu")
+        if leaves:
+            line += f" ({', '.join(leaves)} s)"
+        line += f", peak RSS {top['max_rss_MB']:.0f} MB"
+        if 'traced_peak_MB' in top:
+            line += f", traced peak {top['traced_peak_MB']:.0f} MB"
+        return line
+
+    def write(self, report):
+        """Append a report to the json file in the submit directory."""
+        if self.submit_path is None or not os.path.isdir(self.submit_path):
+            return
+        outfile = os.path.join(self.submit_path, PHASE_TIMING_FILE)
+        reports = []
+        if os.path.isfile(outfile):
+            with open(outfile) as fd:
+                reports = json.load(fd)
+        reports.append(report)
+        tmp_file = outfile + '.tmp'
+        with open(tmp_file, 'w') as fd:
+            json.dump(reports, fd, indent=2)
+        os.replace(tmp_file, outfile)
+
+
+phase_timer = PhaseTimer()
@@ -0,0 +1,104 @@
+"""
+Module to compute submission priorities for the jobs in a ParslGraph
+from the bottom levels of the jobs in the DAG, i.e., the lengths of
+the longest paths from each job to the end of the workflow, weighted
+by the estimated runtimes of the jobs.
+"""
+import os
+import sqlite3
+import numpy as np
+
+
+__all__ = ['monitoring_runtimes', 'resource_model_runtimes', 'job_priorities',
+           'SUBMISSION_POLICIES']
+
+
+SUBMISSION_POLICIES = ('none', 'critical_path')
+
+
+def monitoring_runtimes(db_file='./runinfo/monitoring.db'):
+    """
+    Compute the mean runtime for each task label from the intervals
+    between the running and running_ended status entries in a parsl
+    monitoring db.
+
+    Returns
+    -------
+    dict of runtimes in hours, keyed by task label.
+    """
+    if not os.path.isfile(db_file):
+        raise FileNotFoundError(db_file)
+    query = '''select task.task_func_name, avg(durations.duration) from
+               (select task_id, run_id,
+                julianday(max(case when task_status_name='running_ended'
+                               then timestamp end))
+                - julianday(min(case when task_status_name='running'
+                                then timestamp end)) as duration
+                from status group by task_id, run_id) as durations
+               join task on task.task_id=durations.task_id and
+               task.run_id=durations.run_id
+               where durations.duration is not null
+               and task.task_func_name not like '%\\_no\\_op' escape '\\'
+               group by task.task_func_name'''
+    with sqlite3.connect(db_file) as conn:
+        return {label: 24.*days for label, days in conn.execute(query)}
+
+
+def resource_model_runtimes(json_file):
+    """
+    Compute the runtime for each task label using the cpu time
+    models read by `get_pipetask_resource_funcs`, evaluated for a
+    single visit.
+
+    Returns
+    -------
+    dict of runtimes in hours, keyed by task label.
+    """
+    from .resource_estimator import get_pipetask_resource_funcs
+    funcs = get_pipetask_resource_funcs(json_file)
+    return {label: max(float(func.cpu_time(1)), 0)
+            for label, func in funcs.items()}
+
+
+def job_priorities(graph, runtimes='uniform'):
+    """
+    Compute the submission priority of each job in a ParslGraph as its
+    bottom level, so that the jobs on the longest remaining paths
+    through the DAG are submitted first.
+
+    Parameters
+    ----------
+    graph: ParslGraph
+        The graph containing the jobs.
+    runtimes: str or dict ['uniform']
+        Source of the job runtime estimates used as weights:
+        'uniform' for unit weights, 'monitoring' for the mean runtimes
+        per task label in the graph's monitoring db, the filename of a
+        json file of resource model parameters to be read by
+        `resource_model_runtimes`, or a dict of runtimes keyed by task
+        label.  Jobs with task labels that don't have estimates are
+        given the median of the available estimates.
+
+    Returns
+    -------
+    numpy.ndarray of priorities indexed by job ID.
+    """
+    if runtimes == 'uniform':
+        runtimes = {}
+    elif runtimes == 'monitoring':
+        try:
+            runtimes = monitoring_runtimes(graph.monitoring_db)
+        except FileNotFoundError:
+            print(f'{graph.monitoring_db} not found, so using uniform '
+                  'runtimes for the job priorities.', flush=True)
+            runtimes = {}
+    elif isinstance(runtimes, str):
+        runtimes = resource_model_runtimes(runtimes)
+    default = np.median(list(runtimes.values())) if runtimes else 1.
+
+    # Map the runtimes to the jobs via the task IDs of the graph.
+    task_ids = np.asarray(graph._task_ids)
+    task_weights = np.full(len(graph._task_list), default)
+    for task_id, job_id in zip(*np.unique(task_ids, return_index=True)):
+        task_weights[task_id] = runtimes.get(graph.job_label(job_id), default)
+    return graph.dag.bottom_levels(task_weights[task_ids])
@@ -0,0 +1,145 @@
+"""
+Module to split the QuantumGraph of a workflow into small per-task
+shards so that each pipetask job only needs to read the shard with
+its own quanta instead of the full QuantumGraph file.
+"""
+import os
+import json
+import uuid
+from collections import defaultdict
+from lsst.daf.butler import DimensionUniverse
+from lsst.pipe.base.graph import QuantumGraph
+
+
+__all__ = ['QgraphShards', 'job_node_ids']
+
+
+_MANIFEST = 'manifest.json'
+
+
+def job_node_ids(gwf_job):
+    """Return the list of QuantumGraph node UUIDs for a workflow job."""
+    return [uuid.UUID(_) for _ in gwf_job.cmdvals['qgraphNodeId'].split(',')]
+
+
+class QgraphShards:
+    """
+    Class to write and look up QuantumGraph shards.  Each shard
+    contains the quanta for a group of jobs with the same task label,
+    and the mapping of jobs to shards is stored in a json manifest in
+    the shard directory.
+    """
+    def __init__(self, shard_dir, manifest):
+        """
+        Parameters
+        ----------
+        shard_dir: str
+            Directory containing the shard files and the manifest.
+        manifest: dict
+            Dictionary with the full QuantumGraph filename, the file and
+            graph ID of each shard, and the shard name for each job.
+        """
+        self.shard_dir = shard_dir
+        self.manifest = manifest
+        self.qgraph_file = manifest['qgraph_file']
+        self.shards = manifest['shards']
+        self.jobs = manifest['jobs']
+        self._is_full_qgraph = {}
+
+    def __contains__(self, job_name):
+        return job_name in self.jobs
+
+    def is_full_qgraph(self, path):
+        """Return True if path refers to the full QuantumGraph file."""
+        if path not in self._is_full_qgraph:
+            self._is_full_qgraph[path] \
+                = (os.path.realpath(path) == self.qgraph_file)
+        return self._is_full_qgraph[path]
+
+    def shard_file(self, job_name):
+        """Return the shard filename for the named job."""
+        return self.shards[self.jobs[job_name]]['file']
+
+    def graph_id(self, job_name):
+        """Return the QuantumGraph ID of the shard for the named job."""
+        return self.shards[self.jobs[job_name]]['graph_id']
+
+    def load_nodes(self, job_name, node_ids):
+        """
+        Read the specified nodes from the shard for the named job.
+        Only the requested nodes are deserialized.
+        """
+        qgraph = QuantumGraph.loadUri(self.shard_file(job_name),
+                                      DimensionUniverse(), nodes=node_ids)
+        return [qgraph.getQuantumNodeByNodeId(_) for _ in node_ids]
+
+    @staticmethod
+    def write(graph, shard_dir, shard_size=1000):
+        """
+        Write QuantumGraph shards for the jobs in a ParslGraph.
+
+        Parameters
+        ----------
+        graph: ParslGraph
+            The graph containing the jobs.  The full QuantumGraph is
+            read via `graph.qgraph`.
+        shard_dir: str
+            Output directory for the shards and manifest.
+        shard_size: int [1000]
+            Maximum number of jobs per shard.  The jobs for each task
+            label are assigned to shards in DAG order.
+
+        Returns
+        -------
+        QgraphShards
+        """
+        os.makedirs(shard_dir, exist_ok=True)
+        groups = defaultdict(list)
+        for job_id, job_name in enumerate(graph.dag.names):
+            label = graph.job_label(job_id)
+            if not groups[label] or len(groups[label][-1]) >= shard_size:
+                groups[label].append([])
+            groups[label][-1].append(job_name)
+
+        qgraph = graph.qgraph
+        manifest = dict(qgraph_file=os.path.realpath(graph.qgraph_file),
+                        shards={}, jobs={})
+        for label, job_groups in groups.items():
+            for i, job_names in enumerate(job_groups):
+                shard_name = f'{label}_{i:05d}'
+                nodes = [qgraph.getQuantumNodeByNodeId(node_id)
+                         for job_name in job_names
+                         for node_id in job_node_ids(graph[job_name].gwf_job)]
+                subgraph = qgraph.subset(nodes)
+                shard_file = os.path.join(shard_dir, f'{shard_name}.qgraph')
+                subgraph.saveUri(shard_file)
+                manifest['shards'][shard_name] \
+                    = dict(file=os.path.realpath(shard_file),
+                           graph_id=subgraph.graphID,
+                           num_jobs=len(job_names))
+                for job_name in job_names:
+                    manifest['jobs'][job_name] = shard_name
+
+        # Write the manifest last so that incomplete sets of shards are
+        # not used.
+        tmp_file = os.path.join(shard_dir, f'{_MANIFEST}.tmp')
+        with open(tmp_file, 'w') as fd:
+            json.dump(manifest, fd)
+        os.replace(tmp_file, os.path.join(shard_dir, _MANIFEST))
+        return QgraphShards(shard_dir, manifest)
+
+    @staticmethod
+    def read(shard_dir):
+        """
+        Read the shard manifest.
+
+        Returns
+        -------
+        QgraphShards or None if there is no manifest.
+        """
+        manifest_file = os.path.join(shard_dir, _MANIFEST)
+        if not os.path.isfile(manifest_file):
+            return None
+        with open(manifest_file) as fd:
+            manifest = json.load(fd)
+        return QgraphShards(shard_dir, manifest)
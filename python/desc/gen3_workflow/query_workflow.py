@@ -3,13 +3,15 @@ Module to extract status info of the workflow tasks from the
 monitoring.db file.
 """
 import os
+import time
 from collections import defaultdict
 import sqlite3
-import numpy as np
 import pandas as pd
 
 
-__all__ = ['query_workflow', 'print_status', 'get_task_name']
+__all__ = ['query_workflow', 'print_status', 'status_summary',
+           'get_task_name', 'get_task_names', 'WorkflowStatusQuery',
+           'create_monitoring_db_indexes', 'optimize_monitoring_db']
 
 
 def is_uuid(value):
@@ -18,6 +20,12 @@ def is_uuid(value):
     return sizes == (8, 4, 4, 4, 12)
 
 
+# The task name follows a leading uuid or integer token; otherwise,
+# the first token is the task name.  See `get_task_name`.
+_TASK_NAME_PATTERN = (r'^(?:(?:[^-_]{8}-[^-_]{4}-[^-_]{4}-[^-_]{4}-[^-_]{12}'
+                      r'|\s*[+-]?\d+\s*)_)?([^_]*)')
+
+
 def get_task_name(job_name, bps_config=None):
     """Extract the task name from the GenericWorkflowJob name."""
     # Get cluster names from any quantum clustering specification
@@ -45,6 +53,31 @@ def get_task_name(job_name, bps_config=None):
     return tokens[1]
 
 
+def get_task_names(job_names):
+    """
+    Vectorized version of `get_task_name` for a pandas.Series of
+    job names, without the handling of quantum cluster names.
+    """
+    return job_names.str.extract(_TASK_NAME_PATTERN, expand=False)
+
+
+# Select the latest status of each task, preferring exec_done over
+# any later status values.  This uses SQLite's handling of bare columns
+# in aggregate queries with a single max(), where the values are taken
+# from the row with the maximum value.
+_LATEST_STATUS_QUERY = '''select task_stderr, task_status_name from
+    (select task.task_stderr, status.task_status_name,
+     max((status.task_status_name = 'exec_done') || status.timestamp)
+     from task join status on task.task_id=status.task_id and
+     task.run_id=status.run_id join workflow
+     on task.run_id=workflow.run_id where
+     workflow.workflow_name=?
+     and task.task_stderr is not null
+     group by task.task_stderr)
+    where task_status_name != 'running_ended'
+    order by task_stderr'''
+
+
 def query_workflow(workflow_name, db_file='./runinfo/monitoring.db'):
     """
     Query the workflow, task, and status tables for the
@@ -54,65 +87,328 @@ def query_workflow(workflow_name, db_file='./runinfo/monitoring.db'):
     if not os.path.isfile(db_file):
         raise FileNotFoundError(db_file)
     with sqlite3.connect(db_file) as conn:
-        df = pd.read_sql('select * from workflow where '
-                         f'workflow_name="{workflow_name}"', conn)
+        df = pd.read_sql('select * from workflow where workflow_name=?',
+                         conn, params=(workflow_name,))
         if df.empty:
-            raise FileNotFoundError(f'workflow {workflow_name}'
-                                    'not in {db_file}')
-    query = f'''select task.task_stderr, status.task_status_name,
-                status.timestamp
-                from task join status on task.task_id=status.task_id and
-                task.run_id=status.run_id join workflow
-                on task.run_id=workflow.run_id where
-                workflow.workflow_name="{workflow_name}"
-                and task.task_stderr is not null
-                order by task.task_stderr, status.timestamp desc'''
+            raise FileNotFoundError(f'workflow {workflow_name} '
+                                    f'not in {db_file}')
+        df0 = pd.read_sql(_LATEST_STATUS_QUERY, conn, params=(workflow_name,))
 
-    with sqlite3.connect(db_file) as conn:
-        df0 = pd.read_sql(query, conn)
-
-    data = defaultdict(list)
-    task_stderrs = set()
-    for _, row in df0.iterrows():
-        if (row['task_stderr'] in task_stderrs and
-           row['task_status_name'] != "exec_done"):
-            continue
-        task_stderrs.add(row['task_stderr'])
-        job_name = os.path.basename(row['task_stderr']).split('.')[0]
-        data['job_name'].append(job_name)
-        task_type = get_task_name(job_name)
-        data['task_type'].append(task_type)
-        data['status'].append(row['task_status_name'])
-    if not data:
+    if df0.empty:
         # No tasks have been processed yet, so return an empty dataframe.
         return pd.DataFrame()
-    idx = np.array(data['status']) != "running_ended"
-    return pd.DataFrame(data=data)[idx]
+    job_names = df0['task_stderr'].str.rsplit('/', n=1).str[-1]\
+                                  .str.split('.', n=1).str[0]
+    return pd.DataFrame(data=dict(job_name=job_names,
+                                  task_type=get_task_names(job_names),
+                                  status=df0['task_status_name']))
+
+
+# Indexes for the access patterns of the queries in this module and
+# in plot_jobs_history.py:  selecting the runs of a workflow by name,
+# the tasks of each run, and the status entries of each task.
+_MONITORING_DB_INDEXES = (
+    ('gen3_workflow_workflow_name', 'workflow', ('workflow_name', 'run_id')),
+    ('gen3_workflow_task_run', 'task', ('run_id', 'task_stderr', 'task_id')),
+    ('gen3_workflow_status_task', 'status',
+     ('task_id', 'run_id', 'task_status_name', 'timestamp')))
 
 
-def print_status(df, task_types=None):
+def _has_index(conn, table, columns):
+    """Check if table has an index with the specified leading columns."""
+    for row in conn.execute(f'pragma index_list({table})'):
+        index_columns = [_[2] for _ in
+                         conn.execute(f'pragma index_info("{row[1]}")')]
+        if tuple(index_columns[:len(columns)]) == tuple(columns):
+            return True
+    return False
+
+
+def create_monitoring_db_indexes(db_file='./runinfo/monitoring.db',
+                                 timeout=60):
     """
-    Given a dataframe from `query_workflow(...)` and a list of task types,
-    print the numbers of each task types for each status value.
+    Create the indexes used by the workflow status queries in the
+    monitoring db.  This is idempotent, and indexes are not created
+    for tables that already have an equivalent index, e.g., from a
+    primary key.  Each index is created in its own transaction, so
+    this can be run while parsl is writing to the db, though parsl's
+    writes will be blocked while each index is being built.
+
+    Parameters
+    ----------
+    db_file: str ['./runinfo/monitoring.db']
+        Parsl's monitoring database file.
+    timeout: float [60]
+        Time in seconds to wait for a lock on the db.
+
+    Returns
+    -------
+    list of the names of the indexes that were created.
+    """
+    if not os.path.isfile(db_file):
+        raise FileNotFoundError(db_file)
+    created = []
+    with sqlite3.connect(db_file, timeout=timeout) as conn:
+        tables = {row[0] for row in conn.execute(
+            "select name from sqlite_master where type='table'")}
+        for name, table, columns in _MONITORING_DB_INDEXES:
+            if table not in tables or _has_index(conn, table, columns):
+                continue
+            conn.execute(f'create index if not exists {name} on '
+                         f'{table} ({", ".join(columns)})')
+            created.append(name)
+    return created
+
+
+def _profile_status_query(workflow_name, db_file):
+    """Return the query plan and timing of `query_workflow`."""
+    with sqlite3.connect(db_file) as conn:
+        plan = [row[-1] for row in conn.execute(
+            f'explain query plan {_LATEST_STATUS_QUERY}', (workflow_name,))]
+    t0 = time.time()
+    query_workflow(workflow_name, db_file=db_file)
+    return dict(query_time=time.time() - t0, query_plan=plan)
+
+
+def optimize_monitoring_db(workflow_name, db_file='./runinfo/monitoring.db',
+                           timeout=60, verbose=True):
+    """
+    Create the indexes for the workflow status queries in the
+    monitoring db, and report the query plans and timings of
+    `query_workflow` before and after.
+
+    Parameters
+    ----------
+    workflow_name: str
+        Workflow name, i.e., the outputRun collection, to use for the
+        query timings.
+    db_file: str ['./runinfo/monitoring.db']
+        Parsl's monitoring database file.
+    timeout: float [60]
+        Time in seconds to wait for a lock on the db.
+    verbose: bool [True]
+        Flag to print the report.
+
+    Returns
+    -------
+    dict with the created indexes and the before and after query plans
+    and timings.
     """
+    report = dict(before=_profile_status_query(workflow_name, db_file))
+    report['created_indexes'] = create_monitoring_db_indexes(
+        db_file, timeout=timeout)
+    report['after'] = _profile_status_query(workflow_name, db_file)
+    if verbose:
+        for stage in ('before', 'after'):
+            print(f'{stage}: query_workflow time '
+                  f'{report[stage]["query_time"]:.2f} s')
+            for line in report[stage]['query_plan']:
+                print('   ', line)
+        print('created indexes:',
+              ', '.join(report['created_indexes']) or 'none')
+    return report
+
+
+class WorkflowStatusQuery:
+    """
+    Incremental query of the status of the workflow tasks from the
+    monitoring.db file.  The rowid of the last status entry read for
+    each run_id of the workflow is kept as a watermark, so that each
+    update only fetches the newer status entries and merges them into
+    a cached table of the latest status of each task.  The full status
+    table is only scanned on the first update or after the cache has
+    been invalidated.
+    """
+    def __init__(self, workflow_name, db_file='./runinfo/monitoring.db'):
+        """
+        Parameters
+        ----------
+        workflow_name: str
+            The workflow name, i.e., the outputRun collection.
+        db_file: str ['./runinfo/monitoring.db']
+            Parsl's monitoring database file.
+        """
+        self.workflow_name = workflow_name
+        self.db_file = db_file
+        self.version = 0
+        self.invalidate()
+
+    def invalidate(self):
+        """Clear the cached status info so that the next update is a
+        full re-scan."""
+        self.watermarks = {}
+        # Latest status info keyed by task_stderr.  The values are
+        # [job_name, task_type, status, timestamp, exec_done].
+        self.latest = {}
+        self.version += 1
+        self._db_id = None
+        self._df = None
+        self._df_version = None
+
+    def update(self):
+        """
+        Read the status entries that were added since the last update.
+
+        Returns
+        -------
+        bool: True if the cached status info changed.
+        """
+        if not os.path.isfile(self.db_file):
+            raise FileNotFoundError(self.db_file)
+        stat = os.stat(self.db_file)
+        if self._db_id != (stat.st_dev, stat.st_ino):
+            # The db file has been replaced.
+            if self._db_id is not None:
+                self.invalidate()
+            self._db_id = (stat.st_dev, stat.st_ino)
+        with sqlite3.connect(self.db_file) as conn:
+            run_ids = [row[0] for row in conn.execute(
+                'select run_id from workflow where workflow_name=?',
+                (self.workflow_name,))]
+            if not run_ids:
+                raise FileNotFoundError(f'workflow {self.workflow_name} '
+                                        f'not in {self.db_file}')
+            max_rowid = conn.execute(
+                'select max(rowid) from status').fetchone()[0] or 0
+            if any(_ > max_rowid for _ in self.watermarks.values()):
+                # Rows have been removed from the status table.
+                self.invalidate()
+                self._db_id = (stat.st_dev, stat.st_ino)
+            changed = False
+            for run_id in run_ids:
+                changed |= self._update_run(conn, run_id)
+        if changed:
+            self.version += 1
+        return changed
+
+    def _update_run(self, conn, run_id):
+        """Merge the new status entries for the specified run_id."""
+        watermark = self.watermarks.get(run_id, 0)
+        query = '''select status.rowid, task.task_id, task.task_stderr,
+                   status.task_status_name, status.timestamp
+                   from status left join task on
+                   task.task_id=status.task_id and task.run_id=status.run_id
+                   where status.rowid > ? and status.run_id=?
+                   order by status.rowid'''
+        changed = False
+        unresolved = None
+        for rowid, task_id, task_stderr, status, timestamp \
+                in conn.execute(query, (watermark, run_id)):
+            watermark = rowid
+            if task_id is None:
+                # The task entry hasn't been written yet, so re-read
+                # this status entry on the next update.
+                if unresolved is None:
+                    unresolved = rowid - 1
+                continue
+            if task_stderr is None:
+                continue
+            entry = self.latest.get(task_stderr)
+            if entry is None:
+                job_name = os.path.basename(task_stderr).split('.')[0]
+                entry = [job_name, get_task_name(job_name), status,
+                         timestamp, False]
+                self.latest[task_stderr] = entry
+            elif timestamp >= entry[3]:
+                entry[2:4] = status, timestamp
+            if status == 'exec_done':
+                entry[4] = True
+            changed = True
+        self.watermarks[run_id] = watermark if unresolved is None \
+            else unresolved
+        return changed
+
+    def frame(self):
+        """
+        Return a dataframe with the job_name, task_type, and status
+        of each task in the cache, preferring exec_done over the
+        latest status, and omitting tasks with status running_ended,
+        as in `query_workflow`.
+        """
+        if self._df is not None and self._df_version == self.version:
+            return self._df
+        data = defaultdict(list)
+        for task_stderr in sorted(self.latest):
+            job_name, task_type, status, _, exec_done \
+                = self.latest[task_stderr]
+            if exec_done:
+                status = 'exec_done'
+            if status == 'running_ended':
+                continue
+            data['job_name'].append(job_name)
+            data['task_type'].append(task_type)
+            data['status'].append(status)
+        self._df = pd.DataFrame(data=data) if data else pd.DataFrame()
+        self._df_version = self.version
+        return self._df
+
+
+def status_summary(df, task_types=None, statuses=None):
+    """
+    Compute the number of tasks of each task type for each status
+    value in a single grouped pass over a dataframe from
+    `query_workflow(...)`.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Dataframe with task_type and status columns.
+    task_types: list [None]
+        Task types to include as rows.  If None, then the sorted task
+        types in df are used.
+    statuses: list [None]
+        Status values to include as columns.  If None, then the sorted
+        status values in df are used.
+
+    Returns
+    -------
+    pandas.DataFrame with the counts for each task type and status
+    value, plus a 'total' column with the number of tasks of each task
+    type over all status values.
+    """
+    if df.empty:
+        counts = pd.DataFrame(dtype=int)
+    else:
+        counts = df.groupby(['task_type', 'status']).size().unstack(
+            fill_value=0)
     if task_types is None:
-        task_types = sorted(list(set(df['task_type'])))
+        task_types = sorted(counts.index)
+    if statuses is None:
+        statuses = sorted(counts.columns)
+    total = counts.sum(axis=1)
+    summary = counts.reindex(index=task_types, columns=statuses,
+                             fill_value=0)
+    summary['total'] = total.reindex(task_types, fill_value=0)
+    return summary.astype(int)
+
+
+def print_status(df, task_types=None, summary=None):
+    """
+    Given a dataframe from `query_workflow(...)` and a list of task types,
+    print the numbers of each task types for each status value.  The
+    counts are taken from `summary`, if it is provided, instead of
+    being computed from `df`.
+    """
+#    statuses = ('pending launched running running_ended exec_done '
+#                'failed dep_fail'.split())
+    statuses = 'pending launched running exec_done failed dep_fail'.split()
+    if summary is None:
+        summary = status_summary(df, task_types=task_types)
+    elif task_types is not None:
+        summary = summary.reindex(index=task_types, fill_value=0)
+    task_types = summary.index
     wtt = 8
     for task_type in task_types:
         if len(task_type) > wtt:
             wtt = len(task_type)
-#    statuses = ('pending launched running running_ended exec_done '
-#                'failed dep_fail'.split())
-    statuses = 'pending launched running exec_done failed dep_fail'.split()
     spacer = ' '
     print(f'{"task_type":{wtt}}', end=spacer)
     for status in statuses:
         print(f'{status:>10}', end=spacer)
     print(f'{"total":>10}')
-    for task_type in task_types:
+    counts = summary.reindex(columns=statuses + ['total'], fill_value=0)
+    for task_type, row in zip(task_types, counts.to_numpy()):
         print(f'{task_type:{wtt}}', end=spacer)
-        df1 = df.query(f'task_type == "{task_type}"')
-        for status in statuses:
-            df2 = df1.query(f'status == "{status}"')
-            print(f'{len(df2):10d}', end=spacer)
-        print(f'{len(df1):10d}')
+        for count in row[:-1]:
+            print(f'{count:10d}', end=spacer)
+        print(f'{row[-1]:10d}')
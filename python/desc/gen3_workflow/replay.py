@@ -0,0 +1,279 @@
+"""
+Module to replay a workflow run recorded in a parsl monitoring db
+under a different parsl_config, by simulating its execution with the
+observed runtimes of its jobs and either their requested or their
+observed peak memory.
+"""
+import os
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+from .query_workflow import get_task_names
+from .simulator import ClusterShape, WorkflowSimulator, workflow_arrays
+
+
+__all__ = ['monitoring_task_history', 'observed_job_resources',
+           'requested_job_resources', 'parsl_config_cluster',
+           'replay_workflow']
+
+
+# Start and end times, in julian days, of the running state of each
+# try of each task in the workflow.
+_TRY_QUERY = '''select task.task_stderr, task.task_func_name,
+    durations.task_id, durations.run_id, durations.try_id,
+    durations.time_began, durations.time_ended, workflow.time_began as
+    run_began from
+    (select task_id, run_id, try_id,
+     min(case when task_status_name='running'
+         then julianday(timestamp) end) as time_began,
+     max(case when task_status_name='running_ended'
+         then julianday(timestamp) end) as time_ended
+     from status group by task_id, run_id, try_id) as durations
+    join task on task.task_id=durations.task_id and
+    task.run_id=durations.run_id
+    join workflow on task.run_id=workflow.run_id
+    where workflow.workflow_name=?
+    and task.task_stderr is not null
+    and durations.time_began is not null
+    and durations.time_ended is not null
+    and task.task_func_name not like '%\\_no\\_op' escape '\\'
+    '''
+
+_PEAK_RSS_QUERY = '''select task_id, run_id, try_id,
+    max(psutil_process_memory_resident) as peak_rss
+    from resource group by task_id, run_id, try_id'''
+
+
+def monitoring_task_history(workflow_name, db_file='./runinfo/monitoring.db'):
+    """
+    Extract the observed runtime and peak resident memory of each job
+    of a workflow from the task, status, and resource tables of a
+    parsl monitoring db.  For jobs that were run more than once, e.g.,
+    in restarted runs or retries, the latest completed try is used.
+
+    Parameters
+    ----------
+    workflow_name: str
+        Name of the workflow in the workflow table.
+    db_file: str ['./runinfo/monitoring.db']
+        Parsl's monitoring database file.
+
+    Returns
+    -------
+    pandas.DataFrame with columns job_name, task_type, start and end
+    (julian days), runtime (hours), and peak_rss (GB, or NaN if the
+    resource table doesn't have an entry).
+    """
+    if not os.path.isfile(db_file):
+        raise FileNotFoundError(db_file)
+    with sqlite3.connect(db_file) as conn:
+        df = pd.read_sql(_TRY_QUERY, conn, params=(workflow_name,))
+        tables = {row[0] for row in conn.execute(
+            "select name from sqlite_master where type='table'")}
+        if 'resource' in tables:
+            rss = pd.read_sql(_PEAK_RSS_QUERY, conn)
+        else:
+            rss = pd.DataFrame(columns=['task_id', 'run_id', 'try_id',
+                                        'peak_rss'])
+    columns = ['job_name', 'task_type', 'start', 'end', 'runtime', 'peak_rss']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    df = df.merge(rss.astype({'peak_rss': float}),
+                  on=['task_id', 'run_id', 'try_id'], how='left')
+    df = df.sort_values(['run_began', 'try_id', 'time_began'])\
+           .drop_duplicates('task_stderr', keep='last')
+    df['job_name'] = df['task_stderr'].str.rsplit('/', n=1).str[-1]\
+                                      .str.split('.', n=1).str[0]
+    df['task_type'] = get_task_names(df['job_name'])
+    df['start'] = df['time_began']
+    df['end'] = df['time_ended']
+    df['runtime'] = 24.*(df['end'] - df['start'])
+    df['peak_rss'] = df['peak_rss']/1024.**3
+    return df[columns].reset_index(drop=True)
+
+
+def observed_job_resources(graph, history):
+    """
+    Attach the observed runtimes and peak memory to the jobs of a
+    graph.  Jobs without observations are given the median values of
+    the observed jobs with the same task label, or, if there are none,
+    of all of the observed jobs.
+
+    Parameters
+    ----------
+    graph: ParslGraph or lsst.ctrl.bps.GenericWorkflow
+        The workflow.
+    history: pandas.DataFrame
+        Observations from `monitoring_task_history`.
+
+    Returns
+    -------
+    pandas.DataFrame with columns job_name, label, runtime (hours),
+    peak_rss (GB), and observed, indexed by job ID.
+    """
+    dag, labels = workflow_arrays(graph)
+    jobs = pd.DataFrame(data=dict(job_name=dag.names, label=labels))
+    jobs = jobs.merge(history.drop_duplicates('job_name', keep='last')
+                      [['job_name', 'runtime', 'peak_rss']],
+                      on='job_name', how='left')
+    jobs['observed'] = ~jobs['runtime'].isna()
+    for column in ('runtime', 'peak_rss'):
+        jobs[column] = jobs[column].fillna(
+            jobs.groupby('label')[column].transform('median'))
+        median = jobs[column].median()
+        jobs[column] = jobs[column].fillna(0 if np.isnan(median) else median)
+    return jobs
+
+
+def requested_job_resources(graph):
+    """
+    Return the memory and cores requested for each job of a graph by
+    its ResourceSpecs, i.e., the requests that Work Queue and the
+    routing table use to place the jobs.
+
+    Parameters
+    ----------
+    graph: ParslGraph
+        The workflow.
+
+    Returns
+    -------
+    pandas.DataFrame with columns memory (GB) and cores, indexed by
+    job ID.
+    """
+    specs = [graph.resource_specs(graph.job_from_id(job_id))
+             for job_id in range(len(graph.dag))]
+    return pd.DataFrame(data=dict(memory=[_['memory']/1024. for _ in specs],
+                                  cores=[_['cores'] for _ in specs]))
+
+
+def _walltime_hours(walltime):
+    """Convert a '[[HH:]MM:]SS' walltime string to hours."""
+    seconds = 0
+    for value in str(walltime).split(':'):
+        seconds = 60*seconds + float(value)
+    return seconds/3600.
+
+
+def parsl_config_cluster(parsl_config, cores_per_node=None,
+                         memory_per_node=None, tiers=None,
+                         block_queue_time=0):
+    """
+    Describe the compute resources of a parsl_config block from a bps
+    config as a ClusterShape.
+
+    Parameters
+    ----------
+    parsl_config: dict
+        The parsl_config entries.  For the WorkQueue executor, the
+        number of nodes is nodes_per_block times max_blocks (default 1),
+        and the block walltime is the walltime entry for the Slurm and
+        PBSPro providers.
+    cores_per_node: int [None]
+        Cores per node, if not set by a `--cores` worker option.
+    memory_per_node: float [None]
+        Memory per node in GB, if not set by a `--memory` worker option.
+        If None, memory is not constrained.
+    tiers: dict [None]
+        Executor tiers, as for ClusterShape, e.g., to model the
+        executors of a parsl config module.
+    block_queue_time: float [0]
+        Time in hours between the end of a block and the start of the
+        next one.
+
+    Returns
+    -------
+    ClusterShape
+    """
+    config = dict(parsl_config)
+    executor = config.get('executor')
+    if executor == 'ThreadPool' and tiers is None:
+        return ClusterShape(nodes=1,
+                            cores_per_node=config.get('max_threads', 1),
+                            memory_per_node=memory_per_node)
+    if executor not in ('WorkQueue', None) and tiers is None:
+        raise ValueError(f'Unsupported executor in parsl_config: {executor}')
+    worker_options = config.get('worker_options', '') or ''
+    match = re.search(r'--cores[= ](\d+)', worker_options)
+    if match is not None:
+        cores_per_node = int(match.group(1))
+    match = re.search(r'--memory[= ](\d+)', worker_options)
+    if match is not None:
+        memory_per_node = int(match.group(1))/1024.
+    if cores_per_node is None:
+        raise ValueError('cores_per_node must be given if the parsl_config '
+                         'does not set the worker cores.')
+    walltime = None
+    if config.get('provider') in ('Slurm', 'PBSPro'):
+        walltime = _walltime_hours(config.get('walltime', '10:00:00'))
+    return ClusterShape(nodes=(config.get('nodes_per_block', 1)
+                               *config.get('max_blocks', 1)),
+                        cores_per_node=cores_per_node,
+                        memory_per_node=memory_per_node, tiers=tiers,
+                        block_walltime=walltime,
+                        block_queue_time=block_queue_time)
+
+
+def replay_workflow(graph, parsl_config, history=None, workflow_name=None,
+                    db_file=None, policy=None, memory_source='requested',
+                    memory_margin=1, **cluster_options):
+    """
+    Simulate the execution of a recorded workflow run under a
+    different parsl_config.
+
+    Parameters
+    ----------
+    graph: ParslGraph
+        The workflow.
+    parsl_config: dict
+        The parsl_config entries to simulate.
+    history: pandas.DataFrame [None]
+        Observations from `monitoring_task_history`.  If None, these are
+        read from the graph's monitoring db.
+    workflow_name: str [None]
+        Name of the workflow in the monitoring db.  If None, the
+        outputRun of the graph's bps config is used.
+    db_file: str [None]
+        Parsl's monitoring database file.  If None, the graph's
+        monitoring db is used.
+    policy: str [None]
+        Submission policy.  If None, the submission_priority in
+        parsl_config is used.
+    memory_source: str ['requested']
+        Memory used to place each job.  With 'requested', the memory
+        requested by the graph's ResourceSpecs is used, as by Work
+        Queue and the routing table.  With 'observed', the observed
+        peak memory times `memory_margin` is used, e.g., to see the
+        effect of better memory requests.
+    memory_margin: float [1]
+        Factor by which to multiply the observed peak memory to obtain
+        the memory needed by each job if `memory_source` is 'observed'.
+    cluster_options: dict
+        Options passed to `parsl_config_cluster`.
+
+    Returns
+    -------
+    SimulationResult
+    """
+    if memory_source not in ('requested', 'observed'):
+        raise ValueError(f'Unknown memory_source: {memory_source}')
+    if history is None:
+        if workflow_name is None:
+            workflow_name = graph.config['outputRun']
+        history = monitoring_task_history(
+            workflow_name, db_file=db_file or graph.monitoring_db)
+    jobs = observed_job_resources(graph, history)
+    print(f'Using observed runtimes for {jobs["observed"].sum()} of '
+          f'{len(jobs)} jobs', flush=True)
+    if policy is None:
+        policy = dict(parsl_config).get('submission_priority', 'none')
+    cluster = parsl_config_cluster(parsl_config, **cluster_options)
+    requests = requested_job_resources(graph)
+    if memory_source == 'requested':
+        memory = requests['memory'].to_numpy()
+    else:
+        memory = memory_margin*jobs['peak_rss'].to_numpy()
+    sim = WorkflowSimulator(graph, jobs['runtime'].to_numpy(), memory=memory,
+                            cores=requests['cores'].to_numpy())
+    return sim.run(cluster, policy=policy)
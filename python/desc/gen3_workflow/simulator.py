@@ -0,0 +1,558 @@
+"""
+Discrete-event simulation of the execution of a workflow on a cluster
+of a given shape, for estimating the makespan, utilization, and
+critical path under different allocation sizes, executor tiers, and
+submission policies without running any jobs.
+"""
+import heapq
+from bisect import bisect_left, bisect_right, insort
+import numpy as np
+import pandas as pd
+from .compact_dag import CompactDag
+from .priorities import SUBMISSION_POLICIES
+
+
+__all__ = ['ClusterShape', 'WorkflowSimulator', 'SimulationResult',
+           'workflow_arrays']
+
+
+_FINISH, _BLOCK_END, _BLOCK_START = 0, 1, 2
+
+
+def workflow_arrays(graph):
+    """
+    Return the CompactDag and the list of task labels, indexed by job
+    ID, for a ParslGraph or a GenericWorkflow.
+    """
+    if hasattr(graph, 'job_label'):
+        return graph.dag, [graph.job_label(_) for _ in range(len(graph.dag))]
+    dag = CompactDag.from_generic_workflow(graph)
+    return dag, [graph.get_job(_).label for _ in dag.names]
+
+
+def _job_values(labels, values, default):
+    """
+    Return a per-job array of values given a dict of values keyed by
+    task label or a per-job array-like.  Labels missing from the dict
+    get the default value, or the median of the dict values if the
+    default is None.
+    """
+    if values is None:
+        return np.full(len(labels), default, dtype=float)
+    if not isinstance(values, dict):
+        values = np.asarray(values, dtype=float)
+        if len(values) != len(labels):
+            raise ValueError('Per-job values must have one entry per job.')
+        return values
+    if default is None:
+        default = float(np.median(list(values.values()))) if values else 0
+    return np.array([values.get(_, default) for _ in labels], dtype=float)
+
+
+class ClusterShape:
+    """
+    Description of the compute resources available to a workflow.
+    The nodes are allocated in blocks of a fixed walltime; jobs still
+    running at the end of a block are killed and rerun in the next
+    block, which starts after a queue wait time.  If executor tiers
+    are given, each tier has its own nodes with fixed-size workers,
+    and each job runs on the tier with the smallest workers that fit
+    it, as with the RoutingTable.  Otherwise, jobs are packed onto the
+    nodes according to their own core and memory needs, as with a
+    WorkQueueExecutor.
+    """
+    def __init__(self, nodes=1, cores_per_node=64, memory_per_node=128,
+                 tiers=None, block_walltime=None, block_queue_time=0):
+        """
+        Parameters
+        ----------
+        nodes: int [1]
+            Number of nodes if there are no executor tiers.
+        cores_per_node: int [64]
+            Number of cores per node.
+        memory_per_node: float [128]
+            Memory per node in GB.  If None, the memory is not
+            constrained.
+        tiers: dict [None]
+            Executor tiers keyed by label.  Each value is a dict with
+            `nodes`, `mem_per_worker` (GB), and, optionally,
+            `cores_per_worker` (default 1) entries.
+        block_walltime: float [None]
+            Walltime of each block of nodes in hours.  If None, the
+            nodes are available until the workflow finishes.
+        block_queue_time: float [0]
+            Time in hours between the end of a block and the start of
+            the next one.
+        """
+        self.nodes = nodes
+        self.cores_per_node = cores_per_node
+        self.memory_per_node = memory_per_node
+        self.tiers = tiers
+        self.block_walltime = block_walltime
+        self.block_queue_time = block_queue_time
+
+    @property
+    def total_nodes(self):
+        if self.tiers is None:
+            return self.nodes
+        return sum(_['nodes'] for _ in self.tiers.values())
+
+    def __repr__(self):
+        tiers = '' if self.tiers is None else f', tiers={self.tiers}'
+        return (f'ClusterShape(nodes={self.total_nodes}, '
+                f'cores_per_node={self.cores_per_node}, '
+                f'memory_per_node={self.memory_per_node}{tiers}, '
+                f'block_walltime={self.block_walltime})')
+
+
+# Entry of an empty _MinTree leaf.
+_EMPTY = (np.inf,)
+
+
+class _MinTree:
+    """Segment tree giving the smallest entry over a prefix of its
+    leaves."""
+    def __init__(self, num_leaves):
+        self.size = 1 << max(num_leaves - 1, 0).bit_length()
+        self.tree = [_EMPTY]*(2*self.size)
+
+    def update(self, leaf, entry):
+        i = leaf + self.size
+        self.tree[i] = entry
+        i //= 2
+        while i > 0:
+            self.tree[i] = min(self.tree[2*i], self.tree[2*i + 1])
+            i //= 2
+
+    def prefix_min(self, num_leaves):
+        """Return the smallest entry of the first num_leaves leaves."""
+        result = _EMPTY
+        lo, hi = self.size, self.size + num_leaves
+        while lo < hi:
+            if lo & 1:
+                result = min(result, self.tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = min(result, self.tree[hi])
+            lo //= 2
+            hi //= 2
+        return result
+
+
+class _Pool:
+    """
+    Nodes of one executor tier and the jobs that are ready to run on
+    them, bucketed by their (cores, memory) needs.  For each number of
+    cores, the buckets are the leaves of a _MinTree ordered by memory,
+    holding the highest priority job of each bucket, so that the
+    highest priority job that fits on a node with a given amount of
+    free memory is found in O(log(number of buckets)) time.
+    """
+    def __init__(self, nodes, cores, memory, demands):
+        """
+        Parameters
+        ----------
+        nodes: int
+            Number of nodes.
+        cores: int
+            Number of cores per node.
+        memory: int
+            Memory per node in MB.
+        demands: iterable
+            The (cores, memory) demands of the jobs that run on the
+            nodes.
+        """
+        self.free_cores = [cores]*nodes
+        self.free_memory = [memory]*nodes
+        # Sorted (free memory, node) pairs for nodes with free cores.
+        self.available = sorted((memory, _) for _ in range(nodes))
+        self.buckets = {}
+        groups = {}
+        for job_cores, job_memory in sorted(set(demands)):
+            groups.setdefault(job_cores, []).append(job_memory)
+        self.groups = [(job_cores, job_memory, _MinTree(len(job_memory)))
+                       for job_cores, job_memory in groups.items()]
+        self.leaves = {(job_cores, job_memory): (tree, leaf)
+                       for job_cores, memories, tree in self.groups
+                       for leaf, job_memory in enumerate(memories)}
+
+    def find_node(self, cores, memory):
+        i = bisect_left(self.available, (memory, -1))
+        for free_memory, node in self.available[i:]:
+            if self.free_cores[node] >= cores:
+                return node
+        return None
+
+    def max_free_memory(self, cores):
+        """Largest free memory of the nodes with at least the given
+        number of free cores, or None if there are no such nodes."""
+        for free_memory, node in reversed(self.available):
+            if self.free_cores[node] >= cores:
+                return free_memory
+        return None
+
+    def _update(self, node, cores, memory):
+        if self.free_cores[node] > 0:
+            del self.available[bisect_left(
+                self.available, (self.free_memory[node], node))]
+        self.free_cores[node] += cores
+        self.free_memory[node] += memory
+        if self.free_cores[node] > 0:
+            insort(self.available, (self.free_memory[node], node))
+
+    def allocate(self, node, cores, memory):
+        self._update(node, -cores, -memory)
+
+    def release(self, node, cores, memory):
+        self._update(node, cores, memory)
+
+    def _update_leaf(self, demand):
+        tree, leaf = self.leaves[demand]
+        heap = self.buckets[demand]
+        tree.update(leaf, heap[0] + (demand,) if heap else _EMPTY)
+
+    def push(self, demand, item):
+        heap = self.buckets.setdefault(demand, [])
+        heapq.heappush(heap, item)
+        if heap[0] is item:
+            self._update_leaf(demand)
+
+    def fill(self):
+        """Pop the ready jobs that fit on the free nodes, highest
+        priority first, and return the list of (job, node) pairs."""
+        placed = []
+        while True:
+            # Highest priority job over the buckets whose demands fit
+            # on some node.
+            best = _EMPTY
+            for cores, memories, tree in self.groups:
+                free_memory = self.max_free_memory(cores)
+                if free_memory is not None:
+                    best = min(best, tree.prefix_min(
+                        bisect_right(memories, free_memory)))
+            if best == _EMPTY:
+                return placed
+            demand = best[-1]
+            node = self.find_node(*demand)
+            job_id = heapq.heappop(self.buckets[demand])[-1]
+            self._update_leaf(demand)
+            self.allocate(node, *demand)
+            placed.append((job_id, node))
+
+
+class SimulationResult:
+    """
+    Results of a workflow simulation.  Times are in hours from the
+    start of the first block.  The intervals include the attempts that
+    were killed at the end of a block, which are counted in
+    wasted_core_hours rather than in busy_core_hours and utilization.
+    """
+    def __init__(self, simulator, cluster, policy, start, end, intervals,
+                 online_hours, wasted_core_hours):
+        self.simulator = simulator
+        self.cluster = cluster
+        self.policy = policy
+        self.start = start
+        self.end = end
+        self.intervals = intervals
+        self.makespan = float(end.max()) if len(end) > 0 else 0.
+        self.online_hours = online_hours
+        self.node_hours = cluster.total_nodes*online_hours
+        self.wasted_core_hours = float(wasted_core_hours)
+        # Core-hours of the completed attempts.
+        self.busy_core_hours = float(
+            np.sum((intervals[:, 1] - intervals[:, 0])*intervals[:, 2])
+            - wasted_core_hours)
+        total_cores = cluster.total_nodes*cluster.cores_per_node
+        self.utilization = (self.busy_core_hours/(total_cores*online_hours)
+                            if online_hours > 0 else 0.)
+
+    def core_usage(self):
+        """
+        Return the number of cores in use as a step function of time.
+
+        Returns
+        -------
+        (numpy.ndarray of times, numpy.ndarray of cores in use from
+        each time until the next one)
+        """
+        times = np.concatenate((self.intervals[:, 0], self.intervals[:, 1]))
+        changes = np.concatenate((self.intervals[:, 2], -self.intervals[:, 2]))
+        order = np.argsort(times, kind='stable')
+        times, cores = times[order], np.cumsum(changes[order])
+        # Keep the last value at each time.
+        last = np.append(times[1:] != times[:-1], True)
+        return times[last], cores[last]
+
+    def concurrent_jobs(self, dt=10/3600.):
+        """
+        Return the number of concurrently running jobs for each task
+        label, sampled at intervals of dt hours, in the same format as
+        the data frames written by plot_jobs_history.py.
+
+        Returns
+        -------
+        pandas.DataFrame with a column for each task label and a `time`
+        column with the bin centers in minutes.
+        """
+        bin_edges = np.arange(0, self.makespan + dt, dt)
+        labels = np.array(self.simulator.labels)
+        data = {}
+        for label in sorted(set(self.simulator.labels),
+                            key=lambda _: self.start[labels == _].mean()):
+            index = labels == label
+            # Count the jobs with start <= t < end at each bin edge.
+            data[label] = (np.searchsorted(np.sort(self.start[index]),
+                                           bin_edges[:-1], side='right')
+                           - np.searchsorted(np.sort(self.end[index]),
+                                             bin_edges[:-1], side='right'))
+        edges = 60*bin_edges
+        data['time'] = (edges[:-1] + edges[1:])/2.
+        return pd.DataFrame(data=data)
+
+    def _path_to(self, job_id):
+        path = [job_id]
+        while True:
+            prereqs = self.simulator.dag.predecessors(job_id)
+            if len(prereqs) == 0:
+                return path[::-1]
+            job_id = int(prereqs[np.argmax(self.end[prereqs])])
+            path.append(job_id)
+
+    def critical_path(self):
+        """
+        Return the names of the jobs on the critical path of the
+        simulated schedule, i.e., the chain of jobs leading to the last
+        one to finish, following the prerequisite that finished last.
+        If several jobs finish last, the longest chain is returned.
+        """
+        dag = self.simulator.dag
+        if len(dag) == 0:
+            return []
+        last = np.flatnonzero(self.end == self.makespan).tolist()
+        path = max((self._path_to(_) for _ in last), key=len)
+        return [dag.names[_] for _ in path]
+
+    def summary(self):
+        """Return a dict of the summary statistics."""
+        return dict(makespan=self.makespan,
+                    lower_bound=self.simulator.lower_bound,
+                    node_hours=self.node_hours,
+                    busy_core_hours=self.busy_core_hours,
+                    wasted_core_hours=self.wasted_core_hours,
+                    utilization=self.utilization,
+                    critical_path_jobs=len(self.critical_path()))
+
+
+class WorkflowSimulator:
+    """
+    Discrete-event simulator for the execution of a workflow.  The
+    per-job arrays are computed once, so that each call to `run` only
+    needs to replay the scheduling for a given cluster shape and
+    submission policy.
+    """
+    def __init__(self, graph, runtimes, memory=None, cores=None,
+                 default_runtime=None, default_memory=None):
+        """
+        Parameters
+        ----------
+        graph: ParslGraph or lsst.ctrl.bps.GenericWorkflow
+            The workflow to simulate.
+        runtimes: dict or array-like
+            Job runtimes in hours, either keyed by task label or per
+            job ID.
+        memory: dict or array-like [None]
+            Job memory needs in GB, either keyed by task label or per
+            job ID.  If None, the memory is not constrained.
+        cores: dict or array-like [None]
+            Numbers of cores per job.  If None, one core per job is
+            used.
+        default_runtime: float [None]
+            Runtime for task labels missing from a runtimes dict.  If
+            None, the median runtime is used.
+        default_memory: float [None]
+            Memory for task labels missing from a memory dict.  If
+            None, the median memory is used.
+        """
+        self.dag, self.labels = workflow_arrays(graph)
+        self.runtimes = _job_values(self.labels, runtimes, default_runtime)
+        self.memory = _job_values(self.labels, memory,
+                                  0 if memory is None else default_memory)
+        self.cores = np.maximum(
+            _job_values(self.labels, cores, 1), 1).astype(np.int64)
+        self.in_degrees = self.dag.in_degrees()
+        self._bottom_levels = None
+
+    @property
+    def bottom_levels(self):
+        if self._bottom_levels is None:
+            self._bottom_levels = self.dag.bottom_levels(self.runtimes)
+        return self._bottom_levels
+
+    @property
+    def lower_bound(self):
+        """Length of the longest runtime-weighted path through the DAG,
+        i.e., the makespan with unlimited resources."""
+        return float(self.bottom_levels.max()) if len(self.dag) > 0 else 0.
+
+    def _pools(self, cluster):
+        """
+        Return the pools of nodes and the pool index and the (cores,
+        memory in MB) demand of each job.
+        """
+        if cluster.memory_per_node is None:
+            node_memory = 0
+            memory = np.zeros(len(self.dag), dtype=np.int64)
+        else:
+            node_memory = int(1024*cluster.memory_per_node)
+            memory = np.ceil(1024*self.memory).astype(np.int64)
+        if cluster.tiers is None:
+            pool_nodes = [cluster.nodes]
+            pool_index = np.zeros(len(self.dag), dtype=np.int64)
+            demand_cores, demand_memory = self.cores, memory
+        else:
+            tiers = sorted(cluster.tiers.values(),
+                           key=lambda _: (_['mem_per_worker'],
+                                          _.get('cores_per_worker', 1)))
+            pool_nodes = [_['nodes'] for _ in tiers]
+            tier_memory = np.array([int(1024*_['mem_per_worker'])
+                                    if node_memory > 0 else 0
+                                    for _ in tiers])
+            tier_cores = np.array([_.get('cores_per_worker', 1)
+                                   for _ in tiers], dtype=np.int64)
+            # Tightest tier that fits each job, or the largest tier.
+            fits = ((memory[:, None] <= tier_memory[None, :])
+                    & (self.cores[:, None] <= tier_cores[None, :]))
+            pool_index = np.where(fits.any(axis=1), fits.argmax(axis=1),
+                                  len(tiers) - 1)
+            demand_cores = tier_cores[pool_index]
+            demand_memory = tier_memory[pool_index]
+        too_big = ((demand_cores > cluster.cores_per_node)
+                   | (demand_memory > node_memory))
+        if too_big.any():
+            labels = sorted({self.labels[_] for _ in np.flatnonzero(too_big)})
+            raise ValueError(f'Jobs for {labels} do not fit on a node.')
+        pools = []
+        for i, nodes in enumerate(pool_nodes):
+            index = pool_index == i
+            pools.append(_Pool(nodes, cluster.cores_per_node, node_memory,
+                               zip(demand_cores[index].tolist(),
+                                   demand_memory[index].tolist())))
+        return pools, pool_index, demand_cores, demand_memory
+
+    def run(self, cluster, policy='none'):
+        """
+        Simulate the execution of the workflow.
+
+        Parameters
+        ----------
+        cluster: ClusterShape
+            The compute resources.
+        policy: str ['none']
+            Submission policy, one of SUBMISSION_POLICIES.  For 'none',
+            ready jobs are started in the order in which they became
+            ready; for 'critical_path', the ready jobs with the largest
+            bottom levels are started first.
+
+        Returns
+        -------
+        SimulationResult
+        """
+        if policy not in SUBMISSION_POLICIES:
+            raise ValueError(f'Invalid policy: {policy}. '
+                             f'Valid values: {SUBMISSION_POLICIES}')
+        walltime = cluster.block_walltime
+        if walltime is not None and np.any(self.runtimes > walltime):
+            raise ValueError('Some jobs are longer than the block walltime.')
+        num_jobs = len(self.dag)
+        pools, pool_index, demand_cores, demand_memory = self._pools(cluster)
+        pool_index = pool_index.tolist()
+        demands = list(zip(demand_cores.tolist(), demand_memory.tolist()))
+        priorities = (-self.bottom_levels if policy == 'critical_path'
+                      else np.zeros(num_jobs)).tolist()
+        runtimes = self.runtimes.tolist()
+        cores = self.cores.tolist()
+        in_degree = self.in_degrees.copy()
+        start = np.zeros(num_jobs)
+        end = np.zeros(num_jobs)
+        attempts = [0]*num_jobs
+        running = {}
+        intervals = []
+        events = []
+        counter = [0]
+
+        def push_event(time, kind, job_id=-1, attempt=0):
+            counter[0] += 1
+            # Order simultaneous events by kind, so that jobs finishing
+            # at the end of a block aren't killed.
+            heapq.heappush(events, (time, kind, counter[0], job_id, attempt))
+
+        def make_ready(job_id):
+            counter[0] += 1
+            pools[pool_index[job_id]].push(
+                demands[job_id], (priorities[job_id], counter[0], job_id))
+
+        def fill(time, pool_ids):
+            for i in pool_ids:
+                for job_id, node in pools[i].fill():
+                    start[job_id] = time
+                    running[job_id] = node
+                    push_event(time + runtimes[job_id], _FINISH, job_id,
+                               attempts[job_id])
+
+        for job_id in np.flatnonzero(in_degree == 0).tolist():
+            make_ready(job_id)
+        online = True
+        block_start = 0.
+        online_hours = 0.
+        wasted_core_hours = 0.
+        num_done = 0
+        fill(0., range(len(pools)))
+        if walltime is not None:
+            push_event(walltime, _BLOCK_END)
+
+        while num_done < num_jobs:
+            if not events:
+                raise RuntimeError('Simulation stalled with unfinished jobs.')
+            time, kind, _, job_id, attempt = heapq.heappop(events)
+            if kind == _FINISH:
+                if attempt != attempts[job_id] or job_id not in running:
+                    continue
+                node = running.pop(job_id)
+                end[job_id] = time
+                intervals.append((start[job_id], time, cores[job_id]))
+                pools[pool_index[job_id]].release(node, *demands[job_id])
+                num_done += 1
+                affected = {pool_index[job_id]}
+                for succ in self.dag.successors(job_id).tolist():
+                    in_degree[succ] -= 1
+                    if in_degree[succ] == 0:
+                        make_ready(succ)
+                        affected.add(pool_index[succ])
+                if online:
+                    fill(time, affected)
+            elif kind == _BLOCK_END:
+                # Kill the running jobs and requeue them.
+                for job_id, node in running.items():
+                    intervals.append((start[job_id], time, cores[job_id]))
+                    wasted_core_hours += (time - start[job_id])*cores[job_id]
+                    pools[pool_index[job_id]].release(node, *demands[job_id])
+                    attempts[job_id] += 1
+                    make_ready(job_id)
+                running.clear()
+                online = False
+                online_hours += time - block_start
+                push_event(time + cluster.block_queue_time, _BLOCK_START)
+            else:
+                online = True
+                block_start = time
+                fill(time, range(len(pools)))
+                push_event(time + walltime, _BLOCK_END)
+        if online:
+            online_hours += float(end.max()) - block_start if num_jobs else 0.
+
+        intervals = (np.array(intervals, dtype=float) if intervals
+                     else np.zeros((0, 3)))
+        return SimulationResult(self, cluster, policy, start, end, intervals,
+                                online_hours, wasted_core_hours)
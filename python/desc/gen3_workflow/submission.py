@@ -0,0 +1,368 @@
+"""
+Module to submit the jobs in a ParslGraph to parsl in topological
+order without recursing through the job prerequisites.
+"""
+import time
+import heapq
+import queue
+import threading
+import functools
+from collections import defaultdict, deque
+from concurrent.futures import Future
+import numpy as np
+
+
+__all__ = ['JobSubmitter', 'StreamingSubmission']
+
+
+def _completed_future(exception=None):
+    """Return a concurrent.futures.Future that is already resolved."""
+    future = Future()
+    if exception is None:
+        future.set_result(0)
+    else:
+        future.set_exception(exception)
+    return future
+
+
+# Shared stand-ins for the futures of finished jobs in a streaming
+# submission, so that the parsl futures, and their task records, for
+# those jobs can be released.
+_SUCCEEDED_FUTURE = _completed_future()
+
+_FAILED_FUTURE = _completed_future(
+    RuntimeError('prerequisite job did not succeed'))
+
+
+class ReadyQueue:
+    """
+    Queue of the IDs of jobs that are ready to be submitted.  Jobs are
+    returned in first-in, first-out order, or, if priorities are
+    given, highest priority first, with ties broken by job ID.
+    """
+    def __init__(self, priorities=None):
+        """
+        Parameters
+        ----------
+        priorities: numpy.ndarray [None]
+            Priorities indexed by job ID.
+        """
+        self.priorities = priorities
+        self.items = deque() if priorities is None else []
+
+    def __len__(self):
+        return len(self.items)
+
+    def push(self, job_id):
+        if self.priorities is None:
+            self.items.append(job_id)
+        else:
+            heapq.heappush(self.items, (-self.priorities[job_id], job_id))
+
+    def pop(self):
+        if self.priorities is None:
+            return self.items.popleft()
+        return heapq.heappop(self.items)[1]
+
+
+class JobSubmitter:
+    """
+    Class to submit jobs from a ParslGraph in topological order.  The
+    traversal uses the integer job IDs and the CSR adjacency arrays of
+    the graph's CompactDag, so that each submission only needs to walk
+    the part of the DAG that hasn't been submitted yet.
+    """
+    def __init__(self, graph, priorities=None):
+        """
+        Parameters
+        ----------
+        graph: ParslGraph
+            The graph containing the jobs to submit.
+        priorities: numpy.ndarray [None]
+            Submission priorities indexed by job ID.  If given, then
+            among the jobs that are ready to be submitted, those with
+            the highest priorities are submitted first.
+        """
+        self.graph = graph
+        self.dag = graph.dag
+        self.priorities = priorities
+        self.endpoints = np.flatnonzero(self.dag.out_degrees() == 0).tolist()
+        self.stats = dict(submitted=0, no_op=0, wall_time=0)
+
+    def select(self, targets):
+        """
+        Select the jobs needed to produce the target jobs, i.e., the
+        targets and their ancestors.  The traversal stops at jobs that
+        have already been submitted or that are done.
+
+        Parameters
+        ----------
+        targets: list-like
+            Integer IDs of the target jobs.
+
+        Returns
+        -------
+        set of integer job IDs.
+        """
+        selected = set()
+        stack = list(targets)
+        while stack:
+            job_id = stack.pop()
+            if job_id in selected:
+                continue
+            job = self.graph.job_from_id(job_id)
+            if job.future is not None:
+                continue
+            selected.add(job_id)
+            if job.done:
+                # Done jobs are run as no-ops, so their prerequisites
+                # are not needed.
+                continue
+            stack.extend(self.dag.predecessors(job_id).tolist())
+        return selected
+
+    def dependency_counts(self, selected):
+        """
+        Count the selected prerequisites of each selected job.  Done
+        jobs are run as no-ops, so their prerequisites are ignored.
+
+        Parameters
+        ----------
+        selected: set
+            Integer IDs of the jobs.
+
+        Returns
+        -------
+        (dict of prerequisite counts, dict of lists of dependent job IDs),
+        both keyed by job ID.
+        """
+        in_degree = dict.fromkeys(selected, 0)
+        dependents = {job_id: [] for job_id in selected}
+        for job_id in selected:
+            if self.graph.job_from_id(job_id).done:
+                continue
+            for prereq in self.dag.predecessors(job_id).tolist():
+                if prereq in selected:
+                    in_degree[job_id] += 1
+                    dependents[prereq].append(job_id)
+        return in_degree, dependents
+
+    def topological_order(self, selected):
+        """
+        Return the selected jobs in topological order.
+
+        Parameters
+        ----------
+        selected: set
+            Integer IDs of the jobs to order.
+
+        Returns
+        -------
+        list of integer job IDs.
+        """
+        in_degree, dependents = self.dependency_counts(selected)
+        ready = ReadyQueue(self.priorities)
+        for job_id in sorted(selected):
+            if in_degree[job_id] == 0:
+                ready.push(job_id)
+        order = []
+        while ready:
+            job_id = ready.pop()
+            order.append(job_id)
+            for dependent in dependents[job_id]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    ready.push(dependent)
+        if len(order) != len(selected):
+            raise RuntimeError('Cycle found in workflow DAG.')
+        return order
+
+    def targets(self, job_names=None):
+        """Return the integer IDs of the named jobs, or of the endpoints
+        of the DAG if job_names is None."""
+        if job_names is None:
+            return self.endpoints
+        return [self.dag.index[job_name] for job_name in job_names]
+
+    def submit(self, job_names=None):
+        """
+        Submit the requested jobs and their unsubmitted prerequisites.
+
+        Parameters
+        ----------
+        job_names: list-like [None]
+            Names of the target jobs.  If None, then the jobs at the
+            endpoints of the DAG are used.
+
+        Returns
+        -------
+        list of parsl futures for the target jobs.
+        """
+        targets = self.targets(job_names)
+
+        t0 = time.time()
+        num_submitted, num_no_op = 0, 0
+        for job_id in self.topological_order(self.select(targets)):
+            job = self.graph.job_from_id(job_id)
+            if job.future is not None:
+                # A later job in a chain cluster, which was submitted
+                # with the head of its chain.
+                continue
+            if job.done:
+                num_no_op += 1
+            else:
+                num_submitted += 1
+            job.submit()
+        dt = time.time() - t0
+
+        self.stats['submitted'] += num_submitted
+        self.stats['no_op'] += num_no_op
+        self.stats['wall_time'] += dt
+        num_jobs = num_submitted + num_no_op
+        if num_jobs > 0:
+            rate = num_jobs/dt if dt > 0 else float('inf')
+            print(f'Submitted {num_submitted} jobs and {num_no_op} no-op jobs '
+                  f'in {dt:.1f} s ({rate:.1f} jobs/s)', flush=True)
+
+        return [self.graph.job_from_id(job_id).future for job_id in targets]
+
+
+class StreamingSubmission:
+    """
+    Submission of the jobs needed for a set of target jobs that keeps
+    at most a fixed number of submitted-but-unfinished parsl tasks,
+    either in total or per executor.  Jobs are submitted once all of
+    their prerequisites have finished, and more jobs are released as
+    the done-callbacks of the submitted tasks report their completion
+    to the driver loop in `run`.  The futures of finished jobs are
+    replaced with shared, resolved stand-ins, so that the memory used
+    on the submit node scales with the number of jobs in flight rather
+    than with the size of the workflow.
+    """
+    def __init__(self, submitter, max_in_flight, job_names=None):
+        """
+        Parameters
+        ----------
+        submitter: JobSubmitter
+            The submitter for the graph containing the jobs.
+        max_in_flight: int or dict
+            Maximum number of submitted-but-unfinished jobs.  If a
+            dict, then these are the maximum numbers keyed by executor
+            label, and the numbers of jobs for executors that aren't in
+            the dict are not limited.
+        job_names: list-like [None]
+            Names of the target jobs.  If None, then the jobs at the
+            endpoints of the DAG are used.
+        """
+        self.submitter = submitter
+        self.graph = submitter.graph
+        if isinstance(max_in_flight, dict):
+            self.limits = {key: int(value)
+                           for key, value in max_in_flight.items()}
+        else:
+            self.limits = {None: int(max_in_flight)}
+        selected = submitter.select(submitter.targets(job_names))
+        self.in_degree, self.dependents \
+            = submitter.dependency_counts(selected)
+        self.num_unfinished = len(selected)
+        self.ready = defaultdict(lambda: ReadyQueue(submitter.priorities))
+        for job_id in sorted(selected):
+            if self.in_degree[job_id] == 0:
+                self._make_ready(job_id)
+        self.in_flight = defaultdict(int)
+        self.job_keys = {}
+        self.chained = set()
+        self.completed = queue.SimpleQueue()
+        self.stats = dict(submitted=0, no_op=0, max_in_flight=0)
+        self.thread = None
+
+    def _limit_key(self, job):
+        """Return the key of the in-flight limit that applies to a job."""
+        if None in self.limits:
+            return None
+        if job.done:
+            # No-op jobs run on the submit node.
+            return 'submit-node'
+        return job.executor
+
+    def _make_ready(self, job_id):
+        job = self.graph.job_from_id(job_id)
+        self.ready[self._limit_key(job)].push(job_id)
+
+    def _release(self):
+        """Submit ready jobs up to the in-flight limits."""
+        for key, ready in self.ready.items():
+            limit = self.limits.get(key)
+            while ready and (limit is None or self.in_flight[key] < limit):
+                job_id = ready.pop()
+                job = self.graph.job_from_id(job_id)
+                if job.future is not None:
+                    # A later job in a chain cluster, which shares the
+                    # future of the invocation started by the head of
+                    # its chain, so it isn't submitted or counted as
+                    # in flight.
+                    self.chained.add(job_id)
+                    job.future.add_done_callback(
+                        functools.partial(self._on_done, job_id))
+                    continue
+                if job.done:
+                    self.stats['no_op'] += 1
+                else:
+                    self.stats['submitted'] += 1
+                self.in_flight[key] += 1
+                self.job_keys[job_id] = key
+                future = job.submit()
+                future.add_done_callback(
+                    functools.partial(self._on_done, job_id))
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'],
+                                          sum(self.in_flight.values()))
+
+    def _on_done(self, job_id, future):
+        """Done-callback for the submitted jobs."""
+        self.completed.put(job_id)
+
+    def _finish(self, job_id):
+        """Release the future of a finished job and update its dependents."""
+        job = self.graph.job_from_id(job_id)
+        job.future = (_SUCCEEDED_FUTURE if job.future.exception() is None
+                      else _FAILED_FUTURE)
+        if job_id in self.chained:
+            self.chained.remove(job_id)
+        else:
+            self.in_flight[self.job_keys.pop(job_id)] -= 1
+        self.num_unfinished -= 1
+        for dependent in self.dependents[job_id]:
+            self.in_degree[dependent] -= 1
+            if self.in_degree[dependent] == 0:
+                self._make_ready(dependent)
+
+    def run(self):
+        """
+        Submit all of the jobs, blocking until they have finished.
+        """
+        t0 = time.time()
+        self._release()
+        while self.num_unfinished > 0:
+            self._finish(self.completed.get())
+            # Process any other completions before releasing more jobs.
+            while True:
+                try:
+                    self._finish(self.completed.get_nowait())
+                except queue.Empty:
+                    break
+            self._release()
+        dt = time.time() - t0
+        print(f'Streamed {self.stats["submitted"]} jobs and '
+              f'{self.stats["no_op"]} no-op jobs in {dt:.1f} s with at most '
+              f'{self.stats["max_in_flight"]} jobs in flight', flush=True)
+
+    def start(self):
+        """Run the submission in a background thread."""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def wait(self):
+        """Wait for a submission started with `start` to finish."""
+        if self.thread is not None:
+            self.thread.join()
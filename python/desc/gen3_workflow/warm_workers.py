@@ -0,0 +1,226 @@
+"""
+Module to run pipetask commands in warm parsl workers, i.e., in child
+processes forked from a long-lived worker process that has already
+imported the LSST stack, so that each job avoids the cost of starting
+a new interpreter and importing `lsst.ctrl.mpexec`.
+"""
+import os
+import sys
+import shlex
+import importlib
+import traceback
+import subprocess
+import parsl
+from parsl.executors import ThreadPoolExecutor, WorkQueueExecutor
+
+
+__all__ = ['get_warm_app', 'pipetask_args', 'run_forked',
+           'run_pipetask_command', 'check_warm_executors',
+           'EXECUTION_MODES']
+
+
+EXECUTION_MODES = ('bash', 'warm')
+
+
+# Modules imported once by each worker process before any jobs are
+# forked from it.
+WARM_MODULES = ('lsst.daf.butler', 'lsst.pipe.base',
+                'lsst.ctrl.mpexec.cli.pipetask')
+
+# Command prefixes that can be dropped when the pipetask command is
+# run in-process.
+_IGNORED_PREFIXES = ('time',)
+
+_WARM_MODULES_IMPORTED = False
+
+
+def warm_up(modules=WARM_MODULES):
+    """
+    Import the specified modules if they haven't been already.  This
+    is called by the first job run in each worker process, so that job
+    still pays the full import cost, and the later jobs in that worker
+    don't.
+    """
+    global _WARM_MODULES_IMPORTED
+    if not _WARM_MODULES_IMPORTED:
+        for module in modules:
+            importlib.import_module(module)
+        _WARM_MODULES_IMPORTED = True
+
+
+def check_warm_executors(executors, labels):
+    """
+    Check that the executors with the specified labels run their apps
+    in persistent worker processes, i.e., HighThroughputExecutors, or
+    WorkQueueExecutors in coprocess mode.  Warm workers fork the
+    pipetask runs from the process running the app, and forking the
+    multithreaded submit process, as a ThreadPoolExecutor would do, can
+    leave locks held by other threads, e.g., in logging, sqlite3, or
+    parsl itself, locked forever in the child process.  Without
+    coprocess mode, Work Queue runs each app in a new interpreter, so
+    the stack would be imported for every job.
+
+    Parameters
+    ----------
+    executors: dict
+        parsl executors keyed by label, e.g., `dfk.executors`.
+    labels: list-like
+        Labels of the executors to which jobs are routed.
+
+    Raises
+    ------
+    ValueError if any of the executors doesn't keep persistent worker
+    processes.
+    """
+    unsupported = sorted(
+        label for label in labels
+        if isinstance(executors[label], ThreadPoolExecutor)
+        or (isinstance(executors[label], WorkQueueExecutor)
+            and not getattr(executors[label], 'coprocess', False)))
+    if unsupported:
+        raise ValueError("execution_mode 'warm' requires executors with "
+                         "persistent worker processes, i.e., "
+                         "HighThroughputExecutors or WorkQueueExecutors "
+                         "with coprocess=True, but these executors are "
+                         f"not: {unsupported}")
+
+
+def pipetask_args(command_line):
+    """
+    Return the list of arguments following `pipetask` in a command
+    line, or None if the command line does anything else, e.g., runs
+    the pipetask via a wrapper script, so that it must be run in bash.
+    """
+    try:
+        tokens = shlex.split(os.path.expandvars(command_line))
+    except ValueError:
+        return None
+    for i, token in enumerate(tokens):
+        if os.path.basename(token) == 'pipetask':
+            if all(_ in _IGNORED_PREFIXES for _ in tokens[:i]):
+                return tokens[i+1:]
+            return None
+    return None
+
+
+def run_forked(func, args, log_file):
+    """
+    Run func(*args) in a forked child process with its stdout and
+    stderr appended to a log file, and return the exit code of the
+    child process.  The child exits with code 1 if func raises an
+    exception.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                         0o644)
+            os.dup2(fd, 1)
+            os.dup2(fd, 2)
+            os.close(fd)
+            # The parent's sys.stdout and sys.stderr may not write to
+            # fds 1 and 2, e.g., if the output is being captured.
+            sys.stdout = open(1, 'w', closefd=False)
+            sys.stderr = open(2, 'w', closefd=False)
+            try:
+                func(*args)
+                exit_code = 0
+            except SystemExit as eobj:
+                if eobj.code is None or isinstance(eobj.code, int):
+                    exit_code = eobj.code or 0
+            except BaseException:
+                traceback.print_exc()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+    _, wait_status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(wait_status)
+
+
+def _run_pipetask(args):
+    """Run the pipetask command-line interface in-process."""
+    from lsst.ctrl.mpexec.cli.pipetask import cli
+    cli.main(args=args, prog_name='pipetask', standalone_mode=False)
+
+
+def run_pipetask_command(command_line, stderr, log_files=()):
+    """
+    Run a pipetask command line in a child process forked from the
+    current process, and write the outcome, 'success' or 'failure', to
+    the stderr file and to any additional log files, following the
+    convention for the command lines run by the bash_apps.  Command
+    lines that can't be run in-process are run in bash.
+
+    Parameters
+    ----------
+    command_line: str
+        The evaluated pipetask command line.
+    stderr: str
+        Log file for the output of the pipetask command.
+    log_files: list-like [()]
+        Log files of other jobs run by the same pipetask command.
+
+    Raises
+    ------
+    RuntimeError if the pipetask command fails.
+    """
+    args = pipetask_args(command_line)
+    if args is None:
+        with open(stderr, 'a') as output:
+            exit_code = subprocess.run(command_line, shell=True,
+                                       executable='/bin/bash', stdout=output,
+                                       stderr=output).returncode
+    else:
+        warm_up()
+        exit_code = run_forked(_run_pipetask, (args,), stderr)
+    outcome = 'success' if exit_code == 0 else 'failure'
+    for log_file in (stderr,) + tuple(log_files):
+        with open(log_file, 'a') as output:
+            print(outcome, file=output)
+    if exit_code != 0:
+        raise RuntimeError(f'pipetask command failed with exit code '
+                           f'{exit_code}: {command_line}')
+    return exit_code
+
+
+# Cache of python_apps, keyed by (task label, executor label,
+# resource_spec).
+_WARM_APPS = {}
+
+
+def get_warm_app(task_label, executor, resource_spec=False):
+    """
+    Return a parsl.python_app that runs a pipetask command line in a
+    warm worker on the specified executor.  As with `get_bash_app`,
+    the apps are created once per task label and executor, and the
+    task label is used as the app name.
+
+    Parameters
+    ----------
+    task_label: str
+        Label of the pipetask.
+    executor: str
+        Label of the parsl executor.
+    resource_spec: bool [False]
+        Flag to have the app accept a `parsl_resource_specification`
+        keyword argument, as used by the WorkQueueExecutor.
+    """
+    key = (task_label, executor, resource_spec)
+    if key not in _WARM_APPS:
+        if resource_spec:
+            def run_command(command_line, inputs=(), stderr=None,
+                            log_files=(), parsl_resource_specification=None):
+                return run_pipetask_command(command_line, stderr, log_files)
+        else:
+            def run_command(command_line, inputs=(), stderr=None,
+                            log_files=()):
+                return run_pipetask_command(command_line, stderr, log_files)
+        run_command.__name__ = task_label
+        _WARM_APPS[key] = parsl.python_app(run_command, executors=[executor],
+                                           cache=True,
+                                           ignore_for_cache=['stderr'])
+    return _WARM_APPS[key]
@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+from desc.gen3_workflow import CompactDag, ChainClusters
+
+
+class _Graph:
+    """Minimal stand-in for a ParslGraph."""
+    def __init__(self, names, src, dst):
+        self.dag = CompactDag(names, src, dst)
+
+    def job_label(self, job_id):
+        return self.dag.names[job_id].split('_')[1]
+
+
+class ChainClustersTestCase(unittest.TestCase):
+    """TestCase class for the ChainClusters class."""
+    def setUp(self):
+        # Two detector chains, one of which has a calibrate job with an
+        # extra prerequisite, feeding a per-visit summary job.
+        names = ['j0_isr_1_1', 'j1_characterizeImage_1_1',
+                 'j2_calibrate_1_1', 'j3_isr_1_2',
+                 'j4_characterizeImage_1_2', 'j5_calibrate_1_2',
+                 'j6_consolidateVisitSummary_1', 'j7_isr_1_3']
+        src = [0, 1, 3, 4, 7, 2, 5]
+        dst = [1, 2, 4, 5, 5, 6, 6]
+        self.graph = _Graph(names, src, dst)
+        self.rules = {'sfp': ['isr', 'characterizeImage', 'calibrate']}
+
+    def test_chains(self):
+        clusters = ChainClusters(self.graph, self.rules)
+        self.assertEqual(clusters.chains, [(0, 1, 2), (3, 4)])
+        self.assertEqual(clusters.chain(1), (0, 1, 2))
+        self.assertIsNone(clusters.chain(5))
+        self.assertIsNone(clusters.chain(7))
+
+    def test_propagate_status(self):
+        clusters = ChainClusters(self.graph, self.rules)
+        status_index = np.zeros(len(self.graph.dag), dtype=np.int8)
+        status_index[[1, 3]] = [2, 3]
+        clusters.propagate_status(status_index, {1, 3})
+        np.testing.assert_array_equal(status_index,
+                                      [0, 2, 2, 3, 3, 0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from types import SimpleNamespace
+from parsl.executors import HighThroughputExecutor, ThreadPoolExecutor
+from desc.gen3_workflow import RoutingTable
+
+
+class RoutingTableTestCase(unittest.TestCase):
+    """TestCase class for the RoutingTable class."""
+    def test_default_htex_cores(self):
+        # Tiers as created by HtxFactory.create, with the default
+        # cores_per_worker.
+        executors = {'submit-node': ThreadPoolExecutor(label='submit-node')}
+        for label, mem_per_worker in (('batch-small', 4),
+                                      ('batch-medium', 16),
+                                      ('batch-large', 64)):
+            executors[label] = HighThroughputExecutor(
+                label=label, mem_per_worker=mem_per_worker)
+        routing_table = RoutingTable(executors)
+        self.assertEqual(routing_table.route(dict(memory=2048, cores=4)),
+                         'batch-small')
+        self.assertEqual(routing_table.route(dict(memory=8192, cores=8)),
+                         'batch-medium')
+
+    def test_explicit_cores(self):
+        executors = {'small': HighThroughputExecutor(
+                         label='small', mem_per_worker=4, cores_per_worker=2),
+                     'small_mc': SimpleNamespace(mem_per_worker=4,
+                                                 cores_per_worker=4),
+                     'batch-large': HighThroughputExecutor(
+                         label='batch-large', mem_per_worker=64)}
+        routing_table = RoutingTable(executors)
+        self.assertEqual(routing_table.route(dict(memory=2048, cores=1)),
+                         'small')
+        self.assertEqual(routing_table.route(dict(memory=2048, cores=4)),
+                         'small_mc')
+        self.assertEqual(routing_table.route(dict(memory=2048, cores=8)),
+                         'batch-large')
+
+
+if __name__ == '__main__':
+    unittest.main()
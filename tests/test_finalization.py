@@ -0,0 +1,65 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from desc.gen3_workflow import ShardedFinalizer, QgraphShards
+
+
+class _Job:
+    """Minimal stand-in for a ParslJob."""
+    def __init__(self, done):
+        self.future = None
+        self.done = done
+
+
+class _Graph(dict):
+    """Minimal stand-in for a ParslGraph."""
+    def __init__(self, submit_path, shards, done_jobs):
+        super().__init__({job_name: _Job(job_name in done_jobs)
+                          for job_name in shards.jobs})
+        self.config = dict(submitPath=submit_path, butlerConfig='repo')
+        self.qgraph_shards = shards
+
+
+class ShardedFinalizerTestCase(unittest.TestCase):
+    """TestCase class for the ShardedFinalizer class."""
+    def setUp(self):
+        self.submit_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.submit_path, 'logging'))
+        self.transfers = os.path.join(self.submit_path, 'transfers.txt')
+        with open(os.path.join(self.submit_path, 'final_job.bash'), 'w') as fd:
+            fd.write(f'echo $1 >> {self.transfers}\n')
+        shards = {f'isr_0000{i}': dict(file=f'isr_0000{i}.qgraph',
+                                       graph_id=f'id{i}', num_jobs=2)
+                  for i in range(3)}
+        jobs = {f'job{i}': f'isr_0000{i//2}' for i in range(6)}
+        self.shards = QgraphShards(self.submit_path,
+                                   dict(qgraph_file='full.qgraph',
+                                        shards=shards, jobs=jobs))
+
+    def tearDown(self):
+        shutil.rmtree(self.submit_path)
+
+    def test_incremental_transfers(self):
+        graph = _Graph(self.submit_path, self.shards, {'job0', 'job1', 'job2'})
+        finalizer = ShardedFinalizer(graph, num_workers=2)
+        self.assertEqual(finalizer.ready_shards(), ['isr_00000'])
+        self.assertEqual(finalizer.transfer_ready(), [])
+
+        # A restarted finalizer only transfers the remaining shards.
+        finalizer = ShardedFinalizer(graph, num_workers=2)
+        self.assertEqual(finalizer.pending_shards(),
+                         ['isr_00001', 'isr_00002'])
+        finalizer.finalize()
+        with open(self.transfers) as fd:
+            self.assertEqual(sorted(fd.read().split()),
+                             ['isr_00000.qgraph', 'isr_00001.qgraph',
+                              'isr_00002.qgraph'])
+        with open(finalizer.record_file) as fd:
+            self.assertEqual(json.load(fd)['graph_ids'],
+                             ['id0', 'id1', 'id2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+from desc.gen3_workflow import CommandTemplate, CommandLineCompiler, \
+    fix_env_var_syntax, insert_file_paths
+
+
+class SnapshotFile:
+    def __init__(self, name, src_uri):
+        self.name = name
+        self.src_uri = src_uri
+
+
+class InputsSource:
+    def __init__(self, inputs):
+        self.inputs = inputs
+
+    def get_job_inputs(self, job_name):
+        return self.inputs
+
+
+def render(command, cmdvals, file_paths):
+    """Uncompiled command line evaluation."""
+    command = command.format(**cmdvals)
+    command = fix_env_var_syntax(command)
+    return insert_file_paths(command, file_paths)
+
+
+class CommandTemplateTestCase(unittest.TestCase):
+    """TestCase class for the CommandTemplate class."""
+    def test_render(self):
+        command = ('<ENV:CTRL_MPEXEC_DIR>/bin/pipetask run -b {butlerConfig} '
+                   '-i {inCollection} --output-run {outputRun} '
+                   '--qgraph <FILE:runQgraphFile> '
+                   '--qgraph-id {qgraphId} --qgraph-node-id {qgraphNodeId} '
+                   '--extend-run --clobber-outputs '
+                   '--prefix=<ENV:HOME>/{outputRun} {extra} {{literal}} '
+                   '{number:03d}')
+        file_paths = {'runQgraphFile': '/path/to/my.qgraph',
+                      'other': '/path/to/other'}
+        cmdvals = dict(butlerConfig='/repo/butler.yaml',
+                       inCollection='LSSTCam-imSim/defaults',
+                       outputRun='u/desc/run', qgraphId='1234_5678',
+                       qgraphNodeId='abcd,efgh', extra='', number=7)
+        template = CommandTemplate(command)
+        self.assertEqual(template.render(cmdvals, file_paths),
+                         render(command, cmdvals, file_paths))
+        # Substituted values with whitespace, env vars, and file
+        # placeholders.
+        for extra in ('  -j  4 ', '<ENV:USER>', '<FILE:other>'):
+            cmdvals['extra'] = extra
+            self.assertEqual(template.render(cmdvals, file_paths),
+                             render(command, cmdvals, file_paths))
+        with self.assertRaises(KeyError):
+            template.render(cmdvals, {})
+
+    def test_compiler(self):
+        os.environ['GEN3_WORKFLOW_TEST_DIR'] = '/test/dir'
+        compiler = CommandLineCompiler()
+        source = InputsSource(
+            [SnapshotFile('qgraph', '<ENV:GEN3_WORKFLOW_TEST_DIR>/a.qgraph')])
+        file_paths = compiler.input_file_paths(source, 'job')
+        self.assertEqual(file_paths, {'qgraph': '/test/dir/a.qgraph'})
+        command = 'pipetask run -g <FILE:qgraph> --qgraph-id {qgraphId}'
+        self.assertEqual(compiler.render(command, dict(qgraphId='1'),
+                                         file_paths),
+                         'pipetask run -g /test/dir/a.qgraph --qgraph-id 1')
+        self.assertIs(compiler.template(command), compiler.template(command))
+
+
+if __name__ == '__main__':
+    unittest.main()
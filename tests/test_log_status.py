@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from desc.gen3_workflow import LogStatusScanner, read_log_outcome, \
+    LOG_SUCCESS, LOG_FAILURE, LOG_RUNNING
+
+class LogStatusTestCase(unittest.TestCase):
+    """TestCase class for the log_status module."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.tmp_dir, 'logging')
+        os.makedirs(self.log_dir)
+        self.cache_file = os.path.join(self.tmp_dir, 'log_status_cache.json')
+
+    def tearDown(self):
+        if os.path.isdir(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+
+    def _write_log(self, job_name, contents):
+        log_file = os.path.join(self.log_dir, f'{job_name}.stderr')
+        with open(log_file, 'w') as fd:
+            fd.write(contents)
+        return log_file
+
+    def test_read_log_outcome(self):
+        padding = 'x'*80 + '\n'
+        log_file = self._write_log('job1', padding*100 + 'success\n')
+        self.assertEqual(read_log_outcome(log_file), LOG_SUCCESS)
+        log_file = self._write_log('job2', padding*100 + 'failure\n')
+        self.assertEqual(read_log_outcome(log_file), LOG_FAILURE)
+        log_file = self._write_log('job3', padding)
+        self.assertEqual(read_log_outcome(log_file), LOG_RUNNING)
+        log_file = self._write_log('job4', '')
+        self.assertEqual(read_log_outcome(log_file), LOG_RUNNING)
+        # The last line is longer than the tail that is read.
+        log_file = self._write_log('job5', 'success' + 'x'*1000)
+        self.assertEqual(read_log_outcome(log_file, tail_bytes=100),
+                         LOG_RUNNING)
+
+    def test_scanner(self):
+        self._write_log('job1', 'running\nsuccess\n')
+        self._write_log('job2', 'running\n')
+        scanner = LogStatusScanner(self.log_dir, cache_file=self.cache_file)
+        self.assertEqual(scanner.scan(), dict(job1=LOG_SUCCESS,
+                                              job2=LOG_RUNNING))
+        self.assertTrue(os.path.isfile(self.cache_file))
+
+        # Update one of the logs and check that a new scanner using
+        # the cache file sees the change.
+        self._write_log('job2', 'running\nfailure\n')
+        scanner = LogStatusScanner(self.log_dir, cache_file=self.cache_file)
+        self.assertEqual(scanner.scan(), dict(job1=LOG_SUCCESS,
+                                              job2=LOG_FAILURE))
+
+
+if __name__ == '__main__':
+    unittest.main()
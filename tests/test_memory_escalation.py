@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from desc.gen3_workflow import MemoryEscalation, is_memory_failure
+from desc.gen3_workflow.config import load_parsl_config
+from desc.gen3_workflow.parsl_service import ResourceSpecs
+
+
+def make_job(name, label, request_memory):
+    """Minimal stand-in for a ParslJob."""
+    return SimpleNamespace(name=name, gwf_job=SimpleNamespace(
+        label=label, request_memory=request_memory, request_cpus=1,
+        request_disk=0))
+
+
+class MemoryEscalationTestCase(unittest.TestCase):
+    """TestCase class for the MemoryEscalation retry handler."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.record_file = os.path.join(self.tmp_dir, 'memory_records.json')
+        self.monitoring_db = os.path.join(self.tmp_dir, 'monitoring.db')
+        self.log_file = os.path.join(self.tmp_dir, 'job.stderr')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_is_memory_failure(self):
+        task_record = dict(kwargs=dict(stderr=self.log_file))
+        self.assertFalse(is_memory_failure(RuntimeError(), task_record))
+        with open(self.log_file, 'w') as fd:
+            fd.write('Traceback...\nMemoryError\nfailure\n')
+        self.assertTrue(is_memory_failure(RuntimeError(), task_record))
+        self.assertTrue(is_memory_failure(
+            RuntimeError('pipetask command failed with exit code -9: ...'),
+            dict(kwargs={})))
+
+    def task_record(self, task_id, job_name, executor, memory=None):
+        spec = {} if memory is None else dict(memory=memory)
+        stderr = os.path.join(self.tmp_dir, f'{job_name}.stderr')
+        return dict(id=task_id, try_id=0, func_name=job_name.split('_')[1],
+                    executor=executor, resource_specification=spec,
+                    kwargs=dict(stderr=stderr))
+
+    def test_escalation(self):
+        handler = MemoryEscalation(self.record_file,
+                                   monitoring_db=self.monitoring_db)
+        handler._executor_memory = {'batch-small': 16384,
+                                    'batch-medium': 32768,
+                                    'batch-large': 98304}
+        task_record = self.task_record(0, '1234_deblend_5', 'batch-small')
+        error = RuntimeError('pipetask command failed with exit code -9')
+        for executor in ('batch-medium', 'batch-large', 'batch-large'):
+            self.assertEqual(handler(error, task_record), 1)
+            self.assertEqual(task_record['executor'], executor)
+
+        task_record = self.task_record(1, '5678_measure_5', 'work_queue',
+                                       memory=60000)
+        handler(error, task_record)
+        self.assertEqual(task_record['resource_specification']['memory'],
+                         98304)
+        # Without monitoring info, the requests that the jobs exceeded
+        # are recorded instead of their peak RSS values.
+        with open(self.record_file) as fd:
+            self.assertEqual(json.load(fd),
+                             dict(job_requests={'1234_deblend_5': 65536,
+                                                '5678_measure_5': 98304},
+                                  peak_rss={},
+                                  exceeded_requests=dict(deblend=32768,
+                                                         measure=60000)))
+
+    def test_observed_peak_rss(self):
+        with sqlite3.connect(self.monitoring_db) as conn:
+            conn.execute('create table resource (task_id integer, '
+                         'try_id integer, run_id text, '
+                         'psutil_process_memory_resident real)')
+            conn.executemany('insert into resource values (?, ?, ?, ?)',
+                             [(0, 0, 'run0', 20*1024**3),
+                              (0, 0, 'run0', 24*1024**3),
+                              (0, 0, 'run1', 40*1024**3)])
+        handler = MemoryEscalation(self.record_file,
+                                   monitoring_db=self.monitoring_db)
+        handler._executor_memory = {'work_queue': 98304}
+        task_record = self.task_record(0, '1234_measure_5', 'work_queue',
+                                       memory=32768)
+        error = RuntimeError('pipetask command failed with exit code -9')
+        with mock.patch('parsl.dfk',
+                        return_value=SimpleNamespace(run_id='run0')):
+            handler(error, task_record)
+        self.assertEqual(handler.records.job_requests,
+                         {'1234_measure_5': 65536})
+        self.assertEqual(handler.records.peak_rss, dict(measure=24576))
+        self.assertEqual(handler.records.exceeded_requests, {})
+
+    def test_resource_specs_floors(self):
+        config = dict(parsl_config=dict(resource_model_margin=1.5),
+                      submitPath=self.tmp_dir)
+        specs = ResourceSpecs(config)
+        specs.memory_records.refresh_interval = 0
+        specs.pipetask_funcs = dict(
+            measure=SimpleNamespace(maxRSS=lambda num_visits: 4))
+        specs.resource_funcs['memory'] = specs.model_memory
+        handler = MemoryEscalation(self.record_file,
+                                   monitoring_db=self.monitoring_db)
+        handler._executor_memory = {'work_queue': 98304}
+        error = RuntimeError('pipetask command failed with exit code -9')
+        for task_id, job_name in enumerate(('1234_measure_5',
+                                            '1234_deblend_5')):
+            handler(error, self.task_record(task_id, job_name, 'work_queue',
+                                            memory=8192))
+        # The escalated requests apply to the jobs that ran out of
+        # memory.
+        self.assertEqual(specs(make_job('1234_measure_5', 'measure',
+                                        2048))['memory'], 16384)
+        self.assertEqual(specs(make_job('1234_deblend_5', 'deblend',
+                                        2048))['memory'], 16384)
+        # The peak RSS of deblend applies to the other deblend jobs,
+        # but not to the measure jobs, whose memory is modeled.
+        self.assertEqual(specs(make_job('1234_measure_6', 'measure',
+                                        2048))['memory'], 6144)
+        self.assertEqual(specs(make_job('1234_deblend_6', 'deblend',
+                                        2048))['memory'], 12288)
+        # The records aren't shared with the ResourceSpecs of another
+        # workflow.
+        config['submitPath'] = os.path.join(self.tmp_dir, 'other')
+        specs = ResourceSpecs(config)
+        self.assertEqual(specs(make_job('1234_deblend_5', 'deblend',
+                                        2048))['memory'], 2048)
+
+    def test_executor_move(self):
+        executors = {'batch-small': SimpleNamespace(mem_per_worker=2),
+                     'batch-medium': SimpleNamespace(mem_per_worker=4),
+                     'batch-large': SimpleNamespace(mem_per_worker=8),
+                     'submit-node': SimpleNamespace()}
+        handler = MemoryEscalation(self.record_file,
+                                   monitoring_db=self.monitoring_db)
+        task_record = self.task_record(0, '1234_deblend_5', 'batch-small')
+        error = RuntimeError('pipetask command failed with exit code 137')
+        with mock.patch('parsl.dfk',
+                        return_value=SimpleNamespace(executors=executors)):
+            for executor in ('batch-medium', 'batch-large', 'batch-large'):
+                self.assertEqual(handler(error, task_record), 1)
+                self.assertEqual(task_record['executor'], executor)
+        self.assertEqual(handler.records.job_requests,
+                         {'1234_deblend_5': 8192})
+
+    def test_config_module_handler(self):
+        with open(os.path.join(self.tmp_dir, 'fake_parsl_config.py'),
+                  'w') as fd:
+            fd.write('from types import SimpleNamespace\n'
+                     'DFK = SimpleNamespace(config=SimpleNamespace('
+                     'retries=1, retry_handler=None))\n')
+        sys.path.insert(0, self.tmp_dir)
+        try:
+            # Memory escalation is off by default.
+            bps_config = dict(parslConfig='fake_parsl_config',
+                              parsl_config={}, submitPath=self.tmp_dir)
+            dfk = load_parsl_config(bps_config)
+            self.assertIsNone(dfk.config.retry_handler)
+            sys.modules.pop('fake_parsl_config', None)
+            bps_config['parsl_config'] = dict(oom_memory_factor=2)
+            dfk = load_parsl_config(bps_config)
+        finally:
+            sys.path.remove(self.tmp_dir)
+            sys.modules.pop('fake_parsl_config', None)
+        handler = dfk.config.retry_handler
+        self.assertIsInstance(handler, MemoryEscalation)
+        self.assertEqual(handler.record_file, self.record_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from lsst.ctrl.bps import BpsConfig, GenericWorkflow, GenericWorkflowJob, \
+    GenericWorkflowExec
+from desc.gen3_workflow import ParslGraph, ParslService, PHASE_TIMING_FILE
+
+
+def make_job(name, label, executable, arguments, cmdvals):
+    """Make a GenericWorkflowJob with the given command line."""
+    job = GenericWorkflowJob(name, label=label)
+    job.executable = GenericWorkflowExec(os.path.basename(executable),
+                                         executable, False)
+    job.arguments = arguments
+    job.cmdvals = cmdvals
+    return job
+
+
+class ParslGraphInitTestCase(unittest.TestCase):
+    """TestCase class for constructing a ParslGraph with pipetaskInit."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = BpsConfig(
+            dict(parsl_config=dict(retries=1), cluster=dict(),
+                 submitPath=self.tmp_dir, butlerConfig='/repo/butler.yaml',
+                 outputRun='u/desc/test_run'))
+        cmdvals = dict(butlerConfig='/repo/butler.yaml',
+                       outputRun='u/desc/test_run')
+        self.gwf = GenericWorkflow('test_run')
+        self.gwf.add_job(make_job('pipetaskInit', 'pipetaskInit',
+                                  '/bin/pipetask',
+                                  'init -b {butlerConfig} '
+                                  '--output-run {outputRun}', cmdvals))
+        self.gwf.add_job(make_job('1234_isr_94', 'isr', '/bin/pipetask',
+                                  'run -b {butlerConfig}', cmdvals))
+
+    def tearDown(self):
+        if os.path.isdir(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+
+    def test_pipetask_init(self):
+        """Test that pipetaskInit runs for a new output run."""
+        butler = mock.MagicMock()
+        butler.registry.queryCollections.return_value = []
+        with mock.patch('desc.gen3_workflow.parsl_service.Butler',
+                        return_value=butler), \
+             mock.patch('subprocess.check_call') as check_call:
+            graph = ParslGraph(self.gwf, self.config, do_init=True,
+                               monitoring_db=os.path.join(self.tmp_dir,
+                                                          'monitoring.db'))
+        check_call.assert_called_once_with(
+            '/bin/pipetask init -b /repo/butler.yaml '
+            '--output-run u/desc/test_run', shell=True)
+        self.assertEqual(list(graph), ['1234_isr_94'])
+        self.assertIsNone(graph.qgraph_shards)
+
+        # pipetaskInit is skipped if the output run exists.
+        butler.registry.queryCollections.return_value = ['u/desc/test_run']
+        with mock.patch('desc.gen3_workflow.parsl_service.Butler',
+                        return_value=butler), \
+             mock.patch('subprocess.check_call') as check_call:
+            ParslGraph(self.gwf, self.config, do_init=True,
+                       monitoring_db=os.path.join(self.tmp_dir,
+                                                  'monitoring.db'))
+        check_call.assert_not_called()
+
+
+class ParslServiceSubmitTestCase(unittest.TestCase):
+    """TestCase class for the phase timing of ParslService.submit."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_submit_phases(self):
+        """Test that bps submit writes a single phase timing report."""
+        config = BpsConfig(dict(parsl_config=dict(phase_timing=True),
+                                submitPath=self.tmp_dir))
+        workflow = mock.MagicMock()
+        workflow.parsl_graph.config = config
+        with mock.patch('desc.gen3_workflow.parsl_service.load_parsl_config'):
+            ParslService(config).submit(workflow)
+        workflow.parsl_graph._wait_for_jobs.assert_called_once_with(
+            workflow.parsl_graph._start_jobs.return_value, block=True)
+        with open(os.path.join(self.tmp_dir, PHASE_TIMING_FILE)) as fd:
+            reports = json.load(fd)
+        self.assertEqual(len(reports), 1)
+        self.assertEqual([_['name'] for _ in reports[0]['phases']],
+                         ['ParslService.submit', 'load_parsl_config'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import json
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from desc.gen3_workflow import PhaseTimer, PHASE_TIMING_FILE
+
+
+class PhaseTimerTestCase(unittest.TestCase):
+    """TestCase class for the phase timing instrumentation."""
+    def setUp(self):
+        self.env_value = os.environ.pop('GEN3_WORKFLOW_PHASE_TIMING', None)
+        self.submit_path = tempfile.mkdtemp()
+        self.outfile = os.path.join(self.submit_path, PHASE_TIMING_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.submit_path)
+        if self.env_value is not None:
+            os.environ['GEN3_WORKFLOW_PHASE_TIMING'] = self.env_value
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def run_phases(self, timer):
+        with timer.phase('prepare'):
+            with timer.phase('_ingest'):
+                data = [0]*100000
+            with timer.phase('save_config'):
+                pass
+        del data
+
+    def test_disabled(self):
+        timer = PhaseTimer()
+        timer.configure(dict(submitPath=self.submit_path, parsl_config={}))
+        self.run_phases(timer)
+        self.assertFalse(os.path.isfile(self.outfile))
+
+    def test_report(self):
+        timer = PhaseTimer()
+        config = dict(submitPath=self.submit_path,
+                      parsl_config=dict(phase_timing='memory'))
+        timer.configure(config)
+        for _ in range(2):
+            self.run_phases(timer)
+        with open(self.outfile) as fd:
+            reports = json.load(fd)
+        self.assertEqual(len(reports), 2)
+        phases = reports[-1]['phases']
+        self.assertEqual([(_['name'], _['depth']) for _ in phases],
+                         [('prepare', 0), ('_ingest', 1), ('save_config', 1)])
+        # The peak traced memory of the outer phase includes that of
+        # the nested phases.
+        self.assertGreater(phases[1]['traced_peak_MB'], 0.5)
+        self.assertGreaterEqual(phases[0]['traced_peak_MB'],
+                                phases[1]['traced_peak_MB'])
+        self.assertGreaterEqual(phases[0]['wall_s'], phases[1]['wall_s'])
+        summary = PhaseTimer.summary(phases)
+        self.assertTrue(summary.startswith('prepare phase timing:'))
+        self.assertIn('(_ingest ', summary)
+        self.assertIn(', save_config ', summary)
+
+    def test_tracing(self):
+        os.environ['GEN3_WORKFLOW_PHASE_TIMING'] = 'memory'
+        try:
+            timer = PhaseTimer()
+        finally:
+            del os.environ['GEN3_WORKFLOW_PHASE_TIMING']
+        # Allocations are traced only while an outermost phase is
+        # running.
+        self.assertFalse(tracemalloc.is_tracing())
+        with timer.phase('restore'):
+            self.assertTrue(tracemalloc.is_tracing())
+        self.assertFalse(tracemalloc.is_tracing())
+
+        timer = PhaseTimer()
+        config = dict(submitPath=self.submit_path,
+                      parsl_config=dict(phase_timing='memory'))
+        with timer.phase('restore'):
+            self.assertFalse(tracemalloc.is_tracing())
+            timer.configure(config)
+            self.assertTrue(tracemalloc.is_tracing())
+            with timer.phase('ParslGraph'):
+                pass
+        self.assertFalse(tracemalloc.is_tracing())
+        with open(self.outfile) as fd:
+            phases = json.load(fd)[0]['phases']
+        self.assertIn('traced_peak_MB', phases[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
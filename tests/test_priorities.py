@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from desc.gen3_workflow import CompactDag
+from desc.gen3_workflow.submission import ReadyQueue
+
+
+class PrioritiesTestCase(unittest.TestCase):
+    """TestCase class for the job priority calculations."""
+    def setUp(self):
+        # A long chain (0->1->2->3) and a short one (4->5), with a
+        # join at job 3.
+        names = [f'job{_}' for _ in range(6)]
+        src = [0, 1, 2, 4, 5]
+        dst = [1, 2, 3, 5, 3]
+        self.dag = CompactDag(names, src, dst)
+
+    def test_bottom_levels(self):
+        weights = np.array([1, 1, 1, 1, 5, 1])
+        levels = self.dag.bottom_levels(weights)
+        np.testing.assert_array_equal(levels, [4, 3, 2, 1, 7, 2])
+        cycle = CompactDag(['a', 'b'], [0, 1], [1, 0])
+        with self.assertRaises(RuntimeError):
+            cycle.bottom_levels(np.ones(2))
+
+    def test_ready_queue(self):
+        priorities = np.array([4, 3, 2, 1, 7, 2])
+        ready = ReadyQueue(priorities)
+        for job_id in (0, 2, 4, 5):
+            ready.push(job_id)
+        self.assertEqual([ready.pop() for _ in range(len(ready))],
+                         [4, 0, 2, 5])
+        ready = ReadyQueue()
+        for job_id in (2, 0, 1):
+            ready.push(job_id)
+        self.assertEqual([ready.pop() for _ in range(len(ready))], [2, 0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
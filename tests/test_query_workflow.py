@@ -1,8 +1,12 @@
 import os
 import shutil
+import sqlite3
+import tempfile
 import unittest
 import subprocess
-from desc.gen3_workflow import query_workflow
+import pandas as pd
+from desc.gen3_workflow import query_workflow, WorkflowStatusQuery, \
+    status_summary, create_monitoring_db_indexes
 
 class QueryWorkflowTestCase(unittest.TestCase):
     """TestCase class for query_workflow function."""
@@ -32,5 +36,122 @@ class QueryWorkflowTestCase(unittest.TestCase):
         df = query_workflow(workflow_name)
         self.assertEqual(len(df), 0)
 
+
+class WorkflowStatusQueryTestCase(unittest.TestCase):
+    """TestCase class for the WorkflowStatusQuery class."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.tmp_dir, 'monitoring.db')
+        self.workflow_name = 'u/desc/test_run'
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute('create table workflow (run_id text, '
+                         'workflow_name text)')
+            conn.execute('create table task (task_id integer, run_id text, '
+                         'task_stderr text)')
+            conn.execute('create table status (task_id integer, '
+                         'task_status_name text, timestamp text, '
+                         'run_id text)')
+            conn.execute('insert into workflow values (?, ?)',
+                         ('run0', self.workflow_name))
+        self.timestamp = 0
+
+    def tearDown(self):
+        if os.path.isdir(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+
+    def _add_status(self, task_id, status, run_id='run0', stderr=True):
+        """Add a status entry, creating the task entry if needed."""
+        self.timestamp += 1
+        job_name = f'1234abcd-1234-1234-1234-123456789abc_isr_{task_id}'
+        with sqlite3.connect(self.db_file) as conn:
+            if stderr is not None and not conn.execute(
+                    'select * from task where task_id=? and run_id=?',
+                    (task_id, run_id)).fetchall():
+                conn.execute('insert into task values (?, ?, ?)',
+                             (task_id, run_id,
+                              f'logging/{job_name}.stderr' if stderr
+                              else None))
+            conn.execute('insert into status values (?, ?, ?, ?)',
+                         (task_id, status, f'{self.timestamp:010d}', run_id))
+
+    def _statuses(self, df):
+        return dict(zip(df['job_name'].str.split('_').str[-1].astype(int),
+                        df['status']))
+
+    def test_incremental_query(self):
+        """Test that incremental updates match a full query."""
+        status_query = WorkflowStatusQuery(self.workflow_name, self.db_file)
+        for task_id in range(3):
+            self._add_status(task_id, 'pending')
+        self._add_status(3, 'pending', stderr=False)
+        self.assertTrue(status_query.update())
+        self.assertEqual(self._statuses(status_query.frame()),
+                         {0: 'pending', 1: 'pending', 2: 'pending'})
+        self.assertFalse(status_query.update())
+
+        for status in ('launched', 'running', 'exec_done', 'running_ended'):
+            self._add_status(0, status)
+        for status in ('launched', 'running', 'running_ended'):
+            self._add_status(1, status)
+        self._add_status(2, 'failed')
+        # Status entry for a task that hasn't been added yet.
+        self._add_status(4, 'pending', stderr=None)
+        self.assertTrue(status_query.update())
+        expected = {0: 'exec_done', 2: 'failed'}
+        self.assertEqual(self._statuses(status_query.frame()), expected)
+        self.assertEqual(self._statuses(query_workflow(self.workflow_name,
+                                                       self.db_file)),
+                         expected)
+
+        # Add the missing task entry and a new run of the workflow.
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute('insert into task values (?, ?, ?)',
+                         (4, 'run0', 'logging/1234abcd-1234-1234-1234-'
+                          '123456789abc_isr_4.stderr'))
+            conn.execute('insert into workflow values (?, ?)',
+                         ('run1', self.workflow_name))
+        self._add_status(2, 'running', run_id='run1')
+        self.assertTrue(status_query.update())
+        self.assertEqual(self._statuses(status_query.frame()),
+                         {0: 'exec_done', 2: 'running', 4: 'pending'})
+
+        # Replacing the db file invalidates the cache.
+        version = status_query.version
+        os.rename(self.db_file, self.db_file + '.bak')
+        shutil.copy(self.db_file + '.bak', self.db_file)
+        self.assertTrue(status_query.update())
+        self.assertGreater(status_query.version, version)
+        self.assertEqual(self._statuses(status_query.frame()),
+                         {0: 'exec_done', 2: 'running', 4: 'pending'})
+
+    def test_create_monitoring_db_indexes(self):
+        """Test the idempotent creation of the monitoring db indexes."""
+        for task_id in range(3):
+            self._add_status(task_id, 'pending')
+        created = create_monitoring_db_indexes(self.db_file)
+        self.assertEqual(len(created), 3)
+        self.assertEqual(create_monitoring_db_indexes(self.db_file), [])
+        self.assertEqual(len(query_workflow(self.workflow_name,
+                                            self.db_file)), 3)
+
+
+class StatusSummaryTestCase(unittest.TestCase):
+    """TestCase class for the status_summary function."""
+    def test_status_summary(self):
+        df = pd.DataFrame(data=dict(
+            task_type=['isr', 'isr', 'isr', 'calibrate', 'calibrate'],
+            status=['exec_done', 'failed', 'exec_done', 'running',
+                    'memo_done']))
+        summary = status_summary(df, task_types=['isr', 'calibrate', 'deblend'],
+                                 statuses=['exec_done', 'running', 'failed'])
+        self.assertEqual(list(summary.columns),
+                         ['exec_done', 'running', 'failed', 'total'])
+        self.assertEqual(summary.loc['isr'].tolist(), [2, 0, 1, 3])
+        # The totals include status values that aren't in the columns.
+        self.assertEqual(summary.loc['calibrate'].tolist(), [0, 1, 0, 2])
+        self.assertEqual(summary.loc['deblend'].tolist(), [0, 0, 0, 0])
+        self.assertEqual(len(status_summary(pd.DataFrame())), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
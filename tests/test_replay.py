@@ -0,0 +1,166 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+import numpy as np
+from desc.gen3_workflow import CompactDag, monitoring_task_history, \
+    parsl_config_cluster, replay_workflow
+
+
+_JOB_NAME = 'f7697fb9-70d3-4a1f-8735-df5ef7697fb9_isr_0'
+
+
+class MockGraph:
+    """Minimal stand-in for a ParslGraph with a monitoring db."""
+    def __init__(self, job_names, src, dst, workflow_name, monitoring_db):
+        self.dag = CompactDag(job_names, src, dst)
+        self.config = dict(outputRun=workflow_name)
+        self.monitoring_db = monitoring_db
+        # Memory requests in MB keyed by task label.
+        self.requests = dict(isr=4096, calibrate=8192)
+
+    def job_label(self, job_id):
+        return self.dag.names[job_id].split('_')[1]
+
+    def job_from_id(self, job_id):
+        return job_id
+
+    def resource_specs(self, job_id):
+        return dict(memory=self.requests[self.job_label(job_id)], cores=1,
+                    disk=0)
+
+
+class ReplayTestCase(unittest.TestCase):
+    """TestCase class for the monitoring db replay functions."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.tmp_dir, 'monitoring.db')
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute('create table workflow (run_id text, '
+                         'workflow_name text, time_began datetime)')
+            conn.execute('create table task (task_id integer, run_id text, '
+                         'task_func_name text, task_stderr text)')
+            conn.execute('create table status (task_id integer, '
+                         'task_status_name text, timestamp datetime, '
+                         'run_id text, try_id integer)')
+            conn.execute('create table resource (task_id integer, '
+                         'try_id integer, run_id text, timestamp datetime, '
+                         'psutil_process_memory_resident float)')
+            conn.execute("insert into workflow values "
+                         "('r0', 'my_workflow', '2023-01-01 00:00:00')")
+            conn.execute("insert into task values (0, 'r0', 'isr', ?)",
+                         (f'/logging/{_JOB_NAME}.stderr',))
+            # A failed first try followed by a successful 1 hour try.
+            for try_id, began, ended in ((0, '00:00:00', '00:10:00'),
+                                         (1, '01:00:00', '02:00:00')):
+                conn.execute("insert into status values (0, 'running', ?, "
+                             "'r0', ?)", (f'2023-01-01 {began}', try_id))
+                conn.execute("insert into status values "
+                             "(0, 'running_ended', ?, 'r0', ?)",
+                             (f'2023-01-01 {ended}', try_id))
+                for rss in (1, 2*try_id + 1):
+                    conn.execute("insert into resource values "
+                                 "(0, ?, 'r0', ?, ?)",
+                                 (try_id, f'2023-01-01 {began}', rss*1024**3))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_monitoring_task_history(self):
+        history = monitoring_task_history('my_workflow', db_file=self.db_file)
+        self.assertEqual(len(history), 1)
+        row = history.iloc[0]
+        self.assertEqual(row.job_name, _JOB_NAME)
+        self.assertEqual(row.task_type, 'isr')
+        self.assertAlmostEqual(row.runtime, 1, places=6)
+        self.assertEqual(row.peak_rss, 3)
+        self.assertTrue(monitoring_task_history(
+            'other_workflow', db_file=self.db_file).empty)
+
+    def test_parsl_config_cluster(self):
+        cluster = parsl_config_cluster(
+            dict(executor='WorkQueue', provider='Slurm', nodes_per_block=2,
+                 max_blocks=3, walltime='02:30:00',
+                 worker_options='--memory=91000'), cores_per_node=68)
+        self.assertEqual(cluster.total_nodes, 6)
+        self.assertEqual(cluster.cores_per_node, 68)
+        self.assertAlmostEqual(cluster.memory_per_node, 91000/1024)
+        self.assertEqual(cluster.block_walltime, 2.5)
+        cluster = parsl_config_cluster(dict(executor='ThreadPool',
+                                            max_threads=4))
+        self.assertEqual(cluster.cores_per_node, 4)
+        self.assertIsNone(cluster.memory_per_node)
+        with self.assertRaises(ValueError):
+            parsl_config_cluster(dict(executor='WorkQueue', provider='Local'))
+
+    def test_replay_workflow(self):
+        # A recorded run of a few thousand jobs, each with its own
+        # peak RSS, in chains of four jobs.
+        num_jobs = 4000
+        rng = np.random.default_rng(42)
+        job_names = [f'f7697fb9-70d3-4a1f-8735-df5ef7697fb9_'
+                     f'{("isr", "calibrate")[i % 2]}_{i}'
+                     for i in range(num_jobs)]
+        dst = np.flatnonzero(np.arange(num_jobs) % 4 > 0)
+        graph = MockGraph(job_names, dst - 1, dst, 'big_workflow',
+                          self.db_file)
+        begins = rng.uniform(0, 36000, num_jobs)
+        runtimes = rng.uniform(60, 3600, num_jobs)
+        peak_rss = 1 + rng.permutation(num_jobs)/1000.
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("insert into workflow values "
+                         "('r1', 'big_workflow', '2023-02-01 00:00:00')")
+            conn.executemany(
+                "insert into task values (?, 'r1', ?, ?)",
+                [(i, graph.job_label(i), f'/logging/{job_name}.stderr')
+                 for i, job_name in enumerate(job_names)])
+            conn.executemany(
+                "insert into status values (?, ?, "
+                "datetime('2023-02-01', ? || ' seconds'), 'r1', 0)",
+                [(i, status, float(t))
+                 for i in range(num_jobs)
+                 for status, t in (('running', begins[i]),
+                                   ('running_ended',
+                                    begins[i] + runtimes[i]))])
+            conn.executemany("insert into resource values "
+                             "(?, 0, 'r1', '2023-02-01 00:00:00', ?)",
+                             [(i, peak_rss[i]*1024**3)
+                              for i in range(num_jobs)])
+        parsl_config = dict(executor='WorkQueue', provider='Local',
+                            nodes_per_block=4,
+                            worker_options='--memory=65536')
+        t0 = time.perf_counter()
+        result = replay_workflow(graph, parsl_config,
+                                 memory_source='observed', memory_margin=1.2,
+                                 cores_per_node=16)
+        self.assertLess(time.perf_counter() - t0, 30)
+        self.assertEqual(len(result.end), num_jobs)
+        self.assertGreaterEqual(result.makespan,
+                                result.simulator.lower_bound)
+        np.testing.assert_allclose(result.simulator.memory,
+                                   1.2*peak_rss, rtol=1e-6)
+
+        # By default, the jobs are placed using their memory requests.
+        result = replay_workflow(graph, parsl_config, cores_per_node=16)
+        np.testing.assert_array_equal(
+            result.simulator.memory,
+            [(4, 8)[i % 2] for i in range(num_jobs)])
+
+        # HTEX executor tiers, with 4 GB workers for the isr jobs and
+        # 8 GB workers for the calibrate jobs.
+        tiers = {'batch-small': dict(nodes=1, mem_per_worker=4),
+                 'batch-medium': dict(nodes=2, mem_per_worker=8)}
+        result = replay_workflow(graph, dict(worker_options='--memory=65536'),
+                                 tiers=tiers, cores_per_node=16)
+        self.assertEqual(len(result.end), num_jobs)
+        self.assertGreaterEqual(result.makespan,
+                                result.simulator.lower_bound)
+        with self.assertRaises(ValueError):
+            replay_workflow(graph, parsl_config, memory_source='peak',
+                            cores_per_node=16)
+
+
+if __name__ == '__main__':
+    unittest.main()
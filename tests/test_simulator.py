@@ -0,0 +1,113 @@
+import time
+import unittest
+import numpy as np
+from desc.gen3_workflow import CompactDag, ClusterShape, WorkflowSimulator
+
+
+class MockGraph:
+    """Minimal stand-in for a ParslGraph with a DAG and task labels."""
+    def __init__(self, labels, src, dst):
+        self.labels = labels
+        names = [f'{label}_{i}' for i, label in enumerate(labels)]
+        self.dag = CompactDag(names, src, dst)
+
+    def job_label(self, job_id):
+        return self.labels[job_id]
+
+
+class WorkflowSimulatorTestCase(unittest.TestCase):
+    """TestCase class for the workflow simulator."""
+    def setUp(self):
+        # Three independent jobs followed by a chain of three jobs.
+        labels = ['b', 'b', 'b', 'a', 'a', 'a']
+        self.graph = MockGraph(labels, [3, 4], [4, 5])
+
+    def test_policies(self):
+        sim = WorkflowSimulator(self.graph, dict(a=1, b=1))
+        self.assertEqual(sim.lower_bound, 3)
+        cluster = ClusterShape(nodes=1, cores_per_node=2)
+        result = sim.run(cluster)
+        self.assertEqual(result.makespan, 4)
+        result = sim.run(cluster, policy='critical_path')
+        self.assertEqual(result.makespan, 3)
+        self.assertEqual(result.utilization, 1)
+        self.assertEqual(result.critical_path(), ['a_3', 'a_4', 'a_5'])
+        times, cores = result.core_usage()
+        np.testing.assert_array_equal(times, [0, 1, 2, 3])
+        np.testing.assert_array_equal(cores, [2, 2, 2, 0])
+        with self.assertRaises(ValueError):
+            sim.run(cluster, policy='shortest_first')
+
+    def test_memory_packing(self):
+        sim = WorkflowSimulator(self.graph, dict(a=1, b=1),
+                                memory=dict(a=40, b=1))
+        # Only one 40 GB job fits on a node at a time.
+        cluster = ClusterShape(nodes=1, cores_per_node=6, memory_per_node=64)
+        self.assertEqual(sim.run(cluster).makespan, 3)
+        cluster = ClusterShape(nodes=1, cores_per_node=6, memory_per_node=32)
+        with self.assertRaises(ValueError):
+            sim.run(cluster)
+        # Executor tiers: the 'a' jobs only fit on the large tier.
+        tiers = dict(small=dict(nodes=1, mem_per_worker=4),
+                     large=dict(nodes=1, mem_per_worker=64))
+        cluster = ClusterShape(cores_per_node=2, memory_per_node=64,
+                               tiers=tiers)
+        result = sim.run(cluster)
+        self.assertEqual(result.makespan, 3)
+        self.assertEqual(result.node_hours, 6)
+
+    def test_block_walltime(self):
+        graph = MockGraph(['a', 'a'], [0], [1])
+        sim = WorkflowSimulator(graph, dict(a=0.75))
+        cluster = ClusterShape(cores_per_node=1, block_walltime=1,
+                               block_queue_time=0.5)
+        result = sim.run(cluster)
+        # The second job is killed at the end of the first block and
+        # rerun in the second block.
+        self.assertEqual(result.makespan, 2.25)
+        self.assertEqual(result.wasted_core_hours, 0.25)
+        self.assertEqual(result.online_hours, 1.75)
+        self.assertEqual(result.busy_core_hours, 1.5)
+        self.assertAlmostEqual(result.utilization, 1.5/1.75)
+        with self.assertRaises(ValueError):
+            sim.run(ClusterShape(block_walltime=0.5))
+
+    def test_finish_at_block_end(self):
+        # The second job finishes exactly at the end of the block, so
+        # it isn't killed and rerun.
+        graph = MockGraph(['a', 'a'], [0], [1])
+        sim = WorkflowSimulator(graph, dict(a=0.5))
+        cluster = ClusterShape(cores_per_node=1, block_walltime=1,
+                               block_queue_time=0.5)
+        result = sim.run(cluster)
+        self.assertEqual(result.makespan, 1)
+        self.assertEqual(result.wasted_core_hours, 0)
+        self.assertEqual(result.utilization, 1)
+
+    def test_per_job_memory_scaling(self):
+        # Layers of 1000 jobs, each depending on one job of the layer
+        # before, with a distinct memory need for every job.
+        num_jobs, width = 20000, 1000
+        rng = np.random.default_rng(42)
+        dst = np.arange(width, num_jobs)
+        src = dst - width + rng.integers(-5, 5, len(dst))
+        src = np.clip(src, (dst//width - 1)*width, dst//width*width - 1)
+        graph = MockGraph(['a']*num_jobs, src, dst)
+        memory = 1 + rng.permutation(num_jobs)/1000.
+        self.assertEqual(len(np.unique(np.ceil(1024*memory))), num_jobs)
+        sim = WorkflowSimulator(graph, rng.uniform(0.1, 1, num_jobs),
+                                memory=memory)
+        cluster = ClusterShape(nodes=20, cores_per_node=16,
+                               memory_per_node=128)
+        t0 = time.perf_counter()
+        for policy in ('none', 'critical_path'):
+            result = sim.run(cluster, policy=policy)
+            self.assertGreaterEqual(result.makespan, sim.lower_bound)
+        # The scheduling should take a few seconds at most, rather
+        # than growing quadratically with the number of distinct
+        # memory values.
+        self.assertLess(time.perf_counter() - t0, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
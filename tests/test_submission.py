@@ -0,0 +1,66 @@
+import unittest
+from concurrent.futures import Future
+from desc.gen3_workflow import CompactDag, JobSubmitter, StreamingSubmission
+
+
+class _Job:
+    """Minimal stand-in for a ParslJob."""
+    def __init__(self, graph, job_id):
+        self.graph = graph
+        self.job_id = job_id
+        self.done = False
+        self.future = None
+        self.executor = 'batch-small'
+
+    def submit(self):
+        # The head of a chain runs the whole chain in one invocation,
+        # whose future is shared by the chain's jobs.
+        if self.future is None:
+            future = Future()
+            for job_id in self.graph.chains.get(self.job_id, [self.job_id]):
+                self.graph.jobs[job_id].future = future
+            self.graph.submitted.append(self.job_id)
+            future.set_result(0)
+        return self.future
+
+
+class _Graph:
+    """Minimal stand-in for a ParslGraph."""
+    def __init__(self, num_jobs, src, dst, chains):
+        self.dag = CompactDag([f'job_{_}' for _ in range(num_jobs)],
+                              src, dst)
+        self.chains = chains
+        self.jobs = [_Job(self, _) for _ in range(num_jobs)]
+        self.submitted = []
+
+    def job_from_id(self, job_id):
+        return self.jobs[job_id]
+
+
+class SubmissionTestCase(unittest.TestCase):
+    """TestCase class for the job submission classes."""
+    def setUp(self):
+        # Two chains of three jobs, (0, 1, 2) and (3, 4, 5), feeding
+        # job 6, with job 0 run as a chain cluster.
+        self.graph = _Graph(7, [0, 1, 3, 4, 2, 5], [1, 2, 4, 5, 6, 6],
+                            {0: [0, 1, 2]})
+
+    def test_job_submitter(self):
+        submitter = JobSubmitter(self.graph)
+        submitter.submit()
+        self.assertEqual(self.graph.submitted, [0, 3, 4, 5, 6])
+        self.assertEqual(submitter.stats['submitted'], 5)
+
+    def test_streaming_chain_members(self):
+        submission = StreamingSubmission(JobSubmitter(self.graph),
+                                         max_in_flight=2)
+        submission.run()
+        self.assertEqual(sorted(self.graph.submitted), [0, 3, 4, 5, 6])
+        self.assertEqual(submission.stats['submitted'], 5)
+        self.assertEqual(submission.stats['max_in_flight'], 2)
+        self.assertEqual(sum(submission.in_flight.values()), 0)
+        self.assertEqual(submission.num_unfinished, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
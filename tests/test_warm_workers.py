@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from parsl.executors import ThreadPoolExecutor, HighThroughputExecutor, \
+    WorkQueueExecutor
+from desc.gen3_workflow import pipetask_args, run_forked, \
+    run_pipetask_command, check_warm_executors, RoutingTable
+
+
+def _fail():
+    raise RuntimeError('quantum failed')
+
+
+class WarmWorkersTestCase(unittest.TestCase):
+    """TestCase class for the warm worker functions."""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.tmp_dir, 'job.stderr')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pipetask_args(self):
+        os.environ['CTRL_MPEXEC_DIR'] = '/opt/ctrl_mpexec'
+        command = ('time ${CTRL_MPEXEC_DIR}/bin/pipetask run -b repo '
+                   '--qgraph-node-id "a,b"')
+        self.assertEqual(pipetask_args(command),
+                         ['run', '-b', 'repo', '--qgraph-node-id', 'a,b'])
+        self.assertIsNone(pipetask_args('cl_wrapper.sh pipetask run'))
+        self.assertIsNone(pipetask_args('echo hello'))
+
+    def test_run_forked(self):
+        self.assertEqual(run_forked(print, ('hello',), self.log_file), 0)
+        self.assertEqual(run_forked(_fail, (), self.log_file), 1)
+        with open(self.log_file) as fd:
+            lines = fd.readlines()
+        self.assertEqual(lines[0], 'hello\n')
+        self.assertIn('RuntimeError: quantum failed\n', lines)
+
+    def test_run_pipetask_command(self):
+        # Command lines that don't run pipetask directly are run in bash.
+        other_log = os.path.join(self.tmp_dir, 'other.stderr')
+        run_pipetask_command('echo hello', self.log_file, [other_log])
+        with self.assertRaises(RuntimeError):
+            run_pipetask_command('false', self.log_file)
+        with open(self.log_file) as fd:
+            self.assertEqual(fd.read(), 'hello\nsuccess\nfailure\n')
+        with open(other_log) as fd:
+            self.assertEqual(fd.read(), 'success\n')
+
+    def test_check_warm_executors(self):
+        # The thread pool configs are rejected.
+        executors = {label: ThreadPoolExecutor(max_threads=4, label=label)
+                     for label in ('submit-node', 'batch-small',
+                                   'batch-medium', 'batch-large')}
+        routing_table = RoutingTable(executors)
+        with self.assertRaises(ValueError):
+            check_warm_executors(executors, routing_table.labels)
+        # Process-based executors are accepted, even with a thread
+        # pool for the submit-node jobs.
+        executors = {'submit-node': ThreadPoolExecutor(label='submit-node'),
+                     'batch-large': HighThroughputExecutor(
+                         label='batch-large')}
+        routing_table = RoutingTable(executors)
+        self.assertEqual(routing_table.labels, ['batch-large'])
+        check_warm_executors(executors, routing_table.labels)
+        # Work Queue is accepted only in coprocess mode.
+        work_queue = WorkQueueExecutor.__new__(WorkQueueExecutor)
+        work_queue.coprocess = False
+        executors = {'submit-node': ThreadPoolExecutor(label='submit-node'),
+                     'work_queue': work_queue}
+        with self.assertRaises(ValueError):
+            check_warm_executors(executors, ['work_queue'])
+        work_queue.coprocess = True
+        check_warm_executors(executors, ['work_queue'])
+
+
+if __name__ == '__main__':
+    unittest.main()